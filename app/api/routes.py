@@ -1,19 +1,35 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List
-import shutil
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from typing import List, Dict, Optional
+from datetime import datetime
+import hashlib
+import json
+import time
+import uuid
 from pathlib import Path
 
 from app.models.schemas import (
     PaperUploadResponse, 
+    BatchQueryRequest,
+    BatchQueryResponse,
+    BatchQueryResult,
+    IngestRequest,
+    JobStatus,
+    PaperMetadata,
+    QueryFilters,
     QueryRequest, 
     QueryResponse,
     SourceChunk
 )
 from app.services.pdf_processor import PDFProcessor
-from app.services.embeddings import EmbeddingService
+from app.services.embeddings import get_embedding_service
 from app.services.retrieval import RetrievalPipeline
-from app.utils.text_processing import TextChunker
-from app.db.vector_store import VectorStore
+from app.services.executor import thread_pool, process_pool, ServiceOverloaded
+from app.services.ingest import BulkIngestor
+from app.services.jobs import UploadWorkers
+from app.utils.metrics import collect_stages, count, record_stage, registry
+from app.db.content_cache import ContentCache
+from app.db.job_queue import STATUSES, JobQueue
 from app.config import settings
 from loguru import logger
 
@@ -21,15 +37,63 @@ router = APIRouter()
 
 # Initialize services
 pdf_processor = PDFProcessor()
-embedding_service = EmbeddingService()
-text_chunker = TextChunker()
-vector_store = VectorStore(dimension=embedding_service.embedding_dimension)
+embedding_service = get_embedding_service()
 retrieval_pipeline = RetrievalPipeline()
+vector_store = retrieval_pipeline.vector_store
+content_cache = ContentCache()
+ingest_jobs: Dict[str, BulkIngestor] = {}
+job_queue = JobQueue()
+upload_workers = UploadWorkers(job_queue, vector_store, content_cache, embedding_service)
 
-@router.post("/upload", response_model=PaperUploadResponse)
-async def upload_paper(file: UploadFile = File(...)):
-    """Upload and process a research paper PDF"""
+
+def _register_metrics():
+    """Gauges and counters read from the services at scrape time"""
+    answer_cache = retrieval_pipeline.answer_cache
+    caches = {
+        'answer_exact': answer_cache.exact,
+        'answer_semantic': answer_cache.semantic,
+        'embedding': content_cache
+    }
+    for name, cache in caches.items():
+        registry.register("rag_cache_hits_total", "counter", "Cache hits", lambda cache=cache: cache.hits, cache=name)
+        registry.register("rag_cache_misses_total", "counter", "Cache misses", lambda cache=cache: cache.misses, cache=name)
+    
+    registry.register("rag_index_vectors", "gauge", "Live chunks in the vector store",
+                      lambda: vector_store.chunk_store.num_live)
+    registry.register("rag_index_papers", "gauge", "Papers in the vector store", lambda: vector_store.num_papers)
+    registry.register("rag_snapshot_version", "gauge", "Index snapshot version served", lambda: vector_store.snapshot_version)
+    registry.register("rag_rerank_timeouts_total", "counter", "Re-rankings skipped for exceeding their budget",
+                      lambda: retrieval_pipeline.reranker.timeouts)
+    for pool in (thread_pool, process_pool):
+        registry.register("rag_pool_in_flight", "gauge", "Tasks running or queued in a worker pool",
+                          lambda pool=pool: pool.in_flight, pool=pool.name)
+        registry.register("rag_pool_limit", "gauge", "Tasks a worker pool admits before rejecting work",
+                          lambda pool=pool: pool.limit, pool=pool.name)
+    registry.register("rag_ingest_jobs_running", "gauge", "Bulk ingest jobs in progress",
+                      lambda: sum(job.running for job in ingest_jobs.values()))
+    for status in STATUSES:
+        registry.register("rag_upload_jobs", "gauge", "Upload jobs by status",
+                          lambda status=status: job_queue.counts()[status], status=status)
+
+
+_register_metrics()
+
+
+def _save_upload(source, file_path: Path) -> str:
+    """Copy an uploaded file to disk, returning its SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, "wb") as buffer:
+        while block := source.read(1 << 20):
+            digest.update(block)
+            buffer.write(block)
+    return digest.hexdigest()
+
+
+@router.post("/upload", response_model=PaperUploadResponse, status_code=202)
+async def upload_paper(file: UploadFile = File(...), priority: int = 0):
+    """Store a research paper PDF and queue it for processing (higher priority runs first)"""
     
+    tmp_path = None
     try:
         # Validate file type
         if not file.filename.endswith('.pdf'):
@@ -38,88 +102,317 @@ async def upload_paper(file: UploadFile = File(...)):
         # Generate paper ID
         paper_id = pdf_processor.generate_paper_id(file.filename)
         
-        # Save uploaded file
-        file_path = settings.UPLOAD_DIR / f"{paper_id}_{file.filename}"
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
-        logger.info(f"Saved PDF: {file.filename}")
+        # Save uploaded file, hashing it on the way
+        tmp_path = settings.UPLOAD_DIR / f".{uuid.uuid4().hex}.part"
+        file_hash = await thread_pool.run(_save_upload, file.file, tmp_path)
         
-        # Extract text
-        extracted_data = pdf_processor.extract_text(file_path)
-        
-        # Chunk text
-        chunks = text_chunker.chunk_text(extracted_data['pages'])
-        
-        # Generate embeddings
-        chunk_texts = [chunk['text'] for chunk in chunks]
-        embeddings = embedding_service.generate_embeddings(chunk_texts)
+        # Identical file already indexed (possibly under another name)
+        existing = await thread_pool.run(content_cache.lookup_file, file_hash)
+        if existing and vector_store.paper_chunk_ids(existing['paper_id']):
+            tmp_path.unlink()
+            logger.info(f"Skipped {file.filename}: identical to {existing['filename']}")
+            count("rag_uploads_total", "Uploaded PDFs", result="duplicate")
+            return PaperUploadResponse(
+                paper_id=existing['paper_id'],
+                filename=file.filename,
+                num_chunks=existing['num_chunks'],
+                message=f"Already indexed as {existing['filename']}"
+            )
         
-        # Add to vector store
-        try:
-            vector_store.load()
-        except:
-            pass  # No existing index
+        # ... or already waiting to be processed
+        active = await thread_pool.run(job_queue.find_active, file_hash)
+        if active:
+            tmp_path.unlink()
+            return PaperUploadResponse(
+                paper_id=active['paper_id'],
+                filename=file.filename,
+                message=f"Already queued as {active['filename']}",
+                job_id=active['id'],
+                status=active['status']
+            )
         
-        # Create or update index
-        metadata = [
-            {
-                'text': chunk['text'],
-                'page': chunk['page'],
-                'paper_id': paper_id,
-                'filename': file.filename
-            }
-            for chunk in chunks
-        ]
+        # One file per content: a queued job for an earlier version of this filename keeps its own bytes
+        file_path = settings.UPLOAD_DIR / f"{paper_id}_{file_hash[:16]}_{file.filename}"
+        tmp_path.replace(file_path)
         
-        vector_store.create_index(embeddings, metadata)
-        vector_store.save()
+        logger.info(f"Saved PDF: {file.filename}")
         
-        # Update retrieval pipeline's vector store
-        retrieval_pipeline.vector_store = vector_store
+        # Extraction, chunking, embedding and indexing run in the upload workers
+        job = await thread_pool.run(job_queue.submit, paper_id, file.filename, file_path, file_hash, priority)
+        upload_workers.notify()
         
         return PaperUploadResponse(
             paper_id=paper_id,
             filename=file.filename,
-            num_chunks=len(chunks),
-            message=f"Successfully processed {file.filename}"
+            message=f"Queued {file.filename} for processing",
+            job_id=job['id'],
+            status=job['status']
         )
-        
+    
+    except (HTTPException, ServiceOverloaded):
+        _discard(tmp_path)
+        raise
     except Exception as e:
+        _discard(tmp_path)
         logger.error(f"Error processing upload: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _discard(tmp_path: Optional[Path]):
+    """Remove a partly handled upload's temporary file"""
+    if tmp_path is not None:
+        tmp_path.unlink(missing_ok=True)
+
+
+@router.get("/jobs", response_model=List[JobStatus])
+async def list_jobs(status: Optional[str] = None, limit: int = 100):
+    """Recent upload jobs, newest first, optionally with a given status"""
+    if status is not None and status not in STATUSES:
+        raise HTTPException(status_code=400, detail=f"Unknown status {status} (expected one of {', '.join(STATUSES)})")
+    return [_job_status(job) for job in await thread_pool.run(job_queue.list, status, limit)]
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatus)
+async def upload_job_status(job_id: str):
+    """Stage and progress of an upload job"""
+    job = await thread_pool.run(job_queue.get, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return _job_status(job)
+
+
+@router.delete("/jobs/{job_id}", response_model=JobStatus)
+async def cancel_upload_job(job_id: str):
+    """Cancel a queued upload job, or stop a running one at its next stage boundary"""
+    job = await thread_pool.run(job_queue.cancel, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return _job_status(job)
+
+
+def _timestamp(value: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(value) if value is not None else None
+
+
+def _job_status(job: Dict) -> JobStatus:
+    return JobStatus(
+        job_id=job['id'],
+        paper_id=job['paper_id'],
+        filename=job['filename'],
+        status=job['status'],
+        stage=job['stage'],
+        progress=job['progress'],
+        priority=job['priority'],
+        attempts=job['attempts'],
+        error=job['error'],
+        num_chunks=job['num_chunks'],
+        created_at=_timestamp(job['created_at']),
+        started_at=_timestamp(job['started_at']),
+        finished_at=_timestamp(job['finished_at'])
+    )
+
+
+@router.get("/papers", response_model=List[PaperMetadata])
+async def list_papers():
+    """List indexed papers (their IDs can be used in query filters)"""
+    return [
+        PaperMetadata(
+            paper_id=paper['paper_id'],
+            filename=paper['filename'],
+            upload_date=datetime.fromtimestamp(paper['upload_date']),
+            num_chunks=sum(count for _, count in paper['ranges'])
+        )
+        for paper in vector_store.chunk_store.live_papers()
+    ]
+
+
+@router.delete("/papers/{paper_id}")
+async def delete_paper(paper_id: str):
+    """Remove a paper and all of its chunks from the index"""
+    removed = await thread_pool.run(vector_store.remove_paper, paper_id)
+    if removed == 0:
+        raise HTTPException(status_code=404, detail=f"Paper {paper_id} not found")
+    await thread_pool.run(content_cache.forget_paper, paper_id)
+    return {"paper_id": paper_id, "num_chunks_removed": removed}
+
+
+@router.post("/ingest", status_code=202)
+async def start_bulk_ingest(request: IngestRequest):
+    """Import every PDF under a server-side directory in the background"""
+    root = settings.INGEST_ROOT.resolve()
+    directory = (root / request.directory).resolve()
+    if not directory.is_relative_to(root):
+        raise HTTPException(status_code=400, detail=f"Directory must be inside {root}")
+    if not directory.is_dir():
+        raise HTTPException(status_code=404, detail=f"Directory {request.directory} not found")
+    if any(job.running for job in ingest_jobs.values()):
+        raise HTTPException(status_code=409, detail="A bulk ingest is already running")
+    
+    ingestor = BulkIngestor(vector_store, content_cache, embedding_service, root=root)
+    ingest_jobs[ingestor.id] = ingestor
+    ingestor.start(directory, request.recursive)
+    return ingestor.report()
+
+
+@router.get("/ingest/{job_id}")
+async def bulk_ingest_status(job_id: str):
+    """Progress and per-stage throughput of a bulk ingest"""
+    if job_id not in ingest_jobs:
+        raise HTTPException(status_code=404, detail=f"Ingest job {job_id} not found")
+    return ingest_jobs[job_id].report()
+
+
+@router.delete("/ingest/{job_id}")
+async def cancel_bulk_ingest(job_id: str):
+    """Stop a bulk ingest after its current batch; rerun it later to resume"""
+    if job_id not in ingest_jobs:
+        raise HTTPException(status_code=404, detail=f"Ingest job {job_id} not found")
+    ingest_jobs[job_id].cancel()
+    return ingest_jobs[job_id].report()
+
+
 @router.post("/query", response_model=QueryResponse)
 async def query_papers(request: QueryRequest):
     """Query the research papers"""
     
     try:
-        # Execute RAG pipeline
-        result = retrieval_pipeline.query(request.query, top_k=request.top_k)
-        
-        # Format sources
-        sources = [
-            SourceChunk(
-                content=chunk['text'][:500] + "..." if len(chunk['text']) > 500 else chunk['text'],
-                page=chunk.get('page'),
-                score=chunk['score']
+        # Execute RAG pipeline, collecting the time spent in each stage
+        with collect_stages() as stages:
+            result = await retrieval_pipeline.query_async(
+                request.query,
+                top_k=request.top_k,
+                filters=_store_filters(request.filters),
+                rerank_budget_ms=request.rerank_budget_ms
             )
-            for chunk in result['sources']
-        ]
+        record_stage("query", result['processing_time'])
+        count("rag_queries_total", "Answered queries", cached=str(result['cached']).lower())
         
         return QueryResponse(
             answer=result['answer'],
-            sources=sources,
+            sources=_format_sources(result['sources']),
             query=request.query,
-            processing_time=result['processing_time']
+            processing_time=result['processing_time'],
+            cached=result['cached'],
+            prompt_tokens=result['prompt_tokens'],
+            stages=stages if request.include_stages else None
         )
-        
+    
+    except ServiceOverloaded:
+        raise
     except Exception as e:
         logger.error(f"Error processing query: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/query/batch", response_model=BatchQueryResponse)
+async def query_papers_batch(request: BatchQueryRequest):
+    """Answer (or, with generate=false, only retrieve for) many queries in one request"""
+    if len(request.queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BATCH_MAX_QUERIES} queries per batch"
+        )
+    
+    try:
+        start_time = time.time()
+        results = await retrieval_pipeline.query_batch(
+            request.queries,
+            top_k=request.top_k,
+            filters=_store_filters(request.filters),
+            generate=request.generate,
+            rerank_budget_ms=request.rerank_budget_ms
+        )
+        
+        return BatchQueryResponse(
+            results=[
+                BatchQueryResult(
+                    query=query,
+                    answer=result['answer'],
+                    sources=_format_sources(result['sources']),
+                    cached=result['cached'],
+                    prompt_tokens=result['prompt_tokens']
+                )
+                for query, result in zip(request.queries, results)
+            ],
+            processing_time=time.time() - start_time
+        )
+    
+    except ServiceOverloaded:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing batch query: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/query/stream")
+async def query_papers_stream(request: QueryRequest):
+    """Query the research papers, streaming sources and answer tokens as server-sent events"""
+    
+    async def event_stream():
+        try:
+            filters = _store_filters(request.filters)
+            events = retrieval_pipeline.stream_query(
+                request.query, top_k=request.top_k, filters=filters, rerank_budget_ms=request.rerank_budget_ms
+            )
+            async for event in events:
+                name = event.pop('event')
+                if name == 'sources':
+                    event['sources'] = [source.model_dump() for source in _format_sources(event['sources'])]
+                yield _sse_event(name, event)
+        except Exception as e:
+            logger.error(f"Error streaming query: {e}")
+            yield _sse_event('error', {'detail': str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _store_filters(filters: Optional[QueryFilters]) -> Optional[Dict]:
+    """Convert request filters to VectorStore.select keyword arguments (dates as epoch seconds)"""
+    if filters is None:
+        return None
+    values = filters.model_dump(exclude_none=True)
+    for name in ('uploaded_after', 'uploaded_before'):
+        if name in values:
+            values[name] = values[name].timestamp()
+    return values or None
+
+
+def _format_sources(chunks: List[Dict]) -> List[SourceChunk]:
+    """Convert retrieved chunks to response sources with truncated content"""
+    return [
+        SourceChunk(
+            content=chunk['text'][:500] + "..." if len(chunk['text']) > 500 else chunk['text'],
+            page=chunk.get('page'),
+            page_end=chunk.get('page_end'),
+            score=chunk['score']
+        )
+        for chunk in chunks
+    ]
+
+
+def _sse_event(name: str, data: Dict) -> str:
+    """Encode one server-sent event"""
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.get("/cache/stats")
+async def cache_stats():
+    """Answer and embedding cache hit/miss counters"""
+    stats = retrieval_pipeline.answer_cache.stats()
+    stats['embeddings'] = await thread_pool.run(content_cache.stats)
+    return stats
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Stage latency histograms, counters and gauges in the Prometheus text format"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint"""
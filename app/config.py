@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from pathlib import Path
+from typing import List
 
 class Settings(BaseSettings):
     # App Config
@@ -11,18 +12,120 @@ class Settings(BaseSettings):
     UPLOAD_DIR: Path = BASE_DIR / "data" / "uploads"
     PROCESSED_DIR: Path = BASE_DIR / "data" / "processed"
     FAISS_INDEX_PATH: Path = PROCESSED_DIR / "faiss_index"
+    EMBEDDING_CACHE_PATH: Path = PROCESSED_DIR / "content_cache.sqlite3"
+    JOBS_DB_PATH: Path = PROCESSED_DIR / "jobs.sqlite3"  # Upload job queue
+    ONNX_DIR: Path = PROCESSED_DIR / "onnx"  # ONNX exports of the embedding model
     
     # FREE Ollama Settings (Local LLM)
     OLLAMA_BASE_URL: str = "http://localhost:11434"
     OLLAMA_MODEL: str = "llama3.1:8b"
+    OLLAMA_TIMEOUT: float = 60.0
+    OLLAMA_BASE_URLS: List[str] = []  # Several servers for least-loaded routing; defaults to OLLAMA_BASE_URL
+    OLLAMA_MAX_IN_FLIGHT: int = 2  # Concurrent generations per server
+    OLLAMA_MAX_RETRIES: int = 2  # Retries on connection errors
+    OLLAMA_RETRY_BACKOFF: float = 0.5  # Base seconds for jittered exponential backoff
+    OLLAMA_FAILURE_COOLDOWN: float = 10.0  # Seconds a failed server is avoided when others are available
     
     # FREE HuggingFace Settings (Local Embeddings)
     EMBEDDING_MODEL: str = "sentence-transformers/all-MiniLM-L6-v2"
+    EMBEDDING_BACKEND: str = "torch"  # torch (SentenceTransformer) | onnx (ONNX Runtime, mean pooling)
+    EMBEDDING_QUANTIZE: bool = False  # int8 dynamic quantization (CPU)
+    EMBEDDING_THREADS: int = 0  # Inference threads; 0 = library default
+    EMBEDDING_BATCH_SIZE: int = 32  # Texts per forward pass
+    EMBEDDING_BATCH_MAX_WAIT_MS: float = 5.0  # How long a query waits for others to share an encode call
+    EMBEDDING_BATCH_MAX_SIZE: int = 64
     
     # Processing
-    CHUNK_SIZE: int = 1000
-    CHUNK_OVERLAP: int = 200
+    CHUNK_SIZE: int = 1000  # Words per chunk in words mode
+    CHUNK_OVERLAP: int = 200  # Words, words mode
     MAX_CONTEXT_CHUNKS: int = 5
+    CHUNK_MODE: str = "tokens"  # tokens (sentence/section aware, sized for the embedding model) | words
+    CHUNK_MAX_TOKENS: int = 256  # Embedding model's max sequence length (all-MiniLM-L6-v2: 256)
+    CHUNK_OVERLAP_TOKENS: int = 32  # Trailing sentences repeated in the next chunk
+    CHUNK_SKIP_REFERENCES: bool = False  # Leave the reference list out of the index
+    
+    # Hybrid Retrieval
+    HYBRID_SEARCH: bool = True  # Fuse BM25 keyword hits with dense hits
+    DENSE_CANDIDATES: int = 20  # Dense hits fed into fusion
+    LEXICAL_CANDIDATES: int = 20  # BM25 hits fed into fusion
+    RRF_K: int = 60  # Reciprocal-rank fusion constant
+    BM25_K1: float = 1.2
+    BM25_B: float = 0.75
+    
+    # Hierarchical Retrieval
+    HIERARCHICAL_SEARCH: bool = True  # Search only the chunks of the papers whose centroids best match the query
+    HIERARCHICAL_MIN_PAPERS: int = 500  # Below this many papers, every chunk is searched
+    HIERARCHICAL_PAPERS: int = 50  # Papers whose chunks are scored exactly per query
+    HIERARCHICAL_MAX_CHUNKS: int = 5_000  # Chunk budget per query: fewer papers are searched when theirs hold more
+    
+    # Re-ranking
+    RERANK_ENABLED: bool = False  # Re-score retrieved candidates with a cross-encoder
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 20  # Hits re-scored per query
+    RERANK_BATCH_SIZE: int = 16
+    RERANK_BUDGET_MS: float = 300.0  # Past this, remaining batches are skipped and retrieval order kept
+    RERANK_QUANTIZE: bool = False  # int8 dynamic quantization (CPU)
+    
+    # Context Assembly
+    CONTEXT_TOKEN_BUDGET: int = 3000  # Max tokens of retrieved text in a prompt
+    CONTEXT_DEDUP_THRESHOLD: float = 0.95  # Drop chunks this similar (cosine) to a higher-ranked one
+    LLM_TOKENIZER: str = ""  # HuggingFace tokenizer matching OLLAMA_MODEL; empty = estimate from length
+    
+    # Answer Cache
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIZE: int = 1024  # Exact-match entries
+    SEMANTIC_CACHE_SIZE: int = 1024
+    ANSWER_CACHE_TTL: float = 3600.0  # Seconds
+    SEMANTIC_CACHE_THRESHOLD: float = 0.95  # Min cosine similarity between query embeddings
+    
+    # Batch Queries
+    BATCH_MAX_QUERIES: int = 1000  # Per /api/query/batch request
+    BATCH_MAX_CONCURRENT_GENERATIONS: int = 4  # LLM calls in flight per batch
+    
+    # Execution
+    CPU_THREAD_WORKERS: int = 4
+    PDF_PROCESS_WORKERS: int = 2
+    MAX_QUEUED_TASKS: int = 32  # Per pool, beyond running workers; further requests get 503
+    
+    # Bulk Ingest
+    INGEST_ROOT: Path = BASE_DIR  # /api/ingest only reads directories below this
+    INGEST_WORKERS: int = 0  # Extraction processes; 0 = one per CPU
+    INGEST_EMBED_BATCH: int = 256  # Chunks per encode call
+    INGEST_COMMIT_BATCH: int = 8192  # Chunks per vector store write (one segment)
+    INGEST_QUEUE_DEPTH: int = 4  # Batches buffered between pipeline stages
+    
+    # Upload Jobs
+    JOB_WORKERS: int = 1  # Threads per server process processing queued uploads
+    JOB_MAX_ATTEMPTS: int = 3
+    JOB_RETRY_BACKOFF: float = 5.0  # Seconds before the first retry; doubles per attempt
+    JOB_LEASE_SECONDS: float = 120.0  # A running job without a heartbeat for this long is requeued
+    JOB_POLL_INTERVAL: float = 1.0  # Seconds between checks for jobs queued by other processes
+    
+    # Vector Store
+    SEGMENT_COMPACT_THRESHOLD: int = 256  # Compact segment log on load past this many segments
+    INDEX_METRIC: str = "ip"  # ip (cosine on normalized embeddings) | l2
+    INDEX_TYPE: str = "auto"  # auto | flat | ivf_flat | hnsw | ivf_pq
+    ANN_MIN_VECTORS: int = 50_000  # Below this, exact flat search is used
+    PQ_MIN_VECTORS: int = 2_000_000  # auto switches from IVF-Flat to IVF-PQ here
+    ANN_REBUILD_GROWTH: float = 4.0  # Retrain once the corpus grows by this factor
+    ANN_TRAIN_SAMPLE: int = 100_000
+    IVF_NLIST: int = 0  # 0 = 4 * sqrt(num vectors)
+    IVF_NPROBE: int = 16
+    HNSW_M: int = 32
+    HNSW_EF_CONSTRUCTION: int = 200
+    HNSW_EF_SEARCH: int = 64
+    PQ_M: int = 48  # Sub-quantizers; must divide the embedding dimension
+    FILTER_EXACT_MAX: int = 2_000  # Filtered searches over at most this many chunks are scored exactly
+    VECTOR_STORAGE: str = "float32"  # float32 | fp16 | sq8 | pq codes in RAM; compressed modes keep exact vectors on disk
+    RESCORE_FACTOR: int = 4  # Compressed storage: top_k * this code-search hits are re-scored exactly
+    PQ_TRAIN_MIN: int = 10_000  # pq storage holds sq8 codes until this many vectors are available to train on
+    INDEX_MMAP: bool = True  # Memory-map IVF index lists read-only from the checkpoint (pages shared by worker processes)
+    ANN_PENDING_MAX: int = 50_000  # Vectors added to a mapped IVF index before it is copied into memory
+    SNAPSHOT_POLL_INTERVAL: float = 1.0  # Seconds between checks for index changes made by other processes (0 = off)
+    
+    # Metrics
+    METRICS_ENABLED: bool = True  # Per-stage latency histograms and counters on /api/metrics
+    METRICS_WINDOW: int = 1024  # Recent samples per stage used for p50/p95/p99
     
     class Config:
         env_file = ".env"
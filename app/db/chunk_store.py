@@ -0,0 +1,383 @@
+import fnmatch
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Dict, Optional, Iterable
+import numpy as np
+from loguru import logger
+
+# One fixed-width row per chunk; the row number is the chunk's vector ID
+RECORD_DTYPE = np.dtype([
+    ('text_offset', '<i8'),
+    ('text_length', '<i4'),
+    ('page', '<i4'),
+    ('page_end', '<i4'),
+    ('paper_key', '<i4'),
+    ('deleted', 'u1'),
+])
+FORMAT_VERSION = 2
+
+# Version 1 rows, before chunks could span pages
+LEGACY_RECORD_DTYPE = np.dtype([
+    ('text_offset', '<i8'),
+    ('text_length', '<i4'),
+    ('page', '<i4'),
+    ('paper_key', '<i4'),
+    ('deleted', 'u1'),
+])
+
+
+class ChunkStore:
+    """Columnar, memory-mapped chunk metadata
+    
+    Files under `path`:
+    - records.bin: RECORD_DTYPE rows, mapped read-only with np.memmap
+    - text.bin: concatenated UTF-8 chunk texts, addressed by offset/length
+    - papers.jsonl: append-only paper events (add / remove)
+    
+    Only the small paper table is held in Python objects; chunk text is read
+    from the mapped file for the hits that are actually returned, so load time
+    and RSS do not grow with the corpus. All files are append-only, except the
+    one-byte `deleted` flag which is updated in place.
+    
+    Several processes may open the same store: one appends at a time (the
+    VectorStore write lock), the others pick up its chunks with `refresh()`.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.papers: Dict[str, Dict] = {}  # paper_id -> {key, filename, upload_date, ranges, removed}
+        self._paper_by_key: Dict[int, Dict] = {}
+        self._records: Optional[np.memmap] = None
+        self._text = None
+        self._count = 0
+        self._text_size = 0
+        self._papers_offset = 0  # Bytes of papers.jsonl applied so far
+        
+        if self._records_path.exists() and not self._format_path.exists():
+            self._migrate_records()
+        self.refresh()
+    
+    @property
+    def _records_path(self) -> Path:
+        return self.path / "records.bin"
+    
+    @property
+    def _text_path(self) -> Path:
+        return self.path / "text.bin"
+    
+    @property
+    def _papers_path(self) -> Path:
+        return self.path / "papers.jsonl"
+    
+    @property
+    def _format_path(self) -> Path:
+        return self.path / "format.json"
+    
+    def _write_format(self):
+        with open(self._format_path, 'w') as f:
+            json.dump({'version': FORMAT_VERSION}, f)
+    
+    def _migrate_records(self):
+        """Rewrite version 1 rows in the current layout (page_end = page)"""
+        count = self._records_path.stat().st_size // LEGACY_RECORD_DTYPE.itemsize
+        old = np.fromfile(self._records_path, dtype=LEGACY_RECORD_DTYPE, count=count)
+        records = np.zeros(count, dtype=RECORD_DTYPE)
+        for name in LEGACY_RECORD_DTYPE.names:
+            records[name] = old[name]
+        records['page_end'] = old['page']
+        
+        tmp_path = self.path / "records.bin.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._records_path)
+        self._write_format()
+        logger.info(f"Migrated {count} chunk records to format version {FORMAT_VERSION}")
+    
+    def __len__(self) -> int:
+        """Number of rows ever written (the next chunk ID)"""
+        return self._count
+    
+    def refresh(self):
+        """Pick up chunks and paper events appended since the last look (by this or another process)
+        
+        A row or event line still being written is left for the next refresh.
+        """
+        if not self._records_path.exists():
+            return
+        self._count = max(self._count, self._records_path.stat().st_size // RECORD_DTYPE.itemsize)
+        self._text_size = max(self._text_size, self._text_path.stat().st_size if self._text_path.exists() else 0)
+        self._load_papers()
+    
+    def _load_papers(self):
+        """Apply the complete event lines past the applied offset"""
+        if not self._papers_path.exists():
+            return
+        with open(self._papers_path, 'rb') as f:
+            f.seek(self._papers_offset)
+            data = f.read()
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode('utf-8').splitlines():
+            if line.strip():
+                self._apply_paper_event(json.loads(line))
+        self._papers_offset += end
+    
+    def _apply_paper_event(self, event: Dict):
+        if event['op'] == 'add':
+            paper = self.papers.get(event['paper_id'])
+            if paper is None or paper['removed']:
+                key = paper['key'] if paper else event['key']
+                paper = {
+                    'key': key,
+                    'paper_id': event['paper_id'],
+                    'filename': event['filename'],
+                    'upload_date': event['upload_date'],
+                    'ranges': [],
+                    'removed': False
+                }
+                self.papers[event['paper_id']] = paper
+                self._paper_by_key[key] = paper
+            paper['ranges'].append((event['first_id'], event['count']))
+        elif event['op'] == 'remove':
+            paper = self._paper_by_key.get(event['key'])
+            if paper is not None:
+                paper['removed'] = True
+                paper['ranges'] = []
+        elif event['op'] == 'ranges':
+            paper = self._paper_by_key.get(event['key'])
+            if paper is not None:
+                paper['ranges'] = [tuple(r) for r in event['ranges']]
+    
+    def _write_paper_events(self, events: List[Dict]):
+        with open(self._papers_path, 'a', encoding='utf-8') as f:
+            for event in events:
+                f.write(json.dumps(event) + '\n')
+            self._papers_offset = f.tell()  # Writers are caught up, so everything before is applied
+        for event in events:
+            self._apply_paper_event(event)
+    
+    @property
+    def records(self) -> np.ndarray:
+        """Read-only view of all rows (re-mapped after appends)"""
+        if self._records is None or len(self._records) != self._count:
+            if self._count == 0:
+                return np.zeros(0, dtype=RECORD_DTYPE)
+            self._records = np.memmap(self._records_path, dtype=RECORD_DTYPE, mode='r', shape=(self._count,))
+        return self._records
+    
+    def _text_view(self) -> np.ndarray:
+        """Byte view of text.bin (re-mapped after appends)"""
+        if self._text is None or len(self._text) != self._text_size:
+            if self._text_size == 0:
+                return np.zeros(0, dtype=np.uint8)
+            self._text = np.memmap(self._text_path, dtype=np.uint8, mode='r', shape=(self._text_size,))
+        return self._text
+    
+    def append(self, metadata: List[Optional[Dict]]) -> np.ndarray:
+        """Append chunks, returning their IDs
+        
+        Consecutive chunks of one paper form one ID range. A None entry
+        reserves an ID without a chunk (used when migrating sparse IDs).
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        if not self._format_path.exists():
+            self._write_format()
+        first_id = self._count
+        ids = np.arange(first_id, first_id + len(metadata), dtype=np.int64)
+        
+        text_offset = self._text_size
+        records = np.zeros(len(metadata), dtype=RECORD_DTYPE)
+        blobs = []
+        events = []
+        now = time.time()
+        keys: Dict[str, int] = {}
+        next_key = len(self._paper_by_key)
+        
+        for i, meta in enumerate(metadata):
+            if meta is None:
+                records[i]['paper_key'] = -1
+                records[i]['deleted'] = 1
+                continue
+            
+            blob = meta['text'].encode('utf-8')
+            blobs.append(blob)
+            records[i]['text_offset'] = text_offset
+            records[i]['text_length'] = len(blob)
+            records[i]['page'] = meta.get('page') or 0
+            records[i]['page_end'] = meta.get('page_end') or records[i]['page']
+            text_offset += len(blob)
+            
+            paper_id = meta['paper_id']
+            if paper_id not in keys:
+                paper = self.papers.get(paper_id)
+                if paper is not None:
+                    keys[paper_id] = paper['key']
+                else:
+                    keys[paper_id] = next_key
+                    next_key += 1
+            records[i]['paper_key'] = keys[paper_id]
+            
+            if events and events[-1]['paper_id'] == paper_id and events[-1]['first_id'] + events[-1]['count'] == i + first_id:
+                events[-1]['count'] += 1
+            else:
+                events.append({
+                    'op': 'add',
+                    'key': keys[paper_id],
+                    'paper_id': paper_id,
+                    'filename': meta.get('filename', ''),
+                    'upload_date': meta.get('upload_date', now),
+                    'first_id': int(ids[i]),
+                    'count': 1
+                })
+        
+        if self._records_path.exists() and self._records_path.stat().st_size != first_id * RECORD_DTYPE.itemsize:
+            # Drop a row torn by a crash mid-append
+            os.truncate(self._records_path, first_id * RECORD_DTYPE.itemsize)
+        
+        # Text before rows, rows before the paper table: a crash leaves at worst unreferenced bytes
+        with open(self._text_path, 'ab') as f:
+            f.write(b''.join(blobs))
+            f.flush()
+            os.fsync(f.fileno())
+        with open(self._records_path, 'ab') as f:
+            f.write(records.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+        if events:
+            self._write_paper_events(events)
+        
+        self._count += len(metadata)
+        self._text_size = text_offset
+        return ids
+    
+    def mark_deleted(self, ids: Iterable[int]):
+        """Flag chunks as deleted (idempotent)"""
+        ids = np.asarray(list(ids), dtype=np.int64)
+        ids = ids[ids < self._count]
+        if len(ids) == 0:
+            return
+        writable = np.memmap(self._records_path, dtype=RECORD_DTYPE, mode='r+', shape=(self._count,))
+        writable['deleted'][ids] = 1
+        writable.flush()
+        del writable
+    
+    def remove_paper(self, paper_id: str) -> np.ndarray:
+        """Flag all chunks of a paper as deleted and record the removal"""
+        ids = self.paper_chunk_ids(paper_id)
+        self.mark_deleted(ids)
+        paper = self.papers.get(paper_id)
+        if paper is not None and not paper['removed']:
+            self._write_paper_events([{'op': 'remove', 'key': paper['key']}])
+        return ids
+    
+    def remove_chunks(self, paper_id: str, ids: np.ndarray):
+        """Flag some chunks of a paper as deleted, dropping its ID ranges left without live chunks"""
+        self.mark_deleted(ids)
+        paper = self.papers.get(paper_id)
+        if paper is None or paper['removed']:
+            return
+        ranges = [r for r in paper['ranges'] if len(self._live_ids([r]))]
+        if ranges:
+            self._write_paper_events([{'op': 'ranges', 'key': paper['key'], 'ranges': ranges}])
+        else:
+            self._write_paper_events([{'op': 'remove', 'key': paper['key']}])
+    
+    def paper_chunk_ids(self, paper_id: str) -> np.ndarray:
+        """Live chunk IDs of a paper"""
+        paper = self.papers.get(paper_id)
+        if paper is None or paper['removed']:
+            return np.zeros(0, dtype=np.int64)
+        return self._live_ids(paper['ranges'])
+    
+    def key_chunk_ids(self, keys: Iterable[int]) -> np.ndarray:
+        """Sorted live chunk IDs of the papers with the given keys"""
+        papers = [self._paper_by_key[key] for key in keys if key in self._paper_by_key]
+        return self._live_ids(sorted(r for paper in papers if not paper['removed'] for r in paper['ranges']))
+    
+    def _live_ids(self, ranges: List) -> np.ndarray:
+        """Expand (first_id, count) ranges into IDs, dropping deleted chunks"""
+        if not ranges:
+            return np.zeros(0, dtype=np.int64)
+        ranges = np.asarray(ranges, dtype=np.int64)
+        firsts, counts = ranges[:, 0], ranges[:, 1]
+        offsets = np.cumsum(counts) - counts
+        ids = np.arange(counts.sum(), dtype=np.int64) + np.repeat(firsts - offsets, counts)
+        return ids[self.records['deleted'][ids] == 0]
+    
+    def select(
+        self,
+        paper_ids: Optional[List[str]] = None,
+        filename: Optional[str] = None,
+        uploaded_after: Optional[float] = None,
+        uploaded_before: Optional[float] = None
+    ) -> np.ndarray:
+        """Sorted live chunk IDs of the papers matching every given condition
+        
+        `filename` is a case-insensitive glob; upload bounds are epoch seconds.
+        Resolved from the paper table's ID ranges, without touching chunk rows
+        other than their deleted flags.
+        """
+        if paper_ids is None:
+            papers = self.live_papers()
+        else:
+            papers = [self.papers[paper_id] for paper_id in set(paper_ids) if paper_id in self.papers]
+            papers = [paper for paper in papers if not paper['removed']]
+        
+        if filename:
+            pattern = filename.lower()
+            papers = [paper for paper in papers if fnmatch.fnmatchcase(paper['filename'].lower(), pattern)]
+        if uploaded_after is not None:
+            papers = [paper for paper in papers if paper['upload_date'] >= uploaded_after]
+        if uploaded_before is not None:
+            papers = [paper for paper in papers if paper['upload_date'] < uploaded_before]
+        
+        return self._live_ids(sorted(r for paper in papers for r in paper['ranges']))
+    
+    def is_live(self, chunk_id: int) -> bool:
+        return 0 <= chunk_id < self._count and not self.records['deleted'][chunk_id]
+    
+    def text(self, chunk_id: int) -> str:
+        """Text of a chunk (deleted chunks included)"""
+        record = self.records[chunk_id]
+        offset = int(record['text_offset'])
+        return bytes(self._text_view()[offset:offset + int(record['text_length'])]).decode('utf-8')
+    
+    def get(self, chunk_id: int) -> Optional[Dict]:
+        """Metadata and text of one chunk, or None if deleted"""
+        if not self.is_live(chunk_id):
+            return None
+        
+        record = self.records[chunk_id]
+        text = self.text(chunk_id)
+        paper = self._paper_by_key.get(int(record['paper_key']), {})
+        
+        return {
+            'text': text,
+            'page': int(record['page']),
+            'page_end': int(record['page_end']),
+            'paper_id': paper.get('paper_id'),
+            'filename': paper.get('filename')
+        }
+    
+    def live_papers(self) -> List[Dict]:
+        return [paper for paper in self.papers.values() if not paper['removed']]
+    
+    @property
+    def num_live(self) -> int:
+        return int(self._count - self.records['deleted'].sum()) if self._count else 0
+    
+    def clear(self):
+        """Delete all chunks and papers"""
+        for file_path in (self._records_path, self._text_path, self._papers_path):
+            if file_path.exists():
+                file_path.unlink()
+        self.papers = {}
+        self._paper_by_key = {}
+        self._records = None
+        self._text = None
+        self._count = 0
+        self._text_size = 0
+        self._papers_offset = 0
@@ -0,0 +1,117 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Dict, Optional
+from app.config import settings
+import numpy as np
+
+class ContentCache:
+    """Persistent content-addressed cache (SQLite)
+    
+    - embeddings: (model, SHA-256 of normalized chunk text) -> float32 vector,
+      so identical chunks (re-uploads, renamed copies, unchanged pages of a
+      revised paper) are never embedded twice.
+    - files: SHA-256 of the uploaded PDF -> paper it was indexed as, so an
+      identical upload can be answered without any processing.
+    """
+    
+    BATCH = 500  # Stay below SQLite's bound-parameter limit
+    
+    def __init__(self, path: Path = None):
+        self.path = path or settings.EMBEDDING_CACHE_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash BLOB NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash)) WITHOUT ROWID"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "file_hash TEXT PRIMARY KEY, paper_id TEXT NOT NULL, filename TEXT NOT NULL, "
+            "num_chunks INTEGER NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def text_hash(text: str) -> bytes:
+        """SHA-256 of whitespace-normalized text"""
+        return hashlib.sha256(' '.join(text.split()).encode('utf-8')).digest()
+    
+    def get_embeddings(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """Cached vectors for each text, or None where missing"""
+        hashes = [self.text_hash(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        
+        with self._lock:
+            unique = list(set(hashes))
+            for start in range(0, len(unique), self.BATCH):
+                batch = unique[start:start + self.BATCH]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({placeholders})",
+                    [model, *batch]
+                ).fetchall()
+                for text_hash, vector in rows:
+                    found[bytes(text_hash)] = np.frombuffer(vector, dtype=np.float32)
+        
+        results = [found.get(h) for h in hashes]
+        hits = sum(r is not None for r in results)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+    
+    def put_embeddings(self, model: str, texts: List[str], embeddings: np.ndarray):
+        rows = [
+            (model, self.text_hash(text), np.asarray(vector, dtype=np.float32).tobytes())
+            for text, vector in zip(texts, embeddings)
+        ]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (model, text_hash, vector) VALUES (?, ?, ?)", rows
+            )
+            self._conn.commit()
+    
+    def lookup_file(self, file_hash: str) -> Optional[Dict]:
+        """Paper previously indexed from a file with this hash"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT paper_id, filename, num_chunks FROM files WHERE file_hash = ?", (file_hash,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {'paper_id': row[0], 'filename': row[1], 'num_chunks': row[2]}
+    
+    def record_file(self, file_hash: str, paper_id: str, filename: str, num_chunks: int):
+        with self._lock:
+            # A paper ID maps to a single file; a re-upload with new content replaces it
+            self._conn.execute("DELETE FROM files WHERE paper_id = ?", (paper_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (file_hash, paper_id, filename, num_chunks, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_hash, paper_id, filename, num_chunks, time.time())
+            )
+            self._conn.commit()
+    
+    def forget_paper(self, paper_id: str):
+        """Drop file records for a removed paper (chunk embeddings stay reusable)"""
+        with self._lock:
+            self._conn.execute("DELETE FROM files WHERE paper_id = ?", (paper_id,))
+            self._conn.commit()
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            embeddings = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            files = self._conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        return {'embeddings': embeddings, 'files': files, 'hits': self.hits, 'misses': self.misses}
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
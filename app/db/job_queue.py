@@ -0,0 +1,224 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, List, Optional
+from app.config import settings
+
+STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+
+COLUMNS = (
+    "id", "paper_id", "filename", "file_path", "file_hash", "priority", "status", "stage", "progress",
+    "attempts", "cancel_requested", "error", "num_chunks", "created_at", "available_at", "started_at",
+    "heartbeat_at", "finished_at"
+)
+
+
+class JobQueue:
+    """Persistent upload job queue (SQLite)
+    
+    Shared by every worker process opening the same file. Jobs are claimed
+    highest priority first, then oldest first, inside an IMMEDIATE
+    transaction, so each job runs in exactly one worker. A running job
+    whose worker stops heartbeating for JOB_LEASE_SECONDS (a crashed
+    process) is handed out again.
+    
+    Failed attempts are retried after JOB_RETRY_BACKOFF * 2^(attempt - 1)
+    seconds, up to JOB_MAX_ATTEMPTS. Cancelling a running job only sets a
+    flag; the worker checks it between stages.
+    """
+    
+    def __init__(self, path: Path = None):
+        self.path = path or settings.JOBS_DB_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, paper_id TEXT NOT NULL, filename TEXT NOT NULL, file_path TEXT NOT NULL, "
+            "file_hash TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL, stage TEXT, "
+            "progress TEXT NOT NULL DEFAULT '{}', attempts INTEGER NOT NULL DEFAULT 0, "
+            "cancel_requested INTEGER NOT NULL DEFAULT 0, error TEXT, num_chunks INTEGER, "
+            "created_at REAL NOT NULL, available_at REAL NOT NULL, started_at REAL, heartbeat_at REAL, "
+            "finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, priority, created_at)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_by_file ON jobs (file_hash)")
+        self._conn.commit()
+    
+    def submit(self, paper_id: str, filename: str, file_path: Path, file_hash: str, priority: int = 0) -> Dict:
+        """Queue a stored upload for processing"""
+        now = time.time()
+        job_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, paper_id, filename, file_path, file_hash, priority, status, "
+                "created_at, available_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?)",
+                (job_id, paper_id, filename, str(file_path), file_hash, priority, now, now)
+            )
+            self._conn.commit()
+        return self.get(job_id)
+    
+    def get(self, job_id: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row else None
+    
+    def find_active(self, file_hash: str) -> Optional[Dict]:
+        """A queued or running job for the same file contents"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM jobs WHERE file_hash = ? AND status IN ('queued', 'running') "
+                "ORDER BY created_at LIMIT 1",
+                (file_hash,)
+            ).fetchone()
+        return self._job(row) if row else None
+    
+    def list(self, status: str = None, limit: int = 100) -> List[Dict]:
+        """Most recent jobs first"""
+        query = f"SELECT {', '.join(COLUMNS)} FROM jobs"
+        params: list = []
+        if status:
+            query += " WHERE status = ?"
+            params.append(status)
+        query += " ORDER BY created_at DESC LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [self._job(row) for row in rows]
+    
+    def claim(self) -> Optional[Dict]:
+        """Take the next runnable job, marking it running (None when the queue is empty)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs left running by a worker that stopped heartbeating go back to the queue
+                self._conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'queued' END, "
+                    "error = 'Worker stopped responding', available_at = ?, "
+                    "finished_at = CASE WHEN attempts >= ? THEN ? END "
+                    "WHERE status = 'running' AND heartbeat_at < ?",
+                    (settings.JOB_MAX_ATTEMPTS, now, settings.JOB_MAX_ATTEMPTS, now, now - settings.JOB_LEASE_SECONDS)
+                )
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' AND available_at <= ? "
+                    "ORDER BY priority DESC, created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'running', stage = NULL, attempts = attempts + 1, "
+                        "started_at = ?, heartbeat_at = ?, error = NULL WHERE id = ?",
+                        (now, now, row[0])
+                    )
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return self.get(row[0]) if row else None
+    
+    def update(self, job_id: str, stage: str, progress: Dict) -> bool:
+        """Record stage progress (also the heartbeat); False once cancellation was requested"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET stage = ?, progress = ?, heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                (stage, json.dumps(progress), time.time(), job_id)
+            )
+            self._conn.commit()
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return not (row and row[0])
+    
+    def heartbeat(self, job_ids: List[str]):
+        """Keep the lease of running jobs during a long stage"""
+        if not job_ids:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                [(time.time(), job_id) for job_id in job_ids]
+            )
+            self._conn.commit()
+    
+    def complete(self, job_id: str, num_chunks: int, stage: str = "done"):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'completed', stage = ?, num_chunks = ?, finished_at = ? WHERE id = ?",
+                (stage, num_chunks, time.time(), job_id)
+            )
+            self._conn.commit()
+    
+    def fail(self, job_id: str, error: str, retry: bool = True) -> str:
+        """Requeue a failed attempt with backoff, or fail the job for good; returns the new status"""
+        now = time.time()
+        with self._lock:
+            attempts, cancel_requested = self._conn.execute(
+                "SELECT attempts, cancel_requested FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+            if cancel_requested:
+                status = "cancelled"
+            elif retry and attempts < settings.JOB_MAX_ATTEMPTS:
+                status = "queued"
+            else:
+                status = "failed"
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, available_at = ?, finished_at = ? WHERE id = ?",
+                (
+                    status, error, now + settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1),
+                    None if status == "queued" else now, job_id
+                )
+            )
+            self._conn.commit()
+        return status
+    
+    def release(self, job_id: str):
+        """Put back a job its worker stopped before finishing, without counting the attempt"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = CASE WHEN cancel_requested THEN 'cancelled' ELSE 'queued' END, "
+                "attempts = attempts - 1, available_at = ? WHERE id = ? AND status = 'running'",
+                (time.time(), job_id)
+            )
+            self._conn.commit()
+    
+    def cancel(self, job_id: str) -> Optional[Dict]:
+        """Cancel a queued job now, or ask the worker running it to stop; None if unknown"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, finished_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, job_id)
+            )
+            self._conn.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = 'running'", (job_id,))
+            self._conn.commit()
+        return self.get(job_id)
+    
+    def cancelled(self, job_id: str):
+        """A running job stopped at its worker's request"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ?", (time.time(), job_id)
+            )
+            self._conn.commit()
+    
+    def counts(self) -> Dict[str, int]:
+        """Number of jobs per status"""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {**dict.fromkeys(STATUSES, 0), **dict(rows)}
+    
+    @staticmethod
+    def _job(row) -> Dict:
+        job = dict(zip(COLUMNS, row))
+        job['progress'] = json.loads(job['progress'])
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
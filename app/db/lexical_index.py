@@ -0,0 +1,323 @@
+import json
+import os
+import re
+import threading
+import uuid
+from collections import Counter
+from pathlib import Path
+from typing import List, Dict, Optional, Tuple
+import numpy as np
+from app.config import settings
+
+# Keeps compound scientific tokens together: "z≈6.5", "j0437-4715", "ngc1275", "hα"
+TOKEN_RE = re.compile(r"\w+(?:[.+\-≈~/]\w+)*")
+PART_RE = re.compile(r"\w+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with "
+    "we our these those their there been can also not but such than then into".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased tokens; compound tokens also contribute their parts ("z≈6.5" -> z≈6.5, z, 6, 5)"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        tokens.append(token)
+        parts = PART_RE.findall(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part not in STOPWORDS)
+    return tokens
+
+
+class PostingsSegment:
+    """Immutable CSR postings: for terms[i], docs/tfs[indptr[i]:indptr[i + 1]]"""
+    
+    def __init__(self, terms: np.ndarray, indptr: np.ndarray, docs: np.ndarray, tfs: np.ndarray, name: str = None):
+        self.terms = terms
+        self.indptr = indptr
+        self.docs = docs
+        self.tfs = tfs
+        self.name = name  # File stem once persisted
+    
+    @classmethod
+    def build(cls, term_ids: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray) -> "PostingsSegment":
+        """Group (term, doc, tf) triples by term. Input must be in ascending doc order."""
+        # Stable sort keeps docs ascending within a term; on a merge of two
+        # already-sorted runs it is close to linear
+        order = np.argsort(term_ids, kind='stable')
+        term_ids, doc_ids, tfs = term_ids[order], doc_ids[order], tfs[order]
+        terms, starts = np.unique(term_ids, return_index=True)
+        indptr = np.append(starts, len(term_ids)).astype(np.int64)
+        return cls(terms.astype(np.int32), indptr, doc_ids.astype(np.uint32), tfs.astype(np.uint16))
+    
+    def __len__(self) -> int:
+        return len(self.docs)
+    
+    def postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        i = np.searchsorted(self.terms, term_id)
+        if i == len(self.terms) or self.terms[i] != term_id:
+            return self.docs[:0], self.tfs[:0]
+        return self.docs[self.indptr[i]:self.indptr[i + 1]], self.tfs[self.indptr[i]:self.indptr[i + 1]]
+    
+    def triples(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Expand back to parallel (term, doc, tf) arrays"""
+        term_ids = np.repeat(self.terms, np.diff(self.indptr))
+        return term_ids, np.asarray(self.docs), np.asarray(self.tfs)
+    
+    def save(self, directory: Path):
+        """Write each array as .npy (files are never modified afterwards)"""
+        directory.mkdir(parents=True, exist_ok=True)
+        name = uuid.uuid4().hex
+        for field in ("terms", "indptr", "docs", "tfs"):
+            tmp_path = directory / f"{name}.{field}.tmp.npy"
+            np.save(tmp_path, getattr(self, field))
+            os.replace(tmp_path, directory / f"{name}.{field}.npy")
+        self.name = name
+    
+    @classmethod
+    def load(cls, directory: Path, name: str) -> "PostingsSegment":
+        """Memory-map a saved segment"""
+        arrays = [np.load(directory / f"{name}.{field}.npy", mmap_mode='r') for field in ("terms", "indptr", "docs", "tfs")]
+        return cls(*arrays, name=name)
+
+
+class LexicalIndex:
+    """In-process BM25 inverted index keyed by chunk ID
+    
+    Postings are stored as NumPy arrays in immutable segments. Each add
+    builds a small segment and segments of similar size are merged
+    (log-structured), so updates stay incremental and a query touches only a
+    handful of arrays per term. Removed chunks are masked at query time and
+    dropped at the next merge.
+    """
+    
+    MERGE_FACTOR = 4  # Merge the newest segments once they approach the size of the one before
+    COMMON_TERM_FRACTION = 0.05
+    
+    def __init__(self, k1: float = None, b: float = None):
+        self.k1 = settings.BM25_K1 if k1 is None else k1
+        self.b = settings.BM25_B if b is None else b
+        self.vocab: Dict[str, int] = {}
+        self.terms: List[str] = []
+        self.segments: List[PostingsSegment] = []
+        self.doc_len = np.zeros(0, dtype=np.float32)
+        self.live = np.zeros(0, dtype=bool)
+        self.num_docs = 0
+        self.total_len = 0.0
+        self._saved_terms = 0
+        self._terms_bytes = 0  # Size of terms.txt covering the first _saved_terms terms
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return self.num_docs
+    
+    def _grow(self, size: int):
+        if size > len(self.doc_len):
+            capacity = max(size, 2 * len(self.doc_len), 1024)
+            doc_len = np.zeros(capacity, dtype=np.float32)
+            doc_len[:len(self.doc_len)] = self.doc_len
+            live = np.zeros(capacity, dtype=bool)
+            live[:len(self.live)] = self.live
+            self.doc_len, self.live = doc_len, live
+    
+    def add(self, ids: np.ndarray, texts: List[str]):
+        """Index chunks under their vector IDs (IDs must be higher than any indexed before)"""
+        term_ids, doc_ids, tfs = [], [], []
+        lengths = np.zeros(len(ids), dtype=np.float32)
+        
+        with self._lock:
+            for i, (chunk_id, text) in enumerate(zip(ids.tolist(), texts)):
+                tokens = tokenize(text)
+                lengths[i] = len(tokens)
+                for term, count in Counter(tokens).items():
+                    term_id = self.vocab.get(term)
+                    if term_id is None:
+                        term_id = self.vocab[term] = len(self.terms)
+                        self.terms.append(term)
+                    term_ids.append(term_id)
+                    doc_ids.append(chunk_id)
+                    tfs.append(min(count, 65535))
+            
+            if len(ids):
+                self._grow(int(ids.max()) + 1)
+                self.doc_len[ids] = lengths
+                self.live[ids] = True
+                self.num_docs += len(ids)
+                self.total_len += float(lengths.sum())
+            
+            if term_ids:
+                segment = PostingsSegment.build(
+                    np.array(term_ids, dtype=np.int32), np.array(doc_ids, dtype=np.uint32), np.array(tfs, dtype=np.uint16)
+                )
+                self.segments = self._merged(self.segments + [segment])
+    
+    def remove(self, ids: np.ndarray):
+        with self._lock:
+            ids = ids[ids < len(self.live)]
+            ids = ids[self.live[ids]]
+            self.live[ids] = False
+            self.num_docs -= len(ids)
+            self.total_len -= float(self.doc_len[ids].sum())
+    
+    def _merged(self, segments: List[PostingsSegment]) -> List[PostingsSegment]:
+        """Merge trailing segments while the newest is within MERGE_FACTOR of its predecessor"""
+        segments = list(segments)
+        while len(segments) > 1 and len(segments[-1]) * self.MERGE_FACTOR >= len(segments[-2]):
+            newer, older = segments.pop(), segments.pop()
+            segments.append(self._merge([older, newer]))
+        return segments
+    
+    def _merge(self, segments: List[PostingsSegment]) -> PostingsSegment:
+        """Merge segments, oldest first (chunk IDs only grow, so docs stay ascending)"""
+        parts = [segment.triples() for segment in segments]
+        term_ids = np.concatenate([part[0] for part in parts])
+        doc_ids = np.concatenate([part[1] for part in parts])
+        tfs = np.concatenate([part[2] for part in parts])
+        
+        keep = self.live[doc_ids.astype(np.int64)]
+        return PostingsSegment.build(term_ids[keep], doc_ids[keep], tfs[keep])
+    
+    def search(self, query_text: str, top_k: int = 10, ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        """Top-k (chunk ID, BM25 score) for a query, optionally only among `ids`
+        
+        Terms in more than COMMON_TERM_FRACTION of chunks only add to the
+        scores of chunks matched by a rarer query term (as Lucene's common
+        terms query does), so their long posting lists are probed with a
+        binary search instead of scanned. Queries made only of common terms
+        are scored exhaustively.
+        """
+        # Snapshot: adds replace these objects rather than mutating them
+        segments, doc_len, live = self.segments, self.doc_len, self.live
+        num_docs = self.num_docs
+        if not segments or num_docs == 0:
+            return []
+        if ids is not None:
+            # Filtered chunks drop out with the deleted ones; statistics stay corpus-wide
+            allowed = np.zeros(len(live), dtype=bool)
+            allowed[ids[ids < len(live)]] = True
+            live = live & allowed
+        
+        avgdl = self.total_len / num_docs
+        terms = []
+        for term in set(tokenize(query_text)):
+            term_id = self.vocab.get(term)
+            if term_id is not None:
+                postings = [segment.postings(term_id) for segment in segments]
+                df = sum(len(docs) for docs, _ in postings)
+                if df:
+                    terms.append((df, postings))
+        if not terms:
+            return []
+        
+        def bm25(df: int, docs: np.ndarray, tfs: np.ndarray) -> np.ndarray:
+            idf = np.log1p((num_docs - df + 0.5) / (df + 0.5))
+            tfs = tfs.astype(np.float32)
+            return idf * tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b * doc_len[docs] / avgdl))
+        
+        common_df = self.COMMON_TERM_FRACTION * num_docs
+        rare = [term for term in terms if term[0] <= common_df]
+        common = [term for term in terms if term[0] > common_df]
+        if not rare:
+            rare, common = terms, []
+        
+        docs, scores = [], []
+        for df, postings in rare:
+            for term_docs, term_tfs in postings:
+                term_docs = term_docs.astype(np.int64)
+                docs.append(term_docs)
+                scores.append(bm25(df, term_docs, term_tfs))
+        docs = np.concatenate(docs)
+        scores = np.concatenate(scores)
+        mask = live[docs]
+        docs, scores = docs[mask], scores[mask]
+        if len(docs) == 0:
+            return []
+        
+        if len(docs) > len(live) // 16:
+            # Dense accumulator is cheaper than sorting long posting lists
+            totals = np.bincount(docs, weights=scores, minlength=len(live))
+            candidates = np.flatnonzero(totals)
+            totals = totals[candidates]
+        else:
+            candidates, inverse = np.unique(docs, return_inverse=True)
+            totals = np.bincount(inverse, weights=scores)
+        
+        # Common terms: look up each candidate in the (doc-sorted) posting lists
+        needles = candidates.astype(np.uint32)  # Same dtype as postings, so searchsorted does not copy them
+        for df, postings in common:
+            for term_docs, term_tfs in postings:
+                positions = np.searchsorted(term_docs, needles)
+                positions[positions == len(term_docs)] = 0
+                found = term_docs[positions] == needles
+                if found.any():
+                    totals[found] += bm25(df, candidates[found], term_tfs[positions[found]])
+        
+        k = min(top_k, len(candidates))
+        top = np.argpartition(-totals, k - 1)[:k]
+        top = top[np.argsort(-totals[top])]
+        return [(int(candidates[i]), float(totals[i])) for i in top]
+    
+    def save(self, directory: Path, last_segment: int):
+        """Persist new segments, new vocabulary and document stats, then publish a manifest"""
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            segments = self.segments
+            for segment in segments:
+                if segment.name is None:
+                    segment.save(directory / "segments")
+            
+            # Append-only vocabulary; cut anything written after the last manifest
+            with open(directory / "terms.txt", 'ab') as f:
+                f.truncate(self._terms_bytes)
+                f.write(''.join(term + '\n' for term in self.terms[self._saved_terms:]).encode('utf-8'))
+                self._terms_bytes = f.tell()
+            self._saved_terms = len(self.terms)
+            
+            np.save(directory / "doc_len.tmp.npy", self.doc_len)
+            np.save(directory / "live.tmp.npy", self.live)
+            os.replace(directory / "doc_len.tmp.npy", directory / "doc_len.npy")
+            os.replace(directory / "live.tmp.npy", directory / "live.npy")
+            
+            manifest = {
+                'segments': [segment.name for segment in segments],
+                'num_terms': len(self.terms),
+                'num_docs': self.num_docs,
+                'total_len': self.total_len,
+                'last_segment': last_segment
+            }
+            with open(directory / "manifest.tmp.json", 'w') as f:
+                json.dump(manifest, f)
+            os.replace(directory / "manifest.tmp.json", directory / "manifest.json")
+        
+        # Drop segment files merged away since the previous save
+        current = set(manifest['segments'])
+        for path in (directory / "segments").glob("*.npy"):
+            if path.name.split('.')[0] not in current:
+                path.unlink()
+    
+    @classmethod
+    def load(cls, directory: Path) -> Optional[Tuple["LexicalIndex", int]]:
+        """Load a saved index, returning it with the vector store segment it is current to"""
+        manifest_path = directory / "manifest.json"
+        if not manifest_path.exists():
+            return None
+        
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        
+        index = cls()
+        with open(directory / "terms.txt", 'rb') as f:
+            lines = f.read().split(b'\n')[:manifest['num_terms']]
+        index.terms = [line.decode('utf-8') for line in lines]
+        index.vocab = {term: i for i, term in enumerate(index.terms)}
+        index._saved_terms = len(index.terms)
+        index._terms_bytes = sum(len(line) + 1 for line in lines)
+        index.segments = [PostingsSegment.load(directory / "segments", name) for name in manifest['segments']]
+        index.doc_len = np.load(directory / "doc_len.npy")
+        index.live = np.load(directory / "live.npy")  # Loaded writable: removals update it in place
+        index.num_docs = manifest['num_docs']
+        index.total_len = manifest['total_len']
+        return index, manifest['last_segment']
@@ -0,0 +1,112 @@
+import os
+from pathlib import Path
+from typing import List, Optional, Tuple
+import numpy as np
+
+
+class PaperCentroids:
+    """Mean chunk embedding per paper, for coarse-to-fine search
+    
+    Rows are ChunkStore paper keys. Running sums and chunk counts are
+    updated as chunks are added and removed, so upkeep costs O(changed
+    chunks); the normalized centroid matrix is rebuilt on the first search
+    after a change. Scoring is by inner product of normalized vectors,
+    which ranks like cosine similarity and, for normalized embeddings, like
+    L2 distance.
+    """
+    
+    def __init__(self, dimension: int = None):
+        self.dimension = dimension
+        self.sums = np.zeros((0, dimension or 0), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self._centroids: Optional[np.ndarray] = None
+    
+    def __len__(self) -> int:
+        """Number of papers with at least one chunk"""
+        return int((self.counts > 0).sum())
+    
+    def _grow(self, num_keys: int, dimension: int):
+        if self.dimension is None:
+            self.dimension = dimension
+            self.sums = np.zeros((0, dimension), dtype=np.float32)
+        if num_keys > len(self.sums):
+            size = max(num_keys, 2 * len(self.sums))
+            self.sums = np.vstack([self.sums, np.zeros((size - len(self.sums), self.dimension), dtype=np.float32)])
+            self.counts = np.concatenate([self.counts, np.zeros(size - len(self.counts), dtype=np.int64)])
+    
+    def _per_key(self, keys: np.ndarray, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Distinct keys with their vector sums and chunk counts"""
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        unique, starts, counts = np.unique(keys, return_index=True, return_counts=True)
+        return unique, np.add.reduceat(np.asarray(vectors, dtype=np.float32)[order], starts, axis=0), counts
+    
+    def add(self, keys: np.ndarray, vectors: np.ndarray):
+        """Account for new chunks of the papers with the given keys"""
+        keys = np.asarray(keys, dtype=np.int64)
+        if len(keys) == 0:
+            return
+        self._grow(int(keys.max()) + 1, vectors.shape[1])
+        unique, sums, counts = self._per_key(keys, vectors)
+        self.sums[unique] += sums
+        self.counts[unique] += counts
+        self._centroids = None
+    
+    def remove(self, keys: np.ndarray, vectors: np.ndarray):
+        """Account for removed chunks; papers left without chunks drop out"""
+        keys = np.asarray(keys, dtype=np.int64)
+        keys_known = keys < len(self.counts)
+        keys, vectors = keys[keys_known], vectors[keys_known]
+        if len(keys) == 0:
+            return
+        unique, sums, counts = self._per_key(keys, vectors)
+        self.sums[unique] -= sums
+        self.counts[unique] -= counts
+        empty = unique[self.counts[unique] <= 0]
+        self.sums[empty] = 0.0  # No rounding residue left behind
+        self.counts[empty] = 0
+        self._centroids = None
+    
+    def centroids(self) -> np.ndarray:
+        """Normalized centroid of every paper key (zero rows for keys without chunks)"""
+        if self._centroids is None:
+            norms = np.linalg.norm(self.sums, axis=1, keepdims=True)
+            self._centroids = self.sums / np.maximum(norms, 1e-12)
+        return self._centroids
+    
+    def top(self, query_embeddings: np.ndarray, num_papers: int, keys: Optional[np.ndarray] = None) -> List[np.ndarray]:
+        """Keys of the num_papers best-matching papers per query, best first
+        
+        `keys` limits the choice to those papers (e.g. the ones a filter matched).
+        """
+        candidates = np.flatnonzero(self.counts > 0)
+        if keys is not None:
+            candidates = np.intersect1d(candidates, keys)
+        if len(candidates) == 0:
+            return [candidates for _ in query_embeddings]
+        
+        scores = np.asarray(query_embeddings, dtype=np.float32) @ self.centroids()[candidates].T
+        if num_papers < len(candidates):
+            best = np.argpartition(-scores, num_papers - 1, axis=1)[:, :num_papers]
+        else:
+            best = np.broadcast_to(np.arange(len(candidates)), (len(scores), len(candidates)))
+        order = np.argsort(-np.take_along_axis(scores, best, axis=1), axis=1, kind='stable')
+        return list(candidates[np.take_along_axis(best, order, axis=1)])
+    
+    def save(self, path: Path, last_segment: int):
+        """Write sums and counts as of the given segment (atomically replaced)"""
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            np.savez(f, sums=self.sums, counts=self.counts, last_segment=np.int64(last_segment))
+        os.replace(tmp_path, path)
+    
+    @classmethod
+    def load(cls, path: Path) -> Optional[Tuple["PaperCentroids", int]]:
+        """Saved centroids and the segment they are current to, or None if absent"""
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            centroids = cls(data['sums'].shape[1])
+            centroids.sums = data['sums']
+            centroids.counts = data['counts']
+            return centroids, int(data['last_segment'])
@@ -0,0 +1,83 @@
+import fcntl
+import json
+import os
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Optional
+
+MANIFEST_NAME = "manifest.json"
+
+
+class FileLock:
+    """Reentrant flock(2) lock shared by every process opening the same file
+    
+    Writers hold it exclusively, loads hold it shared. Callers within one
+    process must already be serialized (VectorStore holds its RLock), so
+    the nesting count needs no lock of its own. A nested hold keeps the
+    mode of the outermost one.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd: Optional[int] = None
+        self._depth = 0
+    
+    def acquire(self, shared: bool = False, blocking: bool = True) -> bool:
+        if self._depth == 0:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            flags = (fcntl.LOCK_SH if shared else fcntl.LOCK_EX) | (0 if blocking else fcntl.LOCK_NB)
+            try:
+                fcntl.flock(fd, flags)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            self._fd = fd
+        self._depth += 1
+        return True
+    
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+    
+    @contextmanager
+    def hold(self, shared: bool = False):
+        self.acquire(shared)
+        try:
+            yield
+        finally:
+            self.release()
+
+
+def read_manifest(path: Path) -> Optional[Dict]:
+    """The published snapshot of the store at `path`, or None before the first publish
+    
+    Keys: version (bumped on every write), checkpoint (bumped on every
+    checkpoint) and last_segment.
+    """
+    try:
+        with open(path / MANIFEST_NAME, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def write_manifest(path: Path, version: int, checkpoint: int, last_segment: int):
+    """Atomically publish a new snapshot version
+    
+    Not fsynced: the manifest only tells other processes that something
+    changed; loading never depends on it.
+    """
+    tmp_path = path / f"{MANIFEST_NAME}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({
+            'version': version,
+            'checkpoint': checkpoint,
+            'last_segment': last_segment,
+            'published': time.time()
+        }, f)
+    os.replace(tmp_path, path / MANIFEST_NAME)
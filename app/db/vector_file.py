@@ -0,0 +1,108 @@
+import json
+import os
+from pathlib import Path
+from typing import Optional
+import numpy as np
+
+
+class VectorFile:
+    """Exact float32 embeddings by chunk ID, memory-mapped
+    
+    Backs compressed vector storage: the FAISS index keeps only codes in RAM
+    and its candidates are re-scored with these vectors.
+    
+    Files under `path`:
+    - vectors.bin: row i is chunk i's embedding (zeros for IDs without one)
+    - format.json: the row dimension
+    
+    Rows are read through a read-only np.memmap, so processes opening the
+    same store share one copy in the page cache. Writes are not synced until
+    `flush()`; the segment log is what makes an upload durable.
+    """
+    
+    def __init__(self, path: Path):
+        self.path = path
+        self.dimension: Optional[int] = None
+        self._vectors: Optional[np.memmap] = None
+        self._count = 0
+        self.refresh()
+    
+    def refresh(self):
+        """Pick up rows written by another process"""
+        if self.dimension is None and self._format_path.exists():
+            with open(self._format_path, 'r') as f:
+                self.dimension = json.load(f)['dimension']
+        if self.dimension is not None and self._vectors_path.exists():
+            self._count = max(self._count, self._vectors_path.stat().st_size // self._row_size)
+    
+    @property
+    def _vectors_path(self) -> Path:
+        return self.path / "vectors.bin"
+    
+    @property
+    def _format_path(self) -> Path:
+        return self.path / "format.json"
+    
+    @property
+    def _row_size(self) -> int:
+        return self.dimension * np.dtype(np.float32).itemsize
+    
+    def __len__(self) -> int:
+        """Number of rows (one past the highest chunk ID written)"""
+        return self._count
+    
+    @property
+    def vectors(self) -> np.ndarray:
+        """Read-only view of all rows (re-mapped after writes past the end)"""
+        if self._vectors is None or len(self._vectors) != self._count:
+            if self._count == 0:
+                return np.zeros((0, self.dimension or 0), dtype=np.float32)
+            self._vectors = np.memmap(
+                self._vectors_path, dtype=np.float32, mode='r', shape=(self._count, self.dimension)
+            )
+        return self._vectors
+    
+    def write(self, ids: np.ndarray, vectors: np.ndarray):
+        """Store the vectors of the given chunk IDs, overwriting existing rows"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        if self.dimension is None:
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.dimension = vectors.shape[1]
+            with open(self._format_path, 'w') as f:
+                json.dump({'dimension': self.dimension}, f)
+        
+        fd = os.open(self._vectors_path, os.O_WRONLY | os.O_CREAT)
+        try:
+            # One write per run of consecutive IDs (a single run for every append)
+            bounds = np.concatenate([[0], np.flatnonzero(np.diff(ids) != 1) + 1, [len(ids)]])
+            for start, end in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+                os.pwrite(fd, vectors[start:end].tobytes(), int(ids[start]) * self._row_size)
+        finally:
+            os.close(fd)
+        self._count = max(self._count, int(ids.max()) + 1)
+    
+    def get(self, ids: np.ndarray) -> np.ndarray:
+        """Vectors of the given chunk IDs (a copy)"""
+        return np.asarray(self.vectors[np.asarray(ids, dtype=np.int64)])
+    
+    def flush(self):
+        """Sync written rows to disk"""
+        if not self._vectors_path.exists():
+            return
+        fd = os.open(self._vectors_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def clear(self):
+        """Delete all vectors"""
+        for file_path in (self._vectors_path, self._format_path):
+            if file_path.exists():
+                file_path.unlink()
+        self.dimension = None
+        self._vectors = None
+        self._count = 0
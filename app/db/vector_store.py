@@ -1,105 +1,1221 @@
 import faiss
 import numpy as np
+import os
 import pickle
+import shutil
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Dict
+from typing import List, Dict, Optional
 from loguru import logger
 from app.config import settings
+from app.db.chunk_store import ChunkStore
+from app.db.lexical_index import LexicalIndex
+from app.db.paper_centroids import PaperCentroids
+from app.db.snapshot import FileLock, read_manifest, write_manifest
+from app.db.vector_file import VectorFile
+from app.utils.metrics import count, timed
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+VECTOR_STORAGES = ("float32", "fp16", "sq8", "pq")
+
+
+def metric_type(metric: str = None) -> int:
+    """Map the INDEX_METRIC setting to a FAISS metric"""
+    metric = metric or settings.INDEX_METRIC
+    if metric == "ip":
+        return faiss.METRIC_INNER_PRODUCT
+    if metric == "l2":
+        return faiss.METRIC_L2
+    raise ValueError(f"Unknown index metric: {metric}")
+
+
+def select_index_type(num_vectors: int) -> str:
+    """Pick an index tier for a corpus of the given size"""
+    if settings.INDEX_TYPE not in INDEX_TYPES + ("auto",):
+        raise ValueError(f"Unknown index type: {settings.INDEX_TYPE}")
+    
+    if num_vectors < settings.ANN_MIN_VECTORS:
+        return "flat"
+    if settings.INDEX_TYPE != "auto":
+        return settings.INDEX_TYPE
+    if num_vectors < settings.PQ_MIN_VECTORS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def ivf_nlist(num_vectors: int) -> int:
+    """Number of IVF cells for a corpus of the given size"""
+    return settings.IVF_NLIST or max(1, int(4 * np.sqrt(num_vectors)))
+
+
+def pq_subquantizers(dimension: int) -> int:
+    """Largest sub-quantizer count <= PQ_M that divides the dimension"""
+    return next(m for m in range(min(settings.PQ_M, dimension), 0, -1) if dimension % m == 0)
+
+
+def storage_codes(dimension: Optional[int], num_vectors: int, storage: str = None) -> str:
+    """FAISS factory name of the vector encoding for a VECTOR_STORAGE mode
+    
+    pq needs PQ_TRAIN_MIN vectors to train on; until then it uses sq8 codes.
+    """
+    storage = storage or settings.VECTOR_STORAGE
+    if storage == "float32":
+        return "Flat"
+    if storage == "fp16":
+        return "SQfp16"
+    if storage == "sq8" or (storage == "pq" and num_vectors < settings.PQ_TRAIN_MIN):
+        return "SQ8"
+    if storage == "pq":
+        return f"PQ{pq_subquantizers(dimension)}"
+    raise ValueError(f"Unknown vector storage: {storage}")
+
+
+def build_index(index_type: str, dimension: int, num_vectors: int, metric: str = None,
+                codes: str = "Flat") -> faiss.Index:
+    """Create an empty (untrained) index of the given tier that accepts explicit IDs
+    
+    `codes` (see storage_codes) sets how the flat, IVF and HNSW tiers store
+    vectors; IVF-PQ always stores PQ codes.
+    """
+    nlist = ivf_nlist(num_vectors)
+    
+    if index_type == "flat":
+        description = f"IDMap2,{codes}"
+    elif index_type == "ivf_flat":
+        description = f"IVF{nlist},{codes}"
+    elif index_type == "hnsw":
+        description = f"IDMap2,HNSW{settings.HNSW_M}" + ("" if codes == "Flat" else f",{codes}")
+    elif index_type == "ivf_pq":
+        description = f"IVF{nlist},PQ{pq_subquantizers(dimension)}"
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+    
+    index = faiss.index_factory(dimension, description, metric_type(metric))
+    if index_type == "hnsw":
+        faiss.downcast_index(index.index).hnsw.efConstruction = settings.HNSW_EF_CONSTRUCTION
+    set_search_params(index, index_type)
+    return index
+
+
+def set_search_params(index: faiss.Index, index_type: str):
+    """Apply nprobe / efSearch from settings"""
+    params = faiss.ParameterSpace()
+    if index_type in ("ivf_flat", "ivf_pq"):
+        params.set_index_parameter(index, "nprobe", settings.IVF_NPROBE)
+    elif index_type == "hnsw":
+        params.set_index_parameter(index, "efSearch", settings.HNSW_EF_SEARCH)
+
+
+def search_params(index_type: Optional[str], selector: faiss.IDSelector) -> faiss.SearchParameters:
+    """Per-query search parameters that restrict a search to the selected IDs"""
+    if index_type in ("ivf_flat", "ivf_pq"):
+        return faiss.SearchParametersIVF(sel=selector, nprobe=settings.IVF_NPROBE)
+    if index_type == "hnsw":
+        return faiss.SearchParametersHNSW(sel=selector, efSearch=settings.HNSW_EF_SEARCH)
+    return faiss.SearchParameters(sel=selector)
+
 
 class VectorStore:
-    """FAISS-based vector storage and retrieval"""
+    """FAISS-based vector storage and retrieval
     
-    def __init__(self, dimension: int = None):
+    Vectors live in an ID-mapped flat index keyed by stable int64 chunk IDs.
+    Uploads are appended to an on-disk segment log, so ingesting a paper
+    costs O(new chunks); `save()` compacts the log into a full checkpoint.
+    Chunk text and metadata live in a memory-mapped ChunkStore whose row
+    numbers are the chunk IDs, and a BM25 LexicalIndex over the same IDs is
+    kept in step with the vectors for hybrid retrieval, as are per-paper
+    centroids for coarse-to-fine search (`paper_candidates`).
+    
+    Once the corpus passes ANN_MIN_VECTORS an approximate index (IVF-Flat,
+    HNSW or IVF-PQ) is trained in a background thread from the flat vectors
+    and used for search once ready. The flat index stays the source of truth
+    for exact vectors, retraining and rebuilds.
+    
+    With compressed VECTOR_STORAGE (fp16, sq8 or pq) the indexes hold only
+    codes, and the exact vectors move to a memory-mapped VectorFile: searches
+    fetch RESCORE_FACTOR times more candidates and re-score them exactly.
+    
+    Several worker processes may serve the same `path`. Writes take a
+    cross-process lock, first catch up with what other processes wrote, and
+    then publish a new version in manifest.json; `refresh()` (polled by
+    `start_watching()`) replays new segments, or loads a newer checkpoint
+    and swaps it in. IVF indexes are memory-mapped read-only from the
+    checkpoint, so workers share their pages; vectors added since are
+    searched exactly until the next checkpoint.
+    """
+    
+    def __init__(self, dimension: int = None, path: Path = None):
         self.index = None
-        self.chunks_metadata = []
         self.dimension = dimension
+        self.path = path or settings.FAISS_INDEX_PATH
+        self.chunk_store = ChunkStore(self.path / "chunks")
+        self.lexical_index = LexicalIndex()
+        self.paper_centroids = PaperCentroids(dimension)
+        self.metric = settings.INDEX_METRIC
+        self.storage = settings.VECTOR_STORAGE
+        self.codes = storage_codes(dimension, 0, self.storage)  # Encoding of the flat index
+        self.vector_file = self._open_vector_file(self.path)
+        self.next_id = 0
+        self.last_segment = 0
+        self.version = 0  # Bumped on every change to the stored vectors, for cache invalidation
         
-    def create_index(self, embeddings: np.ndarray, metadata: List[Dict]):
-        """Create FAISS index from embeddings"""
+        # Published snapshot the state corresponds to (see snapshot.py)
+        self.snapshot_version = 0
+        self.checkpoint = 0
+        self._reloads = 0  # Bumped when the state is replaced wholesale
+        self._write_lock = FileLock(self.path / "write.lock")
+        self._ann_lock = FileLock(self.path / "ann.lock")
+        self._watcher: Optional[threading.Thread] = None
+        self._watch_stop = threading.Event()
+        
+        # Approximate index state
+        self.ann_index: Optional[faiss.Index] = None
+        self.ann_type: Optional[str] = None
+        self.ann_size = 0
+        self.ann_stale = 0  # Removed vectors still present in an index without remove support
+        self.ann_mapped = False  # ann_index lists are mapped read-only from ann.faiss
+        self.ann_delta: Optional[faiss.Index] = None  # Private IVF index of vectors added since mapping
+        self._ann_thread: Optional[threading.Thread] = None
+        self._ann_log: Optional[List] = None  # Changes made while a build is running
+        
+        self._lock = threading.RLock()
+    
+    def _open_vector_file(self, path: Path) -> Optional[VectorFile]:
+        """Exact vectors of a compressed store (None for float32 storage)"""
+        if self.storage not in VECTOR_STORAGES:
+            raise ValueError(f"Unknown vector storage: {self.storage}")
+        return None if self.storage == "float32" else VectorFile(path / "vectors")
+    
+    def _new_index(self, sample: np.ndarray = None):
+        """Create an empty ID-mapped flat index with `self.codes` encoding, trained on `sample` if needed"""
+        index = build_index("flat", self.dimension, 0, self.metric, self.codes)
+        if not index.is_trained:
+            if sample is None:
+                # sq8: embeddings are normalized, so every component lies in [-1, 1]
+                sample = np.repeat(np.array([[-1.0], [1.0]], dtype=np.float32), self.dimension, axis=1)
+            index.train(sample)
+        return index
+    
+    def _rebuild_codes(self):
+        """Re-encode the flat index from the vector file with the codes VECTOR_STORAGE calls for"""
+        ids = faiss.vector_to_array(self.index.id_map).copy()
+        self.codes = storage_codes(self.dimension, len(ids), self.storage)
+        sample = None
+        if self.codes.startswith("PQ"):
+            sample_size = min(len(ids), settings.ANN_TRAIN_SAMPLE)
+            sample = self.vector_file.get(np.sort(np.random.default_rng(0).choice(ids, sample_size, replace=False)))
+        
+        index = self._new_index(sample)
+        for start in range(0, len(ids), 100_000):
+            batch = ids[start:start + 100_000]
+            index.add_with_ids(self.vector_file.get(batch), batch)
+        self.index = index
+        self.version += 1
+        logger.info(f"Re-encoded {len(ids)} vectors as {self.codes}")
+    
+    def _exact_vectors(self, ids: np.ndarray) -> np.ndarray:
+        """Uncompressed embeddings of the given IDs"""
+        if self.vector_file is not None:
+            return self.vector_file.get(ids)
+        return self.index.reconstruct_batch(ids)
+    
+    @contextmanager
+    def _writing(self):
+        """Hold this process's lock and the cross-process write lock for a change
+        
+        Catches up with what other processes published first, and publishes
+        the new state afterwards.
+        """
+        with self._lock, self._write_lock.hold():
+            self._follow()
+            yield
+            self.snapshot_version += 1
+            write_manifest(self.path, self.snapshot_version, self.checkpoint, self.last_segment)
+    
+    def _follow(self):
+        """Bring the state up to the published manifest (write lock held)"""
+        manifest = read_manifest(self.path)
+        if manifest is None or manifest['version'] == self.snapshot_version:
+            return
+        if manifest['checkpoint'] != self.checkpoint or self._replay_segments(self.path, published=True) is None:
+            self.load(self.path)
+        else:
+            self.snapshot_version = manifest['version']
+    
+    def refresh(self) -> bool:
+        """Catch up with snapshots other processes published; True if the state changed
+        
+        New segments are replayed in place. A newer checkpoint is loaded into
+        a separate store and then swapped in, so queries keep running on the
+        previous snapshot while it loads.
+        """
         try:
-            # Get dimension from embeddings
-            if self.dimension is None:
-                self.dimension = embeddings.shape[1]
+            manifest = read_manifest(self.path)
+            if manifest is None or manifest['version'] == self.snapshot_version:
+                return False
             
-            # Create FAISS index (L2 distance)
-            self.index = faiss.IndexFlatL2(self.dimension)
+            replayed = None
+            if manifest['checkpoint'] == self.checkpoint:
+                with self._lock:
+                    replayed = self._replay_segments(self.path, published=True)
+                    if replayed is not None:
+                        self.snapshot_version = manifest['version']
             
-            # Add embeddings to index
-            self.index.add(embeddings)
+            if replayed is None:
+                fresh = VectorStore(path=self.path)
+                fresh.load(build_ann=False)
+                with self._lock:
+                    self._adopt(fresh)
+                logger.info(f"Switched to checkpoint {self.checkpoint} (snapshot version {self.snapshot_version})")
             
-            # Store metadata
-            self.chunks_metadata = metadata
+            self._maybe_build_ann()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Error refreshing index: {e}")
+            raise
+    
+    def _adopt(self, other: "VectorStore"):
+        """Take over the loaded state of another store on the same path"""
+        for name in (
+            'index', 'dimension', 'chunk_store', 'lexical_index', 'paper_centroids', 'storage', 'codes', 'vector_file',
+            'next_id', 'last_segment', 'snapshot_version', 'checkpoint',
+            'ann_index', 'ann_type', 'ann_size', 'ann_stale', 'ann_mapped', 'ann_delta'
+        ):
+            setattr(self, name, getattr(other, name))
+        self.version += 1
+        self._reloads += 1
+    
+    def start_watching(self, interval: float = None):
+        """Refresh from a background thread every `interval` seconds (SNAPSHOT_POLL_INTERVAL)"""
+        interval = settings.SNAPSHOT_POLL_INTERVAL if interval is None else interval
+        if interval <= 0 or self._watcher is not None:
+            return
+        
+        def watch():
+            while not self._watch_stop.wait(interval):
+                try:
+                    self.refresh()
+                except Exception:
+                    pass  # Logged by refresh(); retried on the next poll
+        
+        self._watch_stop.clear()
+        self._watcher = threading.Thread(target=watch, name="snapshot-watch", daemon=True)
+        self._watcher.start()
+    
+    def stop_watching(self):
+        """Stop the refresh thread"""
+        if self._watcher is not None:
+            self._watch_stop.set()
+            self._watcher.join()
+            self._watcher = None
+    
+    def create_index(self, embeddings: np.ndarray, metadata: List[Dict]):
+        """Create FAISS index from embeddings, replacing any existing contents"""
+        try:
+            with self._writing():
+                # Get dimension from embeddings
+                if self.dimension is None:
+                    self.dimension = embeddings.shape[1]
+                
+                self.codes = storage_codes(self.dimension, 0, self.storage)
+                self.index = self._new_index()
+                self.chunk_store.clear()
+                if self.vector_file is not None:
+                    self.vector_file.clear()
+                self.lexical_index = LexicalIndex()
+                self.paper_centroids = PaperCentroids(self.dimension)
+                self.next_id = 0
+                self.ann_index = None
+                self.ann_type = None
+                self.ann_mapped = False
+                self.ann_delta = None
+                self._add_vectors(embeddings, self.chunk_store.append(metadata))
             
             logger.info(f"Created FAISS index with {self.index.ntotal} vectors (dim={self.dimension})")
-            
+            self._maybe_build_ann()
+        
         except Exception as e:
             logger.error(f"Error creating index: {e}")
             raise
     
-    def search(self, query_embedding: np.ndarray, top_k: int = 5) -> List[Dict]:
-        """Search for similar chunks"""
+    def _add_vectors(self, embeddings: np.ndarray, ids: np.ndarray, write_vectors: bool = True) -> np.ndarray:
+        """Insert vectors (and their text into the lexical index) under IDs already allocated in the chunk store
+        
+        `write_vectors=False` when another process already wrote them to the vector file.
+        """
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        if self.vector_file is not None and write_vectors:
+            self.vector_file.write(ids, embeddings)
+        self.index.add_with_ids(embeddings, ids)
+        self.lexical_index.add(ids, [self.chunk_store.text(i) for i in ids.tolist()])
+        self.paper_centroids.add(self.chunk_store.records['paper_key'][ids], embeddings)
+        if self.ann_mapped:
+            if self.ann_delta is None:
+                self.ann_delta = self._empty_ann_copy()
+            self.ann_delta.add_with_ids(embeddings, ids)
+            if self.ann_delta.ntotal > settings.ANN_PENDING_MAX:
+                self._unmap_ann()
+        elif self.ann_index is not None:
+            self.ann_index.add_with_ids(embeddings, ids)
+        if self._ann_log is not None:
+            self._ann_log.append(('add', ids))
+        
+        if len(ids):
+            self.next_id = max(self.next_id, int(ids.max()) + 1)
+        self.version += 1
+        
+        if self.vector_file is not None and self.codes != storage_codes(self.dimension, self.index.ntotal, self.storage):
+            self._rebuild_codes()  # pq: enough vectors to train on
+        return ids
+    
+    def _remove_ids(self, ids: np.ndarray):
+        """Drop vectors for the given IDs from memory"""
+        present, vectors = self._stored_vectors(ids)
+        self.paper_centroids.remove(self.chunk_store.records['paper_key'][present], vectors)
+        self.index.remove_ids(ids)
+        self.lexical_index.remove(ids)
+        if self.ann_mapped:
+            removed = self.ann_delta.remove_ids(ids) if self.ann_delta is not None else 0
+            self.ann_stale += len(ids) - removed
+        elif self.ann_index is not None:
+            self._remove_from_ann(self.ann_index, ids)
+        if self._ann_log is not None:
+            self._ann_log.append(('remove', ids))
+        self.version += 1
+    
+    def _stored_vectors(self, ids: np.ndarray):
+        """(IDs, vectors) of those of the given IDs that have a vector in the index"""
+        try:
+            return ids, self._exact_vectors(ids)
+        except (RuntimeError, IndexError):
+            # Rows left without a vector by a crash before their segment was written
+            present = [i for i in ids.tolist() if self._has_vector(i)]
+            present = np.array(present, dtype=np.int64)
+            return present, self._exact_vectors(present) if len(present) else np.zeros((0, self.dimension), np.float32)
+    
+    def _has_vector(self, chunk_id: int) -> bool:
+        try:
+            self._exact_vectors(np.array([chunk_id], dtype=np.int64))
+            return True
+        except (RuntimeError, IndexError):
+            return False
+    
+    def _remove_from_ann(self, ann_index: faiss.Index, ids: np.ndarray):
+        """Remove IDs from an approximate index, tolerating tiers without removal"""
+        try:
+            ann_index.remove_ids(ids)
+        except RuntimeError:
+            # HNSW cannot delete; results are filtered by the chunk store until the next rebuild
+            self.ann_stale += len(ids)
+    
+    def _map_ann(self, ann_path: Path) -> bool:
+        """Map a saved IVF index read-only if INDEX_MMAP allows; True if mapped"""
+        if not (settings.INDEX_MMAP and self.ann_type in ("ivf_flat", "ivf_pq")):
+            return False
+        self.ann_index = faiss.read_index(str(ann_path), faiss.IO_FLAG_MMAP)
+        # Prefetch threads are started per search and would cost more than the page faults they avoid
+        lists = faiss.downcast_InvertedLists(faiss.extract_index_ivf(self.ann_index).invlists)
+        lists.prefetch_nthread = 0
+        set_search_params(self.ann_index, self.ann_type)
+        self.ann_mapped = True
+        self.ann_delta = None
+        return True
+    
+    def _empty_ann_copy(self) -> faiss.Index:
+        """Writable IVF index with the mapped index's trained quantizer and no vectors"""
+        # Mapped lists cannot be cloned or serialized, so swap in empty ones for the copy
+        ivf = faiss.extract_index_ivf(self.ann_index)
+        mapped, ntotal = ivf.invlists, ivf.ntotal
+        empty = faiss.ArrayInvertedLists(ivf.nlist, ivf.code_size)
+        ivf.own_invlists = False
+        ivf.replace_invlists(empty, False)
+        ivf.ntotal = 0
+        try:
+            copy = faiss.deserialize_index(faiss.serialize_index(self.ann_index))
+        finally:
+            ivf.replace_invlists(mapped, True)
+            ivf.ntotal = ntotal
+        set_search_params(copy, self.ann_type)
+        return copy
+    
+    def _unmap_ann(self):
+        """Copy the mapped index's lists into private memory, merging in the delta index"""
+        ivf = faiss.extract_index_ivf(self.ann_index)
+        mapped = ivf.invlists
+        lists = faiss.ArrayInvertedLists(mapped.nlist, mapped.code_size)
+        for list_no in range(mapped.nlist):
+            lists.add_entries(list_no, mapped.list_size(list_no), mapped.get_ids(list_no), mapped.get_codes(list_no))
+        ivf.replace_invlists(lists, True)
+        lists.this.disown()
+        
+        added = 0
+        if self.ann_delta is not None:
+            added = self.ann_delta.ntotal
+            ivf.merge_from(faiss.extract_index_ivf(self.ann_delta), 0)
+        logger.info(f"Copied mapped {self.ann_type} index to memory ({added} vectors added since mapping)")
+        self.ann_mapped = False
+        self.ann_delta = None
+    
+    def add(self, embeddings: np.ndarray, metadata: List[Dict]) -> List[int]:
+        """Append embeddings to the index and persist them as a new segment"""
+        try:
+            if len(metadata) != len(embeddings):
+                raise ValueError("Embeddings and metadata must have the same length")
+            
+            with timed("index_add"), self._writing():
+                ids = self._append_chunks(embeddings, metadata)
+            
+            count("rag_chunks_indexed_total", "Chunks added to the vector store", len(ids))
+            logger.info(f"Added {len(ids)} vectors (total={self.index.ntotal})")
+            self._maybe_build_ann()
+            return ids.tolist()
+        
+        except Exception as e:
+            logger.error(f"Error adding to index: {e}")
+            raise
+    
+    def _append_chunks(self, embeddings: np.ndarray, metadata: List[Dict]) -> np.ndarray:
+        """Store new chunks and log their segment (write lock held)"""
+        if self.dimension is None:
+            self.dimension = embeddings.shape[1]
+        if self.index is None:
+            self.index = self._new_index()
+        
+        # Chunk rows first: a crash before the segment is written leaves
+        # rows without vectors, which search never returns
+        ids = self._add_vectors(embeddings, self.chunk_store.append(metadata))
+        self._append_segment({
+            'op': 'add',
+            'ids': ids,
+            'embeddings': np.asarray(embeddings, dtype=np.float32)
+        })
+        return ids
+    
+    def replace_paper(self, paper_id: str, embeddings: np.ndarray, metadata: List[Dict]) -> List[int]:
+        """Swap a paper's chunks for new ones in one published change
+        
+        The new chunks are stored before the old ones are dropped. If that
+        fails, the new chunks are rolled back and the previous copy stays
+        the only one searchable.
+        """
         try:
-            if self.index is None:
-                raise ValueError("Index not initialized. Upload a paper first.")
+            if len(metadata) != len(embeddings):
+                raise ValueError("Embeddings and metadata must have the same length")
             
-            # Reshape query embedding
-            query_embedding = query_embedding.reshape(1, -1)
+            with timed("index_add"), self._writing():
+                old_ids = self.chunk_store.paper_chunk_ids(paper_id)
+                ids = np.zeros(0, dtype=np.int64)
+                added = False
+                try:
+                    if metadata:
+                        if self.dimension is None:
+                            self.dimension = embeddings.shape[1]
+                        if self.index is None:
+                            self.index = self._new_index()
+                        ids = self.chunk_store.append(metadata)
+                        self._add_vectors(embeddings, ids)
+                        self._append_segment({
+                            'op': 'add',
+                            'ids': ids,
+                            'embeddings': np.asarray(embeddings, dtype=np.float32)
+                        })
+                        added = True
+                    if len(old_ids):
+                        # Logged first: once the tombstone is durable the old copy is gone on reload
+                        self._append_segment({'op': 'remove', 'paper_id': paper_id, 'ids': old_ids})
+                except Exception:
+                    self._roll_back(paper_id, ids, added)
+                    raise
+                if len(old_ids):
+                    self.chunk_store.remove_chunks(paper_id, old_ids)
+                    self._remove_ids(old_ids)
             
-            # Search
-            distances, indices = self.index.search(query_embedding, top_k)
+            count("rag_chunks_indexed_total", "Chunks added to the vector store", len(ids))
+            logger.info(f"Replaced paper {paper_id} ({len(old_ids)} chunks -> {len(ids)})")
+            self._maybe_build_ann()
+            return ids.tolist()
+        
+        except Exception as e:
+            logger.error(f"Error replacing paper: {e}")
+            raise
+    
+    def _roll_back(self, paper_id: str, ids: np.ndarray, logged: bool):
+        """Drop chunks of a failed replace_paper, tombstoning them if their segment was written"""
+        if len(ids) == 0:
+            return
+        try:
+            self.chunk_store.remove_chunks(paper_id, ids)
+            self._remove_ids(ids)
+            if logged:
+                self._append_segment({'op': 'remove', 'paper_id': paper_id, 'ids': ids})
+        except Exception as e:
+            logger.error(f"Error rolling back {len(ids)} chunks of paper {paper_id}: {e}")
+    
+    def paper_chunk_ids(self, paper_id: str) -> List[int]:
+        """Get the chunk IDs belonging to a paper"""
+        return self.chunk_store.paper_chunk_ids(paper_id).tolist()
+    
+    def remove_paper(self, paper_id: str) -> int:
+        """Remove every chunk of a paper and log a tombstone segment"""
+        try:
+            with self._writing():
+                ids = self.chunk_store.remove_paper(paper_id)
+                if len(ids) == 0:
+                    return 0
+                
+                self._remove_ids(ids)
+                self._append_segment({'op': 'remove', 'paper_id': paper_id, 'ids': ids})
             
-            # Prepare results
+            logger.info(f"Removed paper {paper_id} ({len(ids)} chunks)")
+            self._maybe_build_ann()
+            return len(ids)
+        
+        except Exception as e:
+            logger.error(f"Error removing paper: {e}")
+            raise
+    
+    def _score(self, distance: float) -> float:
+        """Convert a FAISS distance into a similarity score (higher is better)"""
+        if self.metric == "ip":
+            return float(distance)
+        return float(1 / (1 + distance))
+    
+    def select(self, filters: Optional[Dict] = None) -> Optional[np.ndarray]:
+        """Resolve metadata filters to the sorted IDs of matching live chunks
+        
+        Keys are those of ChunkStore.select (paper_ids, filename,
+        uploaded_after, uploaded_before). Returns None when nothing is filtered.
+        """
+        if not filters:
+            return None
+        return self.chunk_store.select(**filters)
+    
+    def search(self, query_embedding: np.ndarray, top_k: int = 5, ids: Optional[np.ndarray] = None) -> List[Dict]:
+        """Search for similar chunks, optionally only among the given chunk IDs
+        
+        Small selections are scored exactly from their flat vectors; larger
+        ones are pushed into FAISS as an ID selector, so the index returns
+        top_k matching hits without over-fetching and post-filtering.
+        """
+        return self.search_batch(query_embedding.reshape(1, -1), top_k, ids)[0]
+    
+    def search_batch(self, query_embeddings: np.ndarray, top_k: int = 5,
+                     ids: Optional[np.ndarray] = None) -> List[List[Dict]]:
+        """Search many queries with one matrix search; one result list per query row"""
+        try:
+            with timed("vector_search"):
+                if self.index is None or self.index.ntotal == 0:
+                    raise ValueError("Index not initialized. Upload a paper first.")
+                
+                query_embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+                
+                with self._lock:
+                    # Compressed codes: over-fetch, then re-score with the exact vectors
+                    rescore = self.vector_file is not None
+                    k = top_k * settings.RESCORE_FACTOR if rescore else top_k
+                    if ids is None:
+                        # Search the approximate index when it is ready
+                        if self.ann_index is not None:
+                            distances, indices = self._search_ann(query_embeddings, k * 2 if self.ann_stale else k)
+                        else:
+                            distances, indices = self.index.search(query_embeddings, k)
+                    elif len(ids) <= settings.FILTER_EXACT_MAX:
+                        distances, indices = self._search_exact(query_embeddings, top_k, ids)
+                        rescore = False
+                    else:
+                        distances, indices = self._search_selected(query_embeddings, k, ids)
+                    if rescore:
+                        distances, indices = self._rescore(query_embeddings, indices)
+                
+                return self._results(distances, indices, top_k)
+        
+        except Exception as e:
+            logger.error(f"Error searching: {e}")
+            raise
+    
+    def search_selections(self, query_embeddings: np.ndarray, top_k: int, selections: List[np.ndarray]) -> List[List[Dict]]:
+        """Search each query row only among its own sorted chunk IDs (hierarchical search)
+        
+        The vectors of all selections are gathered once and scored exactly in
+        one matrix product, so the cost follows the selection sizes rather
+        than the corpus.
+        """
+        try:
+            with timed("vector_search"):
+                if self.index is None or self.index.ntotal == 0:
+                    raise ValueError("Index not initialized. Upload a paper first.")
+                
+                query_embeddings = np.ascontiguousarray(query_embeddings, dtype=np.float32)
+                if len(selections) == 1:
+                    union, selections = selections[0], None
+                else:
+                    union = np.unique(np.concatenate(selections)) if selections else np.zeros(0, dtype=np.int64)
+                with self._lock:
+                    distances, indices = self._search_exact(query_embeddings, top_k, union, selections)
+                
+                return self._results(distances, indices, top_k)
+        
+        except Exception as e:
+            logger.error(f"Error searching: {e}")
+            raise
+    
+    def _results(self, distances: np.ndarray, indices: np.ndarray, top_k: int) -> List[List[Dict]]:
+        """Result lists for FAISS-style (distances, indices), reading text only for the hits"""
+        batch_results = []
+        for row_distances, row_indices in zip(distances, indices):
             results = []
-            for dist, idx in zip(distances[0], indices[0]):
-                if idx < len(self.chunks_metadata):
-                    result = self.chunks_metadata[idx].copy()
-                    result['score'] = float(1 / (1 + dist))
+            for dist, idx in zip(row_distances, row_indices):
+                result = self.chunk_store.get(int(idx))
+                if result is not None:
+                    result['vector_id'] = int(idx)
+                    result['score'] = self._score(dist)
                     results.append(result)
+            batch_results.append(results[:top_k])
+        return batch_results
+    
+    def _search_exact(self, query_embeddings: np.ndarray, top_k: int, ids: np.ndarray,
+                      selections: Optional[List[np.ndarray]] = None):
+        """Brute-force scores over a set of IDs, in FAISS (distances, indices) form
+        
+        Vectors are fetched in blocks, keeping a running top_k per query.
+        With `selections` (sorted IDs per query, all within `ids`) each query
+        only scores its own IDs; short rows are padded with -1.
+        """
+        shape = (len(query_embeddings), 0)
+        distances, indices = np.zeros(shape, dtype=np.float32), np.zeros(shape, dtype=np.int64)
+        
+        for start in range(0, len(ids), 65_536):
+            block = ids[start:start + 65_536]
+            vectors = self._exact_vectors(block)
+            products = query_embeddings @ vectors.T
+            if self.metric == "ip":
+                block_distances = products
+            else:
+                block_distances = (query_embeddings ** 2).sum(axis=1)[:, None] - 2 * products + (vectors ** 2).sum(axis=1)
+            block_ids = np.broadcast_to(block, block_distances.shape)
+            if selections is not None:
+                member = np.array([np.isin(block, selection, assume_unique=True) for selection in selections])
+                block_distances = np.where(member, block_distances, -np.inf if self.metric == "ip" else np.inf)
+                block_ids = np.where(member, block_ids, -1)
             
+            distances = np.hstack([distances, block_distances])
+            indices = np.hstack([indices, block_ids])
+            order = np.argsort(-distances if self.metric == "ip" else distances, axis=1, kind='stable')[:, :top_k]
+            distances = np.take_along_axis(distances, order, axis=1)
+            indices = np.take_along_axis(indices, order, axis=1)
+        return distances, indices
+    
+    def _search_ann(self, query_embeddings: np.ndarray, top_k: int, params: faiss.SearchParameters = None):
+        """Search the ANN index, merging in hits among the vectors added since it was mapped"""
+        distances, indices = self.ann_index.search(query_embeddings, top_k, params=params)
+        if self.ann_delta is None or self.ann_delta.ntotal == 0:
+            return distances, indices
+        
+        delta_distances, delta_indices = self.ann_delta.search(query_embeddings, top_k, params=params)
+        distances = np.hstack([distances, delta_distances])
+        indices = np.hstack([indices, delta_indices])
+        order = np.argsort(-distances if self.metric == "ip" else distances, axis=1, kind='stable')[:, :top_k]
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+    
+    def _rescore(self, query_embeddings: np.ndarray, indices: np.ndarray):
+        """Exact distances of code-search hits from the vector file, re-sorted per query"""
+        found = indices >= 0
+        vectors = self.vector_file.get(np.where(found, indices, 0).ravel()).reshape(indices.shape + (-1,))
+        products = np.einsum('qd,qkd->qk', query_embeddings, vectors)
+        if self.metric == "ip":
+            distances = np.where(found, products, -np.inf)
+            order = np.argsort(-distances, axis=1, kind='stable')
+        else:
+            distances = (query_embeddings ** 2).sum(axis=1)[:, None] - 2 * products + (vectors ** 2).sum(axis=2)
+            distances = np.where(found, distances, np.inf)
+            order = np.argsort(distances, axis=1, kind='stable')
+        return np.take_along_axis(distances, order, axis=1), np.take_along_axis(indices, order, axis=1)
+    
+    def _search_selected(self, query_embeddings: np.ndarray, top_k: int, ids: np.ndarray):
+        """Search with a bitmap ID selector
+        
+        Queries whose probed ANN cells hold fewer than top_k selected chunks
+        (very selective filters) are redone with an exact flat scan.
+        """
+        mask = np.zeros(max(self.next_id, int(ids[-1]) + 1), dtype=bool)
+        mask[ids] = True
+        bitmap = np.packbits(mask, bitorder='little')
+        selector = faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bitmap))
+        flat_params = search_params("flat", selector)
+        
+        def search_flat(queries: np.ndarray):
+            if self.codes.startswith("PQ"):
+                return self._search_exact(queries, top_k, ids)  # IndexPQ takes no ID selector
+            return self.index.search(queries, top_k, params=flat_params)
+        
+        # Selections only hold live IDs, so vectors left behind in the ANN index never match
+        if self.ann_index is None:
+            return search_flat(query_embeddings)
+        
+        distances, indices = self._search_ann(query_embeddings, top_k, search_params(self.ann_type, selector))
+        short = (indices >= 0).sum(axis=1) < min(top_k, len(ids))
+        if short.any():
+            distances[short], indices[short] = search_flat(query_embeddings[short])
+        return distances, indices
+    
+    def paper_candidates(self, query_embeddings: np.ndarray, num_papers: int,
+                         ids: Optional[np.ndarray] = None, max_chunks: int = None) -> List[np.ndarray]:
+        """Coarse step of hierarchical search: per query, the sorted chunk IDs of the
+        num_papers papers whose centroids match it best
+        
+        With `ids` (a filter selection) only the papers it covers are
+        considered, and only its IDs are returned. `max_chunks` stops adding
+        papers, best first, once their chunks would exceed it (the best
+        paper is always kept).
+        """
+        with timed("paper_search"), self._lock:
+            keys = None if ids is None else np.unique(self.chunk_store.records['paper_key'][ids])
+            selections = []
+            for paper_keys in self.paper_centroids.top(np.atleast_2d(query_embeddings), num_papers, keys):
+                if max_chunks is not None and len(paper_keys):
+                    total = np.cumsum(self.paper_centroids.counts[paper_keys])
+                    paper_keys = paper_keys[:max(1, int(np.searchsorted(total, max_chunks, side='right')))]
+                selection = self.chunk_store.key_chunk_ids(paper_keys.tolist())
+                if ids is not None:
+                    selection = np.intersect1d(selection, ids, assume_unique=True)
+                selections.append(selection)
+            return selections
+    
+    def get_vectors(self, ids: List[int]) -> np.ndarray:
+        """Stored embeddings of the given chunk IDs"""
+        with self._lock:
+            return self._exact_vectors(np.asarray(ids, dtype=np.int64))
+    
+    def lexical_search(self, query_text: str, top_k: int = 5, ids: Optional[np.ndarray] = None) -> List[Dict]:
+        """BM25 keyword search over chunk text, optionally only among the given chunk IDs"""
+        with timed("lexical_search"):
+            results = []
+            for chunk_id, score in self.lexical_index.search(query_text, top_k, ids):
+                result = self.chunk_store.get(chunk_id)
+                if result is not None:
+                    result['vector_id'] = chunk_id
+                    result['score'] = score
+                    results.append(result)
             return results
+    
+    @property
+    def num_papers(self) -> int:
+        """Number of distinct papers in the index"""
+        return len(self.chunk_store.live_papers())
+    
+    def _maybe_build_ann(self):
+        """Start a background (re)build if the corpus needs a different or fresher ANN index"""
+        with self._lock:
+            if self.index is None or self._ann_thread is not None:
+                return
+            
+            num_vectors = self.index.ntotal
+            index_type = select_index_type(num_vectors)
+            
+            if index_type == "flat":
+                self.ann_index = None
+                self.ann_type = None
+                self.ann_mapped = False
+                self.ann_delta = None
+                return
+            
+            if (
+                self.ann_index is not None
+                and self.ann_type == index_type
+                and num_vectors <= self.ann_size * settings.ANN_REBUILD_GROWTH
+                and self.ann_stale <= 0.1 * num_vectors
+            ):
+                return
+            
+            self._ann_thread = threading.Thread(
+                target=self.build_ann, args=(index_type,), name="ann-build", daemon=True
+            )
+            self._ann_thread.start()
+    
+    def build_ann(self, index_type: str = None):
+        """Train and fill an approximate index from the flat vectors, swap it in and checkpoint
+        
+        One process builds at a time (ann.lock); the others load the result
+        from the checkpoint.
+        """
+        if not self._ann_lock.acquire(blocking=False):
+            logger.info("Skipping ANN build: another process is building")
+            with self._lock:
+                if self._ann_thread is threading.current_thread():
+                    self._ann_thread = None
+            return
+        
+        try:
+            with self._lock:
+                reloads = self._reloads
+                num_vectors = self.index.ntotal
+                index_type = index_type or select_index_type(num_vectors)
+                ids = faiss.vector_to_array(self.index.id_map).copy()
+                if self.vector_file is not None:
+                    vectors = self.vector_file.get(ids)
+                else:
+                    vectors = self.index.index.reconstruct_n(0, num_vectors)
+                codes = storage_codes(self.dimension, num_vectors, self.storage)
+                self._ann_log = []
+            
+            logger.info(f"Building {index_type} index over {num_vectors} vectors")
+            ann_index = build_index(index_type, self.dimension, num_vectors, self.metric, codes)
+            
+            if not ann_index.is_trained:
+                sample_size = min(num_vectors, max(settings.ANN_TRAIN_SAMPLE, 50 * ivf_nlist(num_vectors)))
+                sample = vectors[np.random.default_rng(0).choice(num_vectors, sample_size, replace=False)]
+                ann_index.train(sample)
+            ann_index.add_with_ids(vectors, ids)
+            del vectors
             
+            with self._lock:
+                if self._reloads != reloads:
+                    logger.info(f"Discarded {index_type} index: the store was reloaded while building")
+                    return
+                
+                # Catch up with changes made while training
+                stale = 0
+                for op, op_ids in self._ann_log:
+                    if op == 'add':
+                        live = np.array([i for i in op_ids.tolist() if self.chunk_store.is_live(i)], dtype=np.int64)
+                        if len(live):
+                            ann_index.add_with_ids(self._exact_vectors(live), live)
+                    else:
+                        try:
+                            ann_index.remove_ids(op_ids)
+                        except RuntimeError:
+                            stale += len(op_ids)
+                
+                self.ann_index = ann_index
+                self.ann_type = index_type
+                self.ann_size = num_vectors
+                self.ann_stale = stale
+                self.ann_mapped = False
+                self.ann_delta = None
+            
+            logger.info(f"{index_type} index ready ({ann_index.ntotal} vectors)")
+            self.save()  # Publishes the index to the other processes
+        
         except Exception as e:
-            logger.error(f"Error searching: {e}")
+            logger.error(f"Error building ANN index: {e}")
             raise
+        finally:
+            self._ann_lock.release()
+            with self._lock:
+                self._ann_log = None
+                if self._ann_thread is threading.current_thread():
+                    self._ann_thread = None
+    
+    def wait_for_ann(self, timeout: float = None):
+        """Block until any background ANN build finishes"""
+        thread = self._ann_thread
+        if thread is not None:
+            thread.join(timeout)
+    
+    def _segment_dir(self, path: Path = None) -> Path:
+        return (path or self.path) / "segments"
+    
+    def _segment_files(self, path: Path = None) -> List[Path]:
+        """Segment files in log order"""
+        segment_dir = self._segment_dir(path)
+        if not segment_dir.exists():
+            return []
+        return sorted(segment_dir.glob("*.seg"))
+    
+    def _append_segment(self, record: Dict):
+        """Atomically write one record to the append-only segment log"""
+        segment_dir = self._segment_dir()
+        segment_dir.mkdir(parents=True, exist_ok=True)
+        
+        self.last_segment += 1
+        final_path = segment_dir / f"{self.last_segment:012d}.seg"
+        tmp_path = final_path.with_suffix(".tmp")
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, final_path)
+    
+    def _replay_segments(self, path: Path, published: bool = False) -> Optional[int]:
+        """Apply segments written after the state held; returns the number applied
+        
+        `published`: catching up with segments another process wrote, whose
+        chunk rows, vectors and deleted flags are already on disk. Returns None
+        if some are gone (compacted into a newer checkpoint).
+        """
+        segment_files = [p for p in self._segment_files(path) if int(p.stem) > self.last_segment]
+        if published:
+            # After listing, so the chunk rows of every listed segment are visible
+            self.chunk_store.refresh()
+            if self.vector_file is not None:
+                self.vector_file.refresh()
+        
+        replayed = 0
+        for segment_path in segment_files:
+            seq = int(segment_path.stem)
+            try:
+                if published and seq != self.last_segment + 1:
+                    raise FileNotFoundError(f"Segment {self.last_segment + 1} is missing")
+                with open(segment_path, 'rb') as f:
+                    record = pickle.load(f)
+            except FileNotFoundError:
+                if published:
+                    return None
+                raise
+            
+            if record['op'] == 'add':
+                if self.dimension is None:
+                    self.dimension = record['embeddings'].shape[1]
+                if self.index is None:
+                    self.index = self._new_index()
+                if 'metadata' in record:
+                    # Segment written before the chunk store existed
+                    self._migrate_chunks(record['ids'], record['metadata'])
+                # Rows deleted without a tombstone (a rolled-back replace whose tombstone failed) stay out
+                ids = record['ids']
+                live = self.chunk_store.records['deleted'][ids] == 0 if len(ids) else np.zeros(0, dtype=bool)
+                self._add_vectors(record['embeddings'][live], ids[live], write_vectors=not published)
+            elif record['op'] == 'remove':
+                if not published:
+                    self.chunk_store.mark_deleted(record['ids'])
+                self._remove_ids(record['ids'])
+            
+            self.last_segment = seq
+            replayed += 1
+        
+        if published:
+            self.next_id = max(self.next_id, len(self.chunk_store))
+        return replayed
     
     def save(self, path: Path = None):
-        """Save index and metadata to disk"""
+        """Write a full checkpoint of index and metadata, then truncate the segment log"""
         try:
-            save_path = path or settings.FAISS_INDEX_PATH
+            save_path = path or self.path
             save_path.mkdir(parents=True, exist_ok=True)
             
-            # Save FAISS index
-            faiss.write_index(self.index, str(save_path / "index.faiss"))
-            
-            # Save metadata
-            with open(save_path / "metadata.pkl", 'wb') as f:
-                pickle.dump({
-                    'chunks': self.chunks_metadata,
-                    'dimension': self.dimension
-                }, f)
+            with timed("index_save"), self._writing():
+                if save_path != self.path:
+                    for name in ("chunks", "lexical", "vectors"):
+                        if (self.path / name).exists():
+                            shutil.copytree(self.path / name, save_path / name, dirs_exist_ok=True)
+                
+                self.lexical_index.save(save_path / "lexical", self.last_segment)
+                self.paper_centroids.save(save_path / "papers.npz", self.last_segment)
+                
+                # Save FAISS indexes
+                tmp_index = save_path / "index.faiss.tmp"
+                faiss.write_index(self.index, str(tmp_index))
+                if self.ann_delta is not None:
+                    self._unmap_ann()
+                if self.ann_mapped:
+                    # Unchanged since written (and not serializable while mapped)
+                    if save_path != self.path:
+                        shutil.copyfile(self.path / "ann.faiss", save_path / "ann.faiss.tmp")
+                elif self.ann_index is not None:
+                    faiss.write_index(self.ann_index, str(save_path / "ann.faiss.tmp"))
+                if self.vector_file is not None:
+                    self.vector_file.flush()
+                
+                # Save metadata
+                tmp_meta = save_path / "metadata.pkl.tmp"
+                with open(tmp_meta, 'wb') as f:
+                    pickle.dump({
+                        'dimension': self.dimension,
+                        'metric': self.metric,
+                        'storage': self.storage,
+                        'codes': self.codes,
+                        'next_id': self.next_id,
+                        'last_segment': self.last_segment,
+                        'ann_type': self.ann_type,
+                        'ann_size': self.ann_size,
+                        'ann_stale': self.ann_stale
+                    }, f)
+                
+                os.replace(tmp_index, save_path / "index.faiss")
+                if self.ann_index is not None:
+                    if not (self.ann_mapped and save_path == self.path):
+                        os.replace(save_path / "ann.faiss.tmp", save_path / "ann.faiss")
+                elif (save_path / "ann.faiss").exists():
+                    (save_path / "ann.faiss").unlink()
+                os.replace(tmp_meta, save_path / "metadata.pkl")
+                
+                # Segments up to last_segment are now part of the checkpoint
+                for segment_path in self._segment_files(save_path):
+                    if int(segment_path.stem) <= self.last_segment:
+                        segment_path.unlink()
+                
+                if save_path == self.path:
+                    self.checkpoint += 1
+                    if self.ann_index is not None and not self.ann_mapped:
+                        self._map_ann(save_path / "ann.faiss")
             
             logger.info(f"Saved index to {save_path}")
-            
+        
         except Exception as e:
             logger.error(f"Error saving index: {e}")
             raise
     
-    def load(self, path: Path = None):
-        """Load index and metadata from disk"""
+    def load(self, path: Path = None, build_ann: bool = True):
+        """Load the last checkpoint and replay the segment log
+        
+        `build_ann=False` skips starting a background ANN build.
+        """
         try:
-            load_path = path or settings.FAISS_INDEX_PATH
-            
-            # Load FAISS index
-            self.index = faiss.read_index(str(load_path / "index.faiss"))
+            load_path = path or self.path
+            with self._lock:
+                if load_path != self.path:
+                    self.path = load_path
+                    self._write_lock = FileLock(load_path / "write.lock")
+                    self._ann_lock = FileLock(load_path / "ann.lock")
+                self.version += 1
+                self._reloads += 1
+                self.index = None
+                self.chunk_store = ChunkStore(load_path / "chunks")
+                self.lexical_index = LexicalIndex()
+                self.paper_centroids = PaperCentroids()
+                self.codes = storage_codes(self.dimension, 0, self.storage)
+                self.vector_file = self._open_vector_file(load_path)
+                self.next_id = 0
+                self.last_segment = 0
+                self.ann_index = None
+                self.ann_type = None
+                self.ann_size = 0
+                self.ann_stale = 0
+                self.ann_mapped = False
+                self.ann_delta = None
+                
+                # Shared: no writer is midway through a checkpoint while it is read
+                with self._write_lock.hold(shared=True):
+                    manifest = read_manifest(load_path) or {}
+                    self.snapshot_version = manifest.get('version', 0)
+                    self.checkpoint = manifest.get('checkpoint', 0)
+                    
+                    migrated = False
+                    if (load_path / "index.faiss").exists():
+                        migrated = self._load_checkpoint(load_path)
+                        self._load_lexical(load_path)
+                        self._load_centroids(load_path)
+                    elif not self._segment_files(load_path):
+                        raise FileNotFoundError(f"No index found at {load_path}")
+                    
+                    replayed = self._replay_segments(load_path)
+                    # IDs of rows written without vectors (crash between chunk store and segment) stay reserved
+                    self.next_id = max(self.next_id, len(self.chunk_store))
             
-            # Load metadata
-            with open(load_path / "metadata.pkl", 'rb') as f:
-                data = pickle.load(f)
-                self.chunks_metadata = data['chunks']
-                self.dimension = data['dimension']
-            
-            logger.info(f"Loaded index from {load_path} (dim={self.dimension})")
+            if migrated or replayed >= settings.SEGMENT_COMPACT_THRESHOLD:
+                self.save(load_path)
             
+            logger.info(f"Loaded index from {load_path} (dim={self.dimension}, segments replayed={replayed})")
+            if build_ann:
+                self._maybe_build_ann()
+        
         except Exception as e:
             logger.error(f"Error loading index: {e}")
-            raise
\ No newline at end of file
+            raise
+    
+    def _load_lexical(self, load_path: Path):
+        """Load the lexical index saved with the checkpoint, rebuilding it from chunk text if missing or out of date"""
+        if len(self.lexical_index):
+            return  # Already filled while migrating a legacy checkpoint
+        
+        loaded = LexicalIndex.load(load_path / "lexical")
+        if loaded is not None and loaded[1] == self.last_segment:
+            self.lexical_index = loaded[0]
+            return
+        
+        ids = np.sort(faiss.vector_to_array(self.index.id_map))
+        for start in range(0, len(ids), 10_000):
+            batch = ids[start:start + 10_000]
+            self.lexical_index.add(batch, [self.chunk_store.text(i) for i in batch.tolist()])
+        logger.info(f"Built lexical index over {len(ids)} chunks")
+    
+    def _load_centroids(self, load_path: Path):
+        """Load the paper centroids saved with the checkpoint, recomputing them from the vectors if missing or out of date"""
+        if len(self.paper_centroids):
+            return  # Already filled while migrating a legacy checkpoint
+        
+        loaded = PaperCentroids.load(load_path / "papers.npz")
+        if loaded is not None and loaded[1] == self.last_segment:
+            self.paper_centroids = loaded[0]
+            return
+        
+        ids = np.sort(faiss.vector_to_array(self.index.id_map))
+        for start in range(0, len(ids), 65_536):
+            batch = ids[start:start + 65_536]
+            self.paper_centroids.add(self.chunk_store.records['paper_key'][batch], self._exact_vectors(batch))
+        logger.info(f"Computed centroids of {len(self.paper_centroids)} papers")
+    
+    def _migrate_chunks(self, ids: np.ndarray, metadata: List[Dict]):
+        """Copy pickled chunk metadata into the chunk store, keeping IDs equal to row numbers"""
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0 or int(ids.max()) < len(self.chunk_store):
+            return  # Already migrated
+        
+        by_id = dict(zip(ids.tolist(), metadata))
+        self.chunk_store.append([by_id.get(i) for i in range(len(self.chunk_store), int(ids.max()) + 1)])
+    
+    def _load_checkpoint(self, load_path: Path) -> bool:
+        """Read index.faiss / metadata.pkl, migrating older layouts. Returns True if migrated."""
+        # Load FAISS index
+        index = faiss.read_index(str(load_path / "index.faiss"))
+        
+        # Load metadata
+        with open(load_path / "metadata.pkl", 'rb') as f:
+            data = pickle.load(f)
+        self.dimension = data['dimension']
+        
+        chunks = data.get('chunks')
+        migrated = chunks is not None
+        if migrated:
+            # Pickled metadata from before the chunk store; rebuild the store from scratch
+            self.chunk_store.clear()
+        
+        if isinstance(chunks, list):
+            # Legacy checkpoint: flat index with positional IDs
+            self.index = self._new_index()
+            ids = np.arange(len(chunks), dtype=np.int64)
+            self._migrate_chunks(ids, chunks)
+            self._add_vectors(index.reconstruct_n(0, index.ntotal), ids)
+            logger.info(f"Migrated legacy index ({index.ntotal} vectors) to ID-mapped index")
+            return True
+        
+        self.next_id = data['next_id']
+        self.last_segment = data['last_segment']
+        if migrated:
+            ids = np.array(sorted(chunks), dtype=np.int64)
+            self._migrate_chunks(ids, [chunks[i] for i in ids.tolist()])
+            self.chunk_store.append([None] * (self.next_id - len(self.chunk_store)))
+            logger.info(f"Migrated {len(chunks)} chunks from metadata.pkl to the chunk store")
+        
+        stored = data.get('storage', "float32")
+        if index.metric_type != metric_type(self.metric) or stored != self.storage:
+            # INDEX_METRIC or VECTOR_STORAGE changed since the checkpoint was written
+            ids = faiss.vector_to_array(index.id_map)
+            if stored == "float32":
+                vectors = index.index.reconstruct_n(0, index.ntotal)
+                if self.vector_file is not None:
+                    self.vector_file.clear()
+                    self.vector_file.write(ids, vectors)
+            else:
+                vectors = VectorFile(load_path / "vectors").get(ids)
+            self.index = self._new_index()
+            self.index.add_with_ids(vectors, ids)
+            if self.vector_file is not None and self.codes != storage_codes(self.dimension, len(ids), self.storage):
+                self._rebuild_codes()
+            logger.info(f"Rebuilt index for metric '{self.metric}' and storage '{self.storage}'")
+            return True
+        
+        self.index = index
+        self.codes = data.get('codes', "Flat")
+        ann_path = load_path / "ann.faiss"
+        if data.get('ann_type') and ann_path.exists():
+            self.ann_type = data['ann_type']
+            self.ann_size = data['ann_size']
+            self.ann_stale = data['ann_stale']
+            if not self._map_ann(ann_path):
+                self.ann_index = faiss.read_index(str(ann_path))
+                set_search_params(self.ann_index, self.ann_type)
+        
+        return migrated
@@ -1,6 +1,8 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router
+from app.api.routes import router, vector_store, retrieval_pipeline, upload_workers
+from app.services.executor import ServiceOverloaded, shutdown_pools
 from app.config import settings
 from loguru import logger
 import sys
@@ -34,6 +36,11 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Saturated worker pools are reported as 503 so clients back off and retry
+@app.exception_handler(ServiceOverloaded)
+async def overloaded_handler(request: Request, exc: ServiceOverloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
+
 # Include routes
 app.include_router(router, prefix="/api", tags=["papers"])
 
@@ -42,9 +49,21 @@ async def startup_event():
     logger.info(f"🚀 Starting {settings.APP_NAME}")
     logger.info(f"📁 Upload directory: {settings.UPLOAD_DIR}")
     logger.info(f"🗄️  Vector store: {settings.FAISS_INDEX_PATH}")
-    
+    # Pick up papers uploaded through other worker processes
+    vector_store.start_watching()
+    # Process queued uploads (including those left by a previous run)
+    upload_workers.start()
+
 @app.on_event("shutdown")
 async def shutdown_event():
+    # Jobs in progress are requeued at their next stage boundary
+    upload_workers.stop(timeout=30.0)
+    vector_store.stop_watching()
+    # Compact the segment log into a single checkpoint
+    if vector_store.index is not None:
+        vector_store.save()
+    await retrieval_pipeline.llm_service.aclose()
+    shutdown_pools()
     logger.info("👋 Shutting down application")
 
 if __name__ == "__main__":
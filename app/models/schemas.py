@@ -1,20 +1,58 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Annotated, Dict, List, Optional
 from datetime import datetime
 
 class PaperUploadResponse(BaseModel):
     paper_id: str
     filename: str
-    num_chunks: int
+    num_chunks: Optional[int] = None  # Known once indexed
     message: str
+    job_id: Optional[str] = None  # Poll /api/jobs/{job_id}; None when the file was already indexed
+    status: str = "completed"  # Status of the job
+
+class JobStatus(BaseModel):
+    job_id: str
+    paper_id: str
+    filename: str
+    status: str  # queued | running | completed | failed | cancelled
+    stage: Optional[str] = None  # extract | chunk | embed | index, then done
+    progress: Dict  # pages, chunks, chunks_embedded, seconds per finished stage
+    priority: int
+    attempts: int
+    error: Optional[str] = None  # Last failure; a queued job with an error is waiting to retry
+    num_chunks: Optional[int] = None
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+class QueryFilters(BaseModel):
+    paper_ids: Optional[List[str]] = None
+    filename: Optional[str] = None  # Case-insensitive glob, e.g. "*kepler*.pdf"
+    uploaded_after: Optional[datetime] = None
+    uploaded_before: Optional[datetime] = None
 
 class QueryRequest(BaseModel):
     query: str = Field(..., min_length=3, max_length=500)
     top_k: int = Field(default=5, ge=1, le=10)
+    filters: Optional[QueryFilters] = None
+    rerank_budget_ms: Optional[float] = Field(default=None, ge=0)  # Default RERANK_BUDGET_MS; 0 skips re-ranking
+    include_stages: bool = False  # Return per-stage seconds in QueryResponse.stages
+
+class BatchQueryRequest(BaseModel):
+    queries: List[Annotated[str, Field(min_length=3, max_length=500)]] = Field(..., min_length=1)
+    top_k: int = Field(default=5, ge=1, le=10)
+    filters: Optional[QueryFilters] = None
+    generate: bool = True  # False = retrieval only, no LLM calls
+    rerank_budget_ms: Optional[float] = Field(default=None, ge=0)  # Per query
+
+class IngestRequest(BaseModel):
+    directory: str  # Absolute, or relative to INGEST_ROOT
+    recursive: bool = True
 
 class SourceChunk(BaseModel):
     content: str
     page: Optional[int] = None
+    page_end: Optional[int] = None  # Last page of a chunk spanning pages
     score: float
 
 class QueryResponse(BaseModel):
@@ -22,6 +60,20 @@ class QueryResponse(BaseModel):
     sources: List[SourceChunk]
     query: str
     processing_time: float
+    cached: bool = False
+    prompt_tokens: Optional[int] = None  # Tokens sent to the LLM; None when served from cache
+    stages: Optional[Dict[str, float]] = None  # Seconds per pipeline stage, with include_stages
+
+class BatchQueryResult(BaseModel):
+    query: str
+    answer: Optional[str] = None
+    sources: List[SourceChunk]
+    cached: bool = False
+    prompt_tokens: Optional[int] = None
+
+class BatchQueryResponse(BaseModel):
+    results: List[BatchQueryResult]
+    processing_time: float
 
 class PaperMetadata(BaseModel):
     paper_id: str
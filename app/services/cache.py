@@ -0,0 +1,155 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+from app.config import settings
+import numpy as np
+
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry TTL and hit/miss counters"""
+    
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Live (unexpired) entries, oldest first"""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires, _) in self._entries.items() if expires < now]
+            for key in expired:
+                del self._entries[key]
+            return [(key, value) for key, (_, value) in self._entries.items()]
+    
+    def touch(self, key: Hashable, hit: bool):
+        """Record a lookup done outside get() (e.g. a similarity scan)"""
+        with self._lock:
+            if hit:
+                self.hits += 1
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+            else:
+                self.misses += 1
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+    
+    def stats(self) -> Dict[str, int]:
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class AnswerCache:
+    """Two-level cache of generated answers
+    
+    1. Exact: normalized query text + top_k + filters. Checked before embedding, so a
+       hit skips the whole pipeline. Cleared whenever the vector store changes.
+    2. Semantic: returns a stored answer when the new query embedding is within
+       SEMANTIC_CACHE_THRESHOLD cosine of a cached one *and* the retrieved chunk
+       IDs are identical. Because the IDs come from a fresh search, these hits
+       stay valid across uploads and deletions.
+    """
+    
+    def __init__(self):
+        self.exact = LRUCache(settings.ANSWER_CACHE_SIZE, settings.ANSWER_CACHE_TTL)
+        self.semantic = LRUCache(settings.SEMANTIC_CACHE_SIZE, settings.ANSWER_CACHE_TTL)
+        self.threshold = settings.SEMANTIC_CACHE_THRESHOLD
+        self.enabled = settings.ANSWER_CACHE_ENABLED
+        self._store_version = None
+    
+    @staticmethod
+    def normalize(query_text: str) -> str:
+        return ' '.join(query_text.lower().split())
+    
+    @staticmethod
+    def _filter_key(filters: Optional[Dict]) -> Optional[str]:
+        return json.dumps(filters, sort_keys=True, default=str) if filters else None
+    
+    def _check_version(self, store_version: int):
+        """Drop exact entries when the corpus has changed"""
+        if store_version != self._store_version:
+            self.exact.clear()
+            self._store_version = store_version
+    
+    def get_exact(self, query_text: str, top_k: int, store_version: int, filters: Optional[Dict] = None) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        self._check_version(store_version)
+        return self.exact.get((self.normalize(query_text), top_k, self._filter_key(filters)))
+    
+    def get_semantic(self, query_embedding: np.ndarray, retrieved_chunks: List[Dict]) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        
+        chunk_ids = tuple(chunk['vector_id'] for chunk in retrieved_chunks)
+        candidates = [(key, value) for key, value in self.semantic.items() if value['chunk_ids'] == chunk_ids]
+        if not candidates:
+            self.semantic.touch(None, hit=False)
+            return None
+        
+        # Embeddings are normalized, so the dot product is the cosine similarity
+        similarities = np.stack([value['embedding'] for _, value in candidates]) @ query_embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self.semantic.touch(None, hit=False)
+            return None
+        
+        key, value = candidates[best]
+        self.semantic.touch(key, hit=True)
+        return value['result']
+    
+    def put(self, query_text: str, top_k: int, query_embedding: np.ndarray, retrieved_chunks: List[Dict],
+            answer: str, store_version: int, filters: Optional[Dict] = None):
+        if not self.enabled:
+            return
+        
+        result = {'answer': answer, 'sources': retrieved_chunks}
+        key = (self.normalize(query_text), top_k, self._filter_key(filters))
+        # An answer retrieved before the corpus changed must not become an exact hit
+        if store_version == self._store_version:
+            self.exact.put(key, result)
+        self.semantic.put(key, {
+            'embedding': np.asarray(query_embedding, dtype=np.float32),
+            'chunk_ids': tuple(chunk['vector_id'] for chunk in retrieved_chunks),
+            'result': result
+        })
+    
+    def clear(self):
+        self.exact.clear()
+        self.semantic.clear()
+    
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {'exact': self.exact.stats(), 'semantic': self.semantic.stats()}
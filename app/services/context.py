@@ -0,0 +1,132 @@
+import re
+from typing import List, Dict, Tuple
+from app.config import settings
+from app.db.vector_store import VectorStore
+from app.services.embeddings import EmbeddingService
+from app.utils.tokens import TokenCounter
+from loguru import logger
+import numpy as np
+
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+class ContextBuilder:
+    """Fit retrieved chunks into CONTEXT_TOKEN_BUDGET tokens of LLM prompt
+    
+    1. Chunks whose stored embedding is within CONTEXT_DEDUP_THRESHOLD cosine
+       of a higher-ranked chunk are dropped.
+    2. If the rest exceed the budget, it is shared out so that short chunks
+       stay whole and long ones are cut to their sentences most similar to
+       the query (kept in reading order).
+    3. Chunks are put in chunk-ID (document) order, so questions that
+       retrieve the same chunks produce the same prompt prefix and Ollama
+       can reuse its prompt cache.
+    """
+    
+    def __init__(self, embedding_service: EmbeddingService, vector_store: VectorStore,
+                 token_counter: TokenCounter = None):
+        self.embedding_service = embedding_service
+        self.vector_store = vector_store
+        self.token_counter = token_counter or TokenCounter()
+    
+    def build(self, query_embedding: np.ndarray, chunks: List[Dict],
+              budget: int = None) -> Tuple[List[Dict], int]:
+        """Context chunks (text possibly trimmed) and their total token count"""
+        budget = settings.CONTEXT_TOKEN_BUDGET if budget is None else budget
+        chunks = self._deduplicate(chunks)
+        if not chunks:
+            return [], 0
+        
+        counts = self.token_counter.count_batch([chunk['text'] for chunk in chunks])
+        allowances = self._allocate(counts, budget)
+        
+        context, total = [], 0
+        over = [i for i, (count, allowance) in enumerate(zip(counts, allowances)) if count > allowance]
+        trimmed = self._trim(query_embedding, [chunks[i]['text'] for i in over], [allowances[i] for i in over])
+        trimmed = dict(zip(over, trimmed))
+        
+        for i, chunk in enumerate(chunks):
+            if i in trimmed:
+                text, count = trimmed[i]
+                if not text:
+                    continue
+                chunk = {**chunk, 'text': text}
+            else:
+                count = counts[i]
+            context.append(chunk)
+            total += count
+        
+        if over:
+            logger.info(f"Context trimmed to {total} tokens ({sum(counts)} retrieved)")
+        context.sort(key=lambda chunk: chunk.get('vector_id', 0))
+        return context, total
+    
+    def _deduplicate(self, chunks: List[Dict]) -> List[Dict]:
+        """Drop chunks nearly identical to a higher-ranked one (e.g. the same passage in two papers)"""
+        if len(chunks) < 2 or 'vector_id' not in chunks[0]:
+            return chunks
+        
+        vectors = self.vector_store.get_vectors([chunk['vector_id'] for chunk in chunks])
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        similarities = vectors @ vectors.T
+        
+        kept = []
+        for i in range(len(chunks)):
+            if not kept or similarities[i, kept].max() < settings.CONTEXT_DEDUP_THRESHOLD:
+                kept.append(i)
+        return [chunks[i] for i in kept]
+    
+    @staticmethod
+    def _allocate(counts: List[int], budget: int) -> List[int]:
+        """Split the budget so chunks under an equal share keep their full length"""
+        allowances = [0] * len(counts)
+        remaining = sorted(range(len(counts)), key=lambda i: counts[i])
+        left = budget
+        while remaining:
+            share = left // len(remaining)
+            i = remaining.pop(0)
+            allowances[i] = min(counts[i], share)
+            left -= allowances[i]
+        return allowances
+    
+    def _trim(self, query_embedding: np.ndarray, texts: List[str], allowances: List[int]) -> List[Tuple[str, int]]:
+        """Keep the sentences most similar to the query that fit each allowance"""
+        if not texts:
+            return []
+        
+        sentences = [[s for s in SENTENCE_RE.split(text) if s.strip()] for text in texts]
+        flat = [s for chunk_sentences in sentences for s in chunk_sentences]
+        embeddings = self.embedding_service.generate_embeddings(flat, show_progress_bar=False)
+        similarities = embeddings @ query_embedding
+        sentence_counts = self.token_counter.count_batch(flat)
+        
+        results = []
+        offset = 0
+        for chunk_sentences, allowance in zip(sentences, allowances):
+            n = len(chunk_sentences)
+            counts = sentence_counts[offset:offset + n]
+            order = np.argsort(-similarities[offset:offset + n], kind='stable')
+            offset += n
+            
+            selected, total = [], 0
+            for i in order:
+                if total + counts[i] <= allowance:
+                    selected.append(i)
+                    total += counts[i]
+            if not selected and allowance > 0 and n:
+                # Even the best sentence is too long: keep its start
+                best = int(order[0])
+                text = chunk_sentences[best]
+                text = text[:int(len(text) * allowance / counts[best])]
+                results.append((text, self.token_counter.count(text)))
+                continue
+            
+            # Mark skipped sentences so the LLM does not read across the gap
+            parts = []
+            for i in sorted(selected):
+                if parts and i != previous + 1:
+                    parts.append('...')
+                parts.append(chunk_sentences[i])
+                previous = i
+            results.append((' '.join(parts), total))
+        return results
@@ -0,0 +1,140 @@
+import os
+from pathlib import Path
+from typing import List
+from app.config import settings
+from loguru import logger
+import numpy as np
+
+
+class SentenceTransformerBackend:
+    """PyTorch inference through SentenceTransformer, optionally int8-quantized
+    
+    SentenceTransformer.encode already sorts each call's texts by length
+    before batching, so padding stays within similar-length texts.
+    """
+    
+    name = "torch"
+    
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = 0):
+        # Deferred so importing this module does not pull in torch
+        import torch
+        from sentence_transformers import SentenceTransformer
+        
+        if threads:
+            torch.set_num_threads(threads)  # Process-wide: also applies to the re-ranker
+        if quantize:
+            model = SentenceTransformer(model_name, device="cpu")
+            torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+        else:
+            model = SentenceTransformer(model_name)
+        self.model = model
+        self.dimension = model.get_sentence_embedding_dimension()
+    
+    def encode(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        return self.model.encode(
+            texts,
+            batch_size=settings.EMBEDDING_BATCH_SIZE,
+            show_progress_bar=show_progress_bar,
+            convert_to_numpy=True,
+            normalize_embeddings=True  # Important for cosine similarity
+        )
+
+
+class OnnxBackend:
+    """ONNX Runtime inference with mean pooling, optionally int8-quantized
+    
+    The model is exported to ONNX (and quantized) once with torch and
+    cached under ONNX_DIR; later starts only need onnxruntime and the
+    tokenizer. Texts are sorted by length and padded per batch. Assumes
+    the model uses mean pooling, as the sentence-transformers MiniLM/MPNet
+    models do.
+    """
+    
+    name = "onnx"
+    
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = 0):
+        import onnxruntime
+        from transformers import AutoTokenizer
+        
+        path = export_onnx(model_name, quantize)
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(str(path), options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.max_length = settings.CHUNK_MAX_TOKENS
+        
+        dimension = self.session.get_outputs()[0].shape[-1]
+        self.dimension = dimension if isinstance(dimension, int) else self.encode(["dimension"]).shape[1]
+    
+    def encode(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        
+        batch_size = settings.EMBEDDING_BATCH_SIZE
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        embeddings = None
+        for start in range(0, len(texts), batch_size):
+            batch = order[start:start + batch_size]
+            inputs = self.tokenizer(
+                [texts[i] for i in batch], padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np"
+            )
+            hidden = self.session.run(None, {name: inputs[name].astype(np.int64) for name in self.input_names})[0]
+            
+            mask = inputs["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            if embeddings is None:
+                embeddings = np.empty((len(texts), pooled.shape[1]), dtype=np.float32)
+            embeddings[batch] = pooled
+        return embeddings
+
+
+BACKENDS = {backend.name: backend for backend in (SentenceTransformerBackend, OnnxBackend)}
+
+
+def load_backend(name: str, model_name: str, quantize: bool = False, threads: int = 0):
+    """Instantiate an embedding backend by EMBEDDING_BACKEND name"""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {name} (expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[name](model_name, quantize=quantize, threads=threads)
+
+
+def export_onnx(model_name: str, quantize: bool = False) -> Path:
+    """Path of the model's ONNX export, creating it on first use"""
+    directory = settings.ONNX_DIR / model_name.replace("/", "__")
+    fp32_path = directory / "model.onnx"
+    path = directory / "model_int8.onnx" if quantize else fp32_path
+    if path.exists():
+        return path
+    directory.mkdir(parents=True, exist_ok=True)
+    
+    if not fp32_path.exists():
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+        
+        logger.info(f"Exporting {model_name} to ONNX")
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        inputs = dict(tokenizer(["export"], return_tensors="pt"))
+        axes = {0: "batch", 1: "sequence"}
+        tmp_path = fp32_path.with_suffix(f".{os.getpid()}.tmp")
+        with torch.no_grad():
+            torch.onnx.export(
+                model, (inputs,), str(tmp_path),
+                input_names=list(inputs), output_names=["last_hidden_state"],
+                dynamic_axes={**{name: axes for name in inputs}, "last_hidden_state": axes},
+                opset_version=14
+            )
+        os.replace(tmp_path, fp32_path)
+    
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        
+        logger.info(f"Quantizing {model_name} ONNX export to int8")
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        quantize_dynamic(str(fp32_path), str(tmp_path), weight_type=QuantType.QInt8)
+        os.replace(tmp_path, path)
+    return path
@@ -1,42 +1,182 @@
-from sentence_transformers import SentenceTransformer
-from typing import List
+import asyncio
+import threading
+import time
+from typing import List, Optional, Tuple
 from app.config import settings
+from app.db.content_cache import ContentCache
+from app.services.embedding_backends import load_backend
+from app.services.executor import thread_pool
+from app.utils.metrics import count, record_stage, timed
 from loguru import logger
 import numpy as np
 
 class EmbeddingService:
-    """Generate embeddings using FREE HuggingFace models (runs locally)"""
+    """Generate embeddings using FREE HuggingFace models (runs locally)
     
-    def __init__(self):
-        logger.info(f"Loading embedding model: {settings.EMBEDDING_MODEL}")
-        # This downloads the model ONCE, then runs locally (no API calls)
-        self.model = SentenceTransformer(settings.EMBEDDING_MODEL)
-        logger.info("Embedding model loaded successfully")
+    The model is loaded on first use with the EMBEDDING_BACKEND inference
+    backend, and one instance is shared by the whole process (see
+    `get_embedding_service`).
+    """
     
-    def generate_embeddings(self, texts: List[str]) -> np.ndarray:
+    def __init__(self, model_name: str = None, backend: str = None, quantize: bool = None):
+        self.model_name = model_name or settings.EMBEDDING_MODEL
+        self.backend = backend or settings.EMBEDDING_BACKEND
+        self.quantize = settings.EMBEDDING_QUANTIZE if quantize is None else quantize
+        self._model = None
+        self._load_lock = threading.Lock()
+        self._batcher: Optional["EmbeddingBatcher"] = None
+    
+    @property
+    def model(self):
+        """The inference backend, loaded on first access"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    logger.info(f"Loading embedding model: {self.model_name} ({self.backend_label})")
+                    # This downloads the model ONCE, then runs locally (no API calls)
+                    self._model = load_backend(
+                        self.backend, self.model_name, quantize=self.quantize, threads=settings.EMBEDDING_THREADS
+                    )
+                    logger.info("Embedding model loaded successfully")
+        return self._model
+    
+    @property
+    def backend_label(self) -> str:
+        return f"{self.backend} int8" if self.quantize else self.backend
+    
+    @property
+    def cache_key(self) -> str:
+        """Content-cache key: backends and quantization give slightly different vectors"""
+        if self.backend == "torch" and not self.quantize:
+            return self.model_name
+        return f"{self.model_name}@{self.backend_label.replace(' ', '-')}"
+    
+    def generate_embeddings(self, texts: List[str], show_progress_bar: bool = True) -> np.ndarray:
         """Generate embeddings for a list of texts (FREE - runs on your CPU/GPU)"""
         try:
             # This runs LOCALLY - no internet needed after first download
-            embeddings = self.model.encode(
-                texts,
-                show_progress_bar=True,
-                convert_to_numpy=True,
-                normalize_embeddings=True  # Important for cosine similarity
-            )
+            with timed("embed"):
+                embeddings = self.model.encode(texts, show_progress_bar=show_progress_bar)
+            count("rag_embeddings_total", "Texts encoded by the embedding model", len(texts))
             
             logger.info(f"Generated {len(embeddings)} embeddings")
             return embeddings.astype(np.float32)
-            
+        
         except Exception as e:
             logger.error(f"Error generating embeddings: {e}")
             raise
     
+    def generate_embeddings_cached(self, texts: List[str], cache: ContentCache,
+                                   show_progress_bar: bool = True) -> np.ndarray:
+        """Generate embeddings, reusing cached vectors for chunks seen before"""
+        if not texts:
+            return self.generate_embeddings(texts, show_progress_bar)
+        
+        vectors = cache.get_embeddings(self.cache_key, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            embeddings = self.generate_embeddings(missing_texts, show_progress_bar)
+            cache.put_embeddings(self.cache_key, missing_texts, embeddings)
+            for i, embedding in zip(missing, embeddings):
+                vectors[i] = embedding
+        
+        logger.info(f"Embedding cache: reused {len(texts) - len(missing)}/{len(texts)} chunks")
+        return np.vstack(vectors).astype(np.float32)
+    
     def generate_single_embedding(self, text: str) -> np.ndarray:
         """Generate embedding for a single text"""
-        embeddings = self.generate_embeddings([text])
+        embeddings = self.generate_embeddings([text], show_progress_bar=False)
         return embeddings[0]
     
+    async def generate_single_embedding_async(self, text: str) -> np.ndarray:
+        """Embed one text, batched together with other concurrent callers"""
+        if self._batcher is None:
+            self._batcher = EmbeddingBatcher(self)
+        return await self._batcher.embed(text)
+    
     @property
     def embedding_dimension(self) -> int:
         """Get the dimension of embeddings"""
-        return self.model.get_sentence_embedding_dimension()
\ No newline at end of file
+        return self.model.dimension
+
+
+class EmbeddingBatcher:
+    """Merge concurrent single-text embedding requests into one `model.encode` call
+    
+    The first request of a batch waits at most EMBEDDING_BATCH_MAX_WAIT_MS for
+    others to join; a full batch is flushed immediately. Encoding runs in a
+    worker thread so the event loop keeps accepting requests meanwhile.
+    """
+    
+    def __init__(self, service: EmbeddingService, max_wait_ms: float = None, max_batch_size: int = None):
+        self.service = service
+        if max_wait_ms is None:
+            max_wait_ms = settings.EMBEDDING_BATCH_MAX_WAIT_MS
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch_size = max_batch_size or settings.EMBEDDING_BATCH_MAX_SIZE
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+    
+    async def embed(self, text: str) -> np.ndarray:
+        """Queue a text and wait for its embedding
+        
+        The shared encode is observed once, in the worker thread; the
+        caller's stage breakdown also gets its duration. Time spent waiting
+        for the batch is recorded as "embed_wait".
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        start = time.perf_counter()
+        
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        
+        embedding, encode_seconds = await future
+        record_stage("embed", encode_seconds, observe=False)
+        record_stage("embed_wait", time.perf_counter() - start - encode_seconds)
+        return embedding
+    
+    def _flush(self):
+        """Hand the pending batch to a worker thread"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        batch, self._pending = self._pending, []
+        if batch:
+            asyncio.ensure_future(self._encode(batch))
+    
+    async def _encode(self, batch: List[Tuple[str, asyncio.Future]]):
+        texts = [text for text, _ in batch]
+        try:
+            start = time.perf_counter()
+            embeddings = await thread_pool.run(self.service.generate_embeddings, texts, False)
+            seconds = time.perf_counter() - start
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result((embedding, seconds))
+
+
+_embedding_service: Optional[EmbeddingService] = None
+_embedding_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """Process-wide shared EmbeddingService"""
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService()
+    return _embedding_service
@@ -0,0 +1,87 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable
+from app.config import settings
+from loguru import logger
+
+
+class ServiceOverloaded(Exception):
+    """Raised when a pool already has as much work as it is allowed to queue"""
+
+
+class BoundedPool:
+    """Run blocking work off the event loop, rejecting it once the pool is saturated
+    
+    At most `max_workers + max_queued` tasks are admitted at a time. Further
+    submissions fail fast with ServiceOverloaded (served as 503) instead of
+    queueing without bound behind slow requests. Background threads use
+    `call`, which counts against the same limit.
+    """
+    
+    def __init__(self, name: str, executor: Executor, max_workers: int, max_queued: int):
+        self.name = name
+        self.executor = executor
+        self.limit = max_workers + max_queued
+        self.in_flight = 0
+        self._lock = threading.Lock()  # in_flight is also changed from background threads
+    
+    def _admit(self):
+        with self._lock:
+            if self.in_flight >= self.limit:
+                logger.warning(f"{self.name} pool is full ({self.in_flight} tasks), rejecting work")
+                raise ServiceOverloaded(f"Server is busy ({self.name} queue full), retry shortly")
+            self.in_flight += 1
+    
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+    
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """Run func(*args, **kwargs) in the pool and await its result"""
+        self._admit()
+        try:
+            loop = asyncio.get_running_loop()
+            call = functools.partial(func, *args, **kwargs)
+            if isinstance(self.executor, ThreadPoolExecutor):
+                # Carry context variables (the request's stage timings) into the worker thread
+                call = functools.partial(contextvars.copy_context().run, call)
+            return await loop.run_in_executor(self.executor, call)
+        finally:
+            self._release()
+    
+    def call(self, func: Callable, *args, **kwargs) -> Any:
+        """Run func(*args, **kwargs) in the pool from a (non-event-loop) thread and wait for its result"""
+        self._admit()
+        try:
+            return self.executor.submit(func, *args, **kwargs).result()
+        finally:
+            self._release()
+    
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+# Threads for NumPy/PyTorch/FAISS work and file I/O (these release the GIL)
+thread_pool = BoundedPool(
+    "cpu",
+    ThreadPoolExecutor(max_workers=settings.CPU_THREAD_WORKERS, thread_name_prefix="cpu"),
+    settings.CPU_THREAD_WORKERS,
+    settings.MAX_QUEUED_TASKS
+)
+
+# Processes for pure-Python work that holds the GIL (PDF text extraction)
+process_pool = BoundedPool(
+    "pdf",
+    ProcessPoolExecutor(max_workers=settings.PDF_PROCESS_WORKERS),
+    settings.PDF_PROCESS_WORKERS,
+    settings.MAX_QUEUED_TASKS
+)
+
+
+def shutdown_pools():
+    """Stop worker threads and processes"""
+    thread_pool.shutdown()
+    process_pool.shutdown()
@@ -0,0 +1,395 @@
+import argparse
+import os
+import queue
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+from typing import List, Dict, Iterator, Iterable, Optional, Tuple
+from app.config import settings
+from app.db.content_cache import ContentCache
+from app.db.vector_store import VectorStore
+from app.services.embeddings import EmbeddingService, get_embedding_service
+from app.services.pdf_processor import PDFProcessor
+from app.utils.metrics import record_stage
+from app.utils.text_processing import TextChunker
+from loguru import logger
+import numpy as np
+
+STAGES = ("hash", "extract", "chunk", "embed", "commit")
+
+_DONE = object()
+
+
+def extract_pages(pdf_path: Path) -> Tuple[List[Dict], float]:
+    """Process-pool task: page texts of one PDF and the seconds spent extracting
+    
+    The duration is returned because metrics recorded in a pool process are
+    never scraped; callers pass it to `record_stage("pdf_extract", ...)`.
+    """
+    start = time.perf_counter()
+    pages = PDFProcessor().extract_text(pdf_path)['pages']
+    return pages, time.perf_counter() - start
+
+
+def _prefetch(source: Iterable, depth: int, stop: threading.Event) -> Iterator:
+    """Run a generator in a background thread, buffering up to `depth` items, so stages overlap"""
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    
+    def produce():
+        try:
+            for item in source:
+                while not stop.is_set():
+                    try:
+                        buffer.put(item, timeout=0.1)
+                        break
+                    except queue.Full:
+                        continue
+                if stop.is_set():
+                    return
+            buffer.put(_DONE)
+        except BaseException as e:
+            buffer.put(e)
+    
+    threading.Thread(target=produce, name="ingest-stage", daemon=True).start()
+    while True:
+        try:
+            item = buffer.get(timeout=0.1)
+        except queue.Empty:
+            if stop.is_set():
+                return
+            continue
+        if item is _DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
+class BulkIngestor:
+    """Pipelined bulk import of a directory of PDFs
+    
+    Stages run concurrently, connected by bounded queues:
+    hash (skip files already indexed) -> extract (process pool) ->
+    chunk -> embed (INGEST_EMBED_BATCH chunks per encode, cache-aware) ->
+    commit (INGEST_COMMIT_BATCH chunks per vector store write).
+    
+    A file is recorded in the content cache only once all of its chunks are
+    committed, so an interrupted run resumes where it stopped: finished
+    files are skipped and partially committed papers are replaced.
+    
+    Paper IDs come from each file's path below `root` (the API passes
+    INGEST_ROOT), so a file keeps its ID whichever folder an import starts
+    from; without a root they come from the absolute path.
+    """
+    
+    def __init__(self, vector_store: VectorStore, content_cache: ContentCache,
+                 embedding_service: EmbeddingService = None, workers: int = None, root: Path = None):
+        self.id = uuid.uuid4().hex[:12]
+        self.vector_store = vector_store
+        self.content_cache = content_cache
+        self.embedding_service = embedding_service or get_embedding_service()
+        self.pdf_processor = PDFProcessor()
+        self.text_chunker = TextChunker()
+        self.workers = workers or settings.INGEST_WORKERS or os.cpu_count() or 1
+        self.root = Path(root).resolve() if root is not None else None
+        
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.directory: Optional[Path] = None
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.counts = {
+            'files_total': 0,
+            'files_skipped': 0,
+            'files_failed': 0,
+            'files_indexed': 0,
+            'pages': 0,
+            'chunks': 0
+        }
+        self.stage_items = dict.fromkeys(STAGES, 0)
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def start(self, directory: Path, recursive: bool = True):
+        """Run the import in a background thread"""
+        self.status = "running"
+        def target():
+            try:
+                self.run(directory, recursive)
+            except Exception:
+                pass  # Logged and reported through `status` / `error`
+        
+        self._thread = threading.Thread(target=target, name=f"ingest-{self.id}", daemon=True)
+        self._thread.start()
+    
+    def cancel(self):
+        """Stop after the batch in progress; committed files stay indexed"""
+        self._stop.set()
+    
+    @property
+    def running(self) -> bool:
+        return self.status == "running"
+    
+    def run(self, directory: Path, recursive: bool = True) -> Dict:
+        """Import every PDF under a directory, returning the final report"""
+        self.directory = Path(directory)
+        self.status = "running"
+        self.started_at = time.time()
+        
+        try:
+            files = sorted(self.directory.rglob("*.pdf") if recursive else self.directory.glob("*.pdf"))
+            self.counts['files_total'] = len(files)
+            logger.info(f"Bulk ingest {self.id}: {len(files)} PDFs in {self.directory}")
+            
+            depth = settings.INGEST_QUEUE_DEPTH
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                documents = _prefetch(self._extract(files, pool), depth, self._stop)
+                batches = _prefetch(self._embed(self._chunk(documents)), depth, self._stop)
+                self._commit(batches)
+            
+            if self.vector_store.index is not None:
+                self.vector_store.save()
+            self.status = "cancelled" if self._stop.is_set() else "completed"
+        
+        except Exception as e:
+            logger.error(f"Bulk ingest {self.id} failed: {e}")
+            self.status = "failed"
+            self.error = str(e)
+            self._stop.set()
+            raise
+        finally:
+            self.finished_at = time.time()
+            logger.info(f"Bulk ingest {self.id} {self.status}: {self.report()}")
+        
+        return self.report()
+    
+    def _timed(self, stage: str, start: float, items: int = 1):
+        self.stage_seconds[stage] += time.perf_counter() - start
+        self.stage_items[stage] += items
+    
+    def _pending_files(self, files: List[Path]) -> Iterator[Tuple[Path, str]]:
+        """Hash each file and drop those already indexed (or repeated within this run)"""
+        seen = set()
+        for pdf_path in files:
+            if self._stop.is_set():
+                return
+            
+            start = time.perf_counter()
+            file_hash = self.pdf_processor.file_hash(pdf_path)
+            existing = self.content_cache.lookup_file(file_hash)
+            self._timed("hash", start)
+            
+            indexed = existing and (
+                existing['num_chunks'] == 0 or self.vector_store.paper_chunk_ids(existing['paper_id'])
+            )
+            if indexed or file_hash in seen:
+                self.counts['files_skipped'] += 1
+                continue
+            
+            seen.add(file_hash)
+            yield pdf_path, file_hash
+    
+    def _extract(self, files: List[Path], pool: ProcessPoolExecutor) -> Iterator[Dict]:
+        """Extract page texts in the process pool, yielding documents as they finish"""
+        in_flight = {}
+        pending = self._pending_files(files)
+        exhausted = False
+        
+        while in_flight or not exhausted:
+            while not exhausted and len(in_flight) < 2 * self.workers:
+                item = next(pending, None)
+                if item is None:
+                    exhausted = True
+                    break
+                in_flight[pool.submit(extract_pages, item[0])] = item
+            
+            if not in_flight:
+                break
+            
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                pdf_path, file_hash = in_flight.pop(future)
+                try:
+                    pages, seconds = future.result()
+                except Exception as e:
+                    logger.error(f"Skipping {pdf_path}: {e}")
+                    self.counts['files_failed'] += 1
+                    continue
+                
+                self.stage_seconds['extract'] += seconds
+                self.stage_items['extract'] += 1
+                record_stage("pdf_extract", seconds)
+                self.counts['pages'] += len(pages)
+                yield {
+                    'paper_id': self._paper_id(pdf_path),
+                    'filename': pdf_path.name,
+                    'file_hash': file_hash,
+                    'pages': pages
+                }
+    
+    def _paper_id(self, pdf_path: Path) -> str:
+        """ID from the file's path below the root: same-named files in different folders are different papers"""
+        path = pdf_path.resolve()
+        if self.root is not None and path.is_relative_to(self.root):
+            path = path.relative_to(self.root)
+        return self.pdf_processor.generate_paper_id(path.as_posix())
+    
+    def _chunk(self, documents: Iterable[Dict]) -> Iterator[List[Dict]]:
+        """Chunk documents, yielding lists of about INGEST_EMBED_BATCH chunks
+        
+        Each chunk carries its paper's document dict; the last chunk of a
+        paper is flagged so the commit stage knows when the file is done.
+        """
+        batch = []
+        for document in documents:
+            start = time.perf_counter()
+            chunks = self.text_chunker.chunk_text(document.pop('pages'))
+            document['num_chunks'] = len(chunks)
+            self._timed("chunk", start, len(chunks))
+            
+            if not chunks:
+                # Nothing to embed; still recorded so the file is not retried
+                batch.append({'document': document, 'text': None, 'page': None, 'page_end': None, 'first': True, 'last': True})
+            for i, chunk in enumerate(chunks):
+                batch.append({
+                    'document': document,
+                    'text': chunk['text'],
+                    'page': chunk['page'],
+                    'page_end': chunk.get('page_end'),
+                    'first': i == 0,
+                    'last': i == len(chunks) - 1
+                })
+            
+            while len(batch) >= settings.INGEST_EMBED_BATCH:
+                yield batch[:settings.INGEST_EMBED_BATCH]
+                batch = batch[settings.INGEST_EMBED_BATCH:]
+        
+        if batch:
+            yield batch
+    
+    def _embed(self, batches: Iterable[List[Dict]]) -> Iterator[Tuple[List[Dict], np.ndarray]]:
+        for batch in batches:
+            texts = [item['text'] for item in batch if item['text'] is not None]
+            start = time.perf_counter()
+            embeddings = (
+                self.embedding_service.generate_embeddings_cached(texts, self.content_cache, show_progress_bar=False)
+                if texts else None
+            )
+            self._timed("embed", start, len(texts))
+            yield batch, embeddings
+    
+    def _commit(self, batches: Iterable[Tuple[List[Dict], np.ndarray]]):
+        """Write embedded chunks to the vector store in large batches"""
+        items, vectors = [], []
+        num_chunks = 0
+        
+        for batch, embeddings in batches:
+            items.extend(batch)
+            if embeddings is not None:
+                vectors.append(embeddings)
+                num_chunks += len(embeddings)
+            if num_chunks >= settings.INGEST_COMMIT_BATCH:
+                self._flush(items, vectors)
+                items, vectors, num_chunks = [], [], 0
+        
+        if items:
+            self._flush(items, vectors)
+    
+    def _flush(self, items: List[Dict], vectors: List[np.ndarray]):
+        start = time.perf_counter()
+        
+        # A paper left half-indexed by an interrupted run, or re-imported, is replaced
+        for item in items:
+            if item['first']:
+                self.vector_store.remove_paper(item['document']['paper_id'])
+        
+        chunk_items = [item for item in items if item['text'] is not None]
+        if chunk_items:
+            metadata = [
+                {
+                    'text': item['text'],
+                    'page': item['page'],
+                    'page_end': item['page_end'],
+                    'paper_id': item['document']['paper_id'],
+                    'filename': item['document']['filename']
+                }
+                for item in chunk_items
+            ]
+            self.vector_store.add(np.vstack(vectors), metadata)
+        
+        # Files whose last chunk is now durable are complete
+        for item in items:
+            if item['last']:
+                document = item['document']
+                self.content_cache.record_file(
+                    document['file_hash'], document['paper_id'], document['filename'], document['num_chunks']
+                )
+                self.counts['files_indexed'] += 1
+        
+        self.counts['chunks'] += len(chunk_items)
+        self._timed("commit", start, len(chunk_items))
+        logger.info(
+            f"Bulk ingest {self.id}: {self.counts['files_indexed']}/{self.counts['files_total']} files, "
+            f"{self.counts['chunks']} chunks"
+        )
+    
+    def report(self) -> Dict:
+        """Counters plus per-stage throughput (items per second of stage busy time)"""
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'error': self.error,
+            'directory': str(self.directory) if self.directory else None,
+            'elapsed_seconds': elapsed,
+            **self.counts,
+            'files_per_second': self.counts['files_indexed'] / elapsed if elapsed else 0.0,
+            'stages': {
+                stage: {
+                    'items': self.stage_items[stage],
+                    'seconds': self.stage_seconds[stage],
+                    'per_second': self.stage_items[stage] / self.stage_seconds[stage] if self.stage_seconds[stage] else 0.0
+                }
+                for stage in STAGES
+            }
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import a directory of PDFs into the vector store")
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--no-recursive", action="store_true", help="Only read PDFs directly in the directory")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: INGEST_WORKERS)")
+    args = parser.parse_args()
+    
+    vector_store = VectorStore()
+    try:
+        vector_store.load()
+    except FileNotFoundError:
+        logger.info("No existing vector store found, creating a new one")
+    
+    content_cache = ContentCache()
+    ingestor = BulkIngestor(vector_store, content_cache, workers=args.workers)
+    try:
+        report = ingestor.run(args.directory, recursive=not args.no_recursive)
+    except KeyboardInterrupt:
+        # Everything committed so far is durable; rerun to resume
+        logger.warning("Interrupted; rerun the same command to resume")
+        raise SystemExit(130)
+    finally:
+        content_cache.close()
+    
+    for stage, stats in report['stages'].items():
+        print(f"{stage:>8}: {stats['items']:>8} items in {stats['seconds']:8.1f}s  ({stats['per_second']:.1f}/s)")
+    print(
+        f"{report['files_indexed']} indexed, {report['files_skipped']} skipped, {report['files_failed']} failed, "
+        f"{report['chunks']} chunks in {report['elapsed_seconds']:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Set
+from app.config import settings
+from app.db.content_cache import ContentCache
+from app.db.job_queue import JobQueue
+from app.db.vector_store import VectorStore
+from app.services.embeddings import EmbeddingService, get_embedding_service
+from app.services.executor import ServiceOverloaded, process_pool
+from app.services.ingest import extract_pages
+from app.utils.metrics import count, record_stage
+from app.utils.text_processing import TextChunker
+from loguru import logger
+import numpy as np
+
+
+class JobCancelled(Exception):
+    """Raised inside a job once cancellation has been requested"""
+
+
+class WorkersStopping(Exception):
+    """Raised inside a job when the server shuts down; the job is requeued"""
+
+
+class UploadWorkers:
+    """Threads that process queued uploads: extract -> chunk -> embed -> index
+    
+    They run apart from the request thread pool, so queued uploads never
+    take its slots from interactive queries, and JOB_WORKERS bounds how
+    much of the machine ingest work uses per process. Progress is written
+    to the job after every stage and embedding batch; that is also when
+    cancellation is checked.
+    """
+    
+    def __init__(self, queue: JobQueue, vector_store: VectorStore, content_cache: ContentCache,
+                 embedding_service: EmbeddingService = None, workers: int = None):
+        self.queue = queue
+        self.vector_store = vector_store
+        self.content_cache = content_cache
+        self.embedding_service = embedding_service or get_embedding_service()
+        self.text_chunker = TextChunker()
+        self.workers = settings.JOB_WORKERS if workers is None else workers
+        self._running: Set[str] = set()  # Job IDs being processed by this process
+        self._running_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+    
+    def start(self):
+        """Start the worker threads and the lease heartbeat"""
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f"upload-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="upload-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+    
+    def stop(self, timeout: float = None):
+        """Stop after the jobs in progress reach their next stage boundary"""
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+    
+    def notify(self):
+        """A job was queued by this process: wake an idle worker instead of waiting for the next poll"""
+        self._wake.set()
+    
+    def _work(self):
+        while not self._stop.is_set():
+            try:
+                job = self.queue.claim()
+            except Exception as e:
+                logger.error(f"Cannot claim upload job: {e}")
+                job = None
+            if job is None:
+                self._wake.wait(settings.JOB_POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            self.run(job)
+    
+    def _heartbeat(self):
+        while not self._stop.wait(settings.JOB_LEASE_SECONDS / 4):
+            try:
+                with self._running_lock:
+                    running = list(self._running)
+                self.queue.heartbeat(running)
+            except Exception as e:
+                logger.error(f"Upload job heartbeat failed: {e}")
+    
+    def run(self, job: Dict):
+        """Process one claimed job and record its outcome"""
+        with self._running_lock:
+            self._running.add(job['id'])
+        try:
+            num_chunks = self.process(job)
+        except JobCancelled:
+            self.queue.cancelled(job['id'])
+            logger.info(f"Upload job {job['id']} ({job['filename']}) cancelled")
+        except WorkersStopping:
+            self.queue.release(job['id'])
+            logger.info(f"Upload job {job['id']} ({job['filename']}) requeued at shutdown")
+        except ServiceOverloaded:
+            # Interactive requests fill the pool: retry later without counting an attempt
+            self.queue.release(job['id'])
+            logger.info(f"Upload job {job['id']} ({job['filename']}) requeued: extraction pool is full")
+            self._stop.wait(settings.JOB_POLL_INTERVAL)
+        except Exception as e:
+            status = self.queue.fail(job['id'], str(e))
+            logger.error(f"Upload job {job['id']} ({job['filename']}) attempt {job['attempts']} failed: {e} ({status})")
+        else:
+            self.queue.complete(job['id'], num_chunks)
+            count("rag_uploads_total", "Uploaded PDFs", result="indexed")
+            logger.info(f"Upload job {job['id']}: indexed {job['filename']} ({num_chunks} chunks)")
+        finally:
+            with self._running_lock:
+                self._running.discard(job['id'])
+    
+    def process(self, job: Dict) -> int:
+        """Index a stored upload, replacing any previous copy of the paper"""
+        progress = {'pages': None, 'chunks': None, 'chunks_embedded': 0, 'seconds': {}}
+        
+        def advance(stage: str):
+            # Records progress, renews the lease and checks for cancellation
+            if self._stop.is_set():
+                raise WorkersStopping()
+            if not self.queue.update(job['id'], stage, progress):
+                raise JobCancelled()
+        
+        # Extract text (pure-Python parsing, so in a separate process)
+        advance("extract")
+        start = time.perf_counter()
+        pages, seconds = process_pool.call(extract_pages, Path(job['file_path']))
+        record_stage("pdf_extract", seconds)
+        progress['pages'] = len(pages)
+        progress['seconds']['extract'] = time.perf_counter() - start
+        
+        advance("chunk")
+        start = time.perf_counter()
+        chunks = self.text_chunker.chunk_text(pages)
+        progress['chunks'] = len(chunks)
+        progress['seconds']['chunk'] = time.perf_counter() - start
+        
+        advance("embed")
+        start = time.perf_counter()
+        texts = [chunk['text'] for chunk in chunks]
+        embeddings = []
+        for batch_start in range(0, len(texts), settings.INGEST_EMBED_BATCH):
+            batch = texts[batch_start:batch_start + settings.INGEST_EMBED_BATCH]
+            embeddings.append(self.embedding_service.generate_embeddings_cached(
+                batch, self.content_cache, show_progress_bar=False
+            ))
+            progress['chunks_embedded'] += len(batch)
+            advance("embed")
+        progress['seconds']['embed'] = time.perf_counter() - start
+        
+        # Last point at which the job can be cancelled
+        advance("index")
+        start = time.perf_counter()
+        # Re-uploads replace the previous copy of the paper
+        metadata = [
+            {
+                'text': chunk['text'],
+                'page': chunk['page'],
+                'page_end': chunk.get('page_end'),
+                'paper_id': job['paper_id'],
+                'filename': job['filename']
+            }
+            for chunk in chunks
+        ]
+        self.vector_store.replace_paper(
+            job['paper_id'], np.vstack(embeddings) if embeddings else np.zeros((0, 0), dtype=np.float32), metadata
+        )
+        self.content_cache.record_file(job['file_hash'], job['paper_id'], job['filename'], len(chunks))
+        progress['seconds']['index'] = time.perf_counter() - start
+        self.queue.update(job['id'], "index", progress)
+        return len(chunks)
@@ -1,70 +1,146 @@
-import requests
-from typing import List, Dict
+import json
+import time
+import httpx
+from typing import List, Dict, AsyncIterator
 from app.config import settings
+from app.services.ollama_client import OllamaClient
+from app.utils.metrics import count, record_stage, timed
 from loguru import logger
 
+GENERATION_ERROR = "Error generating answer. Please check Ollama is running."
+GENERATION_TIMEOUT = "Generation timed out. Try a simpler query or smaller model."
+
 class LLMService:
     """FREE Local LLM using Ollama"""
     
-    def __init__(self):
-        self.base_url = settings.OLLAMA_BASE_URL
+    def __init__(self, base_urls: List[str] = None):
         self.model = settings.OLLAMA_MODEL
+        self.client = OllamaClient(base_urls)
         
         # Check if Ollama is running
-        try:
-            response = requests.get(f"{self.base_url}/api/tags")
-            if response.status_code == 200:
-                logger.info(f"Connected to Ollama - Using model: {self.model}")
+        for base_url, ok in self.client.check().items():
+            if ok:
+                logger.info(f"Connected to Ollama at {base_url} - Using model: {self.model}")
             else:
-                logger.warning("Ollama is not responding. Make sure it's running: 'ollama serve'")
-        except Exception as e:
-            logger.error(f"Cannot connect to Ollama: {e}")
-            logger.error("Start Ollama with: 'ollama serve'")
+                logger.error(f"Cannot connect to Ollama at {base_url}")
+                logger.error("Start Ollama with: 'ollama serve'")
     
     def generate_answer(self, query: str, context_chunks: List[Dict]) -> str:
         """Generate answer using retrieved context (FREE - runs locally)"""
         try:
-            # Build context from chunks
-            context = self._build_context(context_chunks)
-            
-            # Create prompt
-            prompt = self._create_prompt(query, context)
+            prompt = self.build_prompt(query, context_chunks)
             
             # Call Ollama API (LOCAL - no cost)
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,
-                        "num_predict": 1000,
-                    }
-                },
-                timeout=60
-            )
+            with timed("llm_generate"):
+                response = self.client.post_sync("/api/generate", self._generate_payload(prompt))
             
             if response.status_code == 200:
                 answer = response.json()['response']
                 logger.info("Generated answer successfully")
+                self._count("ok")
                 return answer
             else:
                 logger.error(f"Ollama error: {response.text}")
-                return "Error generating answer. Please check Ollama is running."
+                self._count("error")
+                return GENERATION_ERROR
+        
+        except httpx.TimeoutException:
+            logger.error("Ollama request timed out")
+            self._count("timeout")
+            return GENERATION_TIMEOUT
+        except Exception as e:
+            logger.error(f"Error generating answer: {e}")
+            raise
+    
+    async def generate_answer_async(self, query: str, context_chunks: List[Dict]) -> str:
+        """Generate answer without blocking the event loop"""
+        try:
+            prompt = self.build_prompt(query, context_chunks)
+            
+            with timed("llm_generate"):
+                response = await self.client.post("/api/generate", self._generate_payload(prompt))
             
-        except requests.exceptions.Timeout:
+            if response.status_code == 200:
+                answer = response.json()['response']
+                logger.info("Generated answer successfully")
+                self._count("ok")
+                return answer
+            else:
+                logger.error(f"Ollama error: {response.text}")
+                self._count("error")
+                return GENERATION_ERROR
+        
+        except httpx.TimeoutException:
             logger.error("Ollama request timed out")
-            return "Generation timed out. Try a simpler query or smaller model."
+            self._count("timeout")
+            return GENERATION_TIMEOUT
         except Exception as e:
             logger.error(f"Error generating answer: {e}")
             raise
     
+    async def stream_answer(self, query: str, context_chunks: List[Dict]) -> AsyncIterator[str]:
+        """Yield answer tokens as Ollama generates them (NDJSON stream)"""
+        prompt = self.build_prompt(query, context_chunks)
+        start = time.perf_counter()
+        first_token = True
+        
+        # The timeout applies between chunks, so long answers are not cut off
+        async with self.client.stream("/api/generate", self._generate_payload(prompt, stream=True)) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                logger.error(f"Ollama error: {body.decode(errors='replace')}")
+                self._count("error")
+                raise RuntimeError(GENERATION_ERROR)
+            
+            async for line in response.aiter_lines():
+                if not line.strip():
+                    continue
+                
+                data = json.loads(line)
+                if 'error' in data:
+                    raise RuntimeError(f"Ollama error: {data['error']}")
+                if data.get('response'):
+                    if first_token:
+                        record_stage("llm_first_token", time.perf_counter() - start)
+                        first_token = False
+                    yield data['response']
+                if data.get('done'):
+                    break
+        
+        record_stage("llm_stream", time.perf_counter() - start)
+        self._count("ok")
+        logger.info("Streamed answer successfully")
+    
+    @staticmethod
+    def _count(result: str):
+        count("rag_llm_requests_total", "Ollama generate calls by outcome", result=result)
+    
+    async def aclose(self):
+        """Close pooled HTTP connections"""
+        await self.client.aclose()
+    
+    def _generate_payload(self, prompt: str, stream: bool = False) -> Dict:
+        """Request body for Ollama /api/generate"""
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": {
+                "temperature": 0.3,
+                "num_predict": 1000,
+            }
+        }
+    
+    def build_prompt(self, query: str, context_chunks: List[Dict]) -> str:
+        """Full prompt for a question and its context chunks"""
+        return self._create_prompt(query, self._build_context(context_chunks))
+    
     def _build_context(self, chunks: List[Dict]) -> str:
         """Build context string from chunks"""
         context_parts = []
         for i, chunk in enumerate(chunks, 1):
-            page_info = f"[Page {chunk.get('page', 'N/A')}]"
+            page, page_end = chunk.get('page', 'N/A'), chunk.get('page_end')
+            page_info = f"[Pages {page}-{page_end}]" if page_end and page_end != page else f"[Page {page}]"
             context_parts.append(f"{page_info}\n{chunk['text']}\n")
         
         return "\n---\n".join(context_parts)
@@ -0,0 +1,177 @@
+import asyncio
+import random
+import threading
+import time
+import httpx
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional, AsyncIterator
+from app.config import settings
+from loguru import logger
+
+# Failures where the request never reached Ollama, so it is safe to retry elsewhere
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+
+class OllamaBackend:
+    """One Ollama server and its in-flight request accounting"""
+    
+    def __init__(self, base_url: str, max_in_flight: int):
+        self.base_url = base_url.rstrip("/")
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.last_failure = 0.0
+        self._async_slots: Optional[asyncio.Semaphore] = None
+        self.sync_slots = threading.BoundedSemaphore(max_in_flight)
+    
+    @property
+    def async_slots(self) -> asyncio.Semaphore:
+        # Created lazily so it binds to the running event loop
+        if self._async_slots is None:
+            self._async_slots = asyncio.Semaphore(self.max_in_flight)
+        return self._async_slots
+    
+    @property
+    def cooling_down(self) -> bool:
+        return time.monotonic() - self.last_failure < settings.OLLAMA_FAILURE_COOLDOWN
+
+
+class OllamaClient:
+    """Pooled keep-alive HTTP client for one or more Ollama servers
+    
+    Each request goes to the least-loaded backend (skipping ones that failed
+    recently), waits for one of that backend's OLLAMA_MAX_IN_FLIGHT slots, and
+    is retried with jittered exponential backoff on connection errors.
+    """
+    
+    def __init__(self, base_urls: List[str] = None, max_in_flight: int = None, max_retries: int = None):
+        base_urls = base_urls or settings.OLLAMA_BASE_URLS or [settings.OLLAMA_BASE_URL]
+        max_in_flight = max_in_flight or settings.OLLAMA_MAX_IN_FLIGHT
+        self.backends = [OllamaBackend(url, max_in_flight) for url in base_urls]
+        self.max_retries = settings.OLLAMA_MAX_RETRIES if max_retries is None else max_retries
+        
+        limits = httpx.Limits(
+            max_connections=max_in_flight * len(self.backends) + len(self.backends),
+            max_keepalive_connections=max_in_flight * len(self.backends)
+        )
+        self._limits = limits
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self._lock = threading.Lock()
+    
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        """Shared async HTTP client, created on first use"""
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(timeout=settings.OLLAMA_TIMEOUT, limits=self._limits)
+        return self._async_client
+    
+    @property
+    def sync_client(self) -> httpx.Client:
+        """Shared blocking HTTP client, created on first use"""
+        if self._sync_client is None:
+            self._sync_client = httpx.Client(timeout=settings.OLLAMA_TIMEOUT, limits=self._limits)
+        return self._sync_client
+    
+    def _pick_backend(self, exclude: List[OllamaBackend] = ()) -> OllamaBackend:
+        """Least-loaded healthy backend, falling back to any backend"""
+        candidates = [b for b in self.backends if b not in exclude] or self.backends
+        healthy = [b for b in candidates if not b.cooling_down] or candidates
+        least = min(b.in_flight for b in healthy)
+        return random.choice([b for b in healthy if b.in_flight == least])
+    
+    def _backoff(self, attempt: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, settings.OLLAMA_RETRY_BACKOFF * (2 ** attempt))
+    
+    def _track(self, backend: OllamaBackend, delta: int):
+        with self._lock:
+            backend.in_flight += delta
+    
+    def _failed(self, backend: OllamaBackend, attempt: int, error: Exception):
+        backend.last_failure = time.monotonic()
+        logger.warning(f"Ollama request to {backend.base_url} failed (attempt {attempt + 1}): {error}")
+    
+    async def post(self, path: str, json: Dict) -> httpx.Response:
+        """POST to the least-loaded backend, retrying connection failures"""
+        tried: List[OllamaBackend] = []
+        for attempt in range(self.max_retries + 1):
+            backend = self._pick_backend(tried)
+            self._track(backend, 1)
+            try:
+                async with backend.async_slots:
+                    return await self.async_client.post(f"{backend.base_url}{path}", json=json)
+            except RETRYABLE_ERRORS as e:
+                self._failed(backend, attempt, e)
+                tried.append(backend)
+                if attempt == self.max_retries:
+                    raise
+            finally:
+                self._track(backend, -1)
+            await asyncio.sleep(self._backoff(attempt))
+    
+    @asynccontextmanager
+    async def stream(self, path: str, json: Dict) -> AsyncIterator[httpx.Response]:
+        """Open a streaming POST; only the connection phase is retried"""
+        tried: List[OllamaBackend] = []
+        for attempt in range(self.max_retries + 1):
+            backend = self._pick_backend(tried)
+            self._track(backend, 1)
+            try:
+                async with backend.async_slots:
+                    request = self.async_client.build_request("POST", f"{backend.base_url}{path}", json=json)
+                    try:
+                        response = await self.async_client.send(request, stream=True)
+                    except RETRYABLE_ERRORS as e:
+                        self._failed(backend, attempt, e)
+                        tried.append(backend)
+                        if attempt == self.max_retries:
+                            raise
+                        response = None
+                    
+                    if response is not None:
+                        try:
+                            yield response
+                        finally:
+                            await response.aclose()
+                        return
+            finally:
+                self._track(backend, -1)
+            await asyncio.sleep(self._backoff(attempt))
+    
+    def post_sync(self, path: str, json: Dict) -> httpx.Response:
+        """Blocking POST for callers outside the event loop"""
+        tried: List[OllamaBackend] = []
+        for attempt in range(self.max_retries + 1):
+            backend = self._pick_backend(tried)
+            self._track(backend, 1)
+            try:
+                with backend.sync_slots:
+                    return self.sync_client.post(f"{backend.base_url}{path}", json=json)
+            except RETRYABLE_ERRORS as e:
+                self._failed(backend, attempt, e)
+                tried.append(backend)
+                if attempt == self.max_retries:
+                    raise
+            finally:
+                self._track(backend, -1)
+            time.sleep(self._backoff(attempt))
+    
+    def check(self) -> Dict[str, bool]:
+        """Which backends answer /api/tags"""
+        status = {}
+        for backend in self.backends:
+            try:
+                response = self.sync_client.get(f"{backend.base_url}/api/tags", timeout=5)
+                status[backend.base_url] = response.status_code == 200
+            except httpx.HTTPError:
+                status[backend.base_url] = False
+        return status
+    
+    async def aclose(self):
+        """Close pooled connections"""
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
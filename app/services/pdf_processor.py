@@ -38,4 +38,13 @@ class PDFProcessor:
     
     def generate_paper_id(self, filename: str) -> str:
         """Generate unique ID for paper"""
-        return hashlib.md5(filename.encode()).hexdigest()[:12]
\ No newline at end of file
+        return hashlib.md5(filename.encode()).hexdigest()[:12]
+    
+    @staticmethod
+    def file_hash(pdf_path: Path) -> str:
+        """SHA-256 of a file's contents, read in 1 MiB blocks"""
+        digest = hashlib.sha256()
+        with open(pdf_path, 'rb') as file:
+            while block := file.read(1 << 20):
+                digest.update(block)
+        return digest.hexdigest()
\ No newline at end of file
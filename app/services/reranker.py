@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import List, Dict
+from app.config import settings
+from loguru import logger
+
+
+class Reranker:
+    """Re-score retrieved chunks with a local cross-encoder (FREE - runs on your CPU)
+    
+    Candidates are scored in batches of RERANK_BATCH_SIZE in retrieval order.
+    If the time budget has run out once a batch is scored (including the
+    last one), the candidates are returned in their original (retrieval)
+    order. The model is loaded on first use, optionally with int8 dynamic
+    quantization of its linear layers for faster CPU inference.
+    """
+    
+    def __init__(self, model_name: str = None, quantize: bool = None):
+        self.model_name = model_name or settings.RERANK_MODEL
+        self.quantize = settings.RERANK_QUANTIZE if quantize is None else quantize
+        self._model = None
+        self._load_lock = threading.Lock()
+        self.timeouts = 0
+    
+    @property
+    def model(self):
+        """The CrossEncoder, loaded on first access"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    # Deferred so importing this module does not pull in torch
+                    from sentence_transformers import CrossEncoder
+                    
+                    logger.info(f"Loading re-rank model: {self.model_name}")
+                    if self.quantize:
+                        import torch
+                        
+                        model = CrossEncoder(self.model_name, device="cpu")
+                        model.model = torch.ao.quantization.quantize_dynamic(
+                            model.model, {torch.nn.Linear}, dtype=torch.qint8
+                        )
+                    else:
+                        model = CrossEncoder(self.model_name)
+                    self._model = model
+                    logger.info("Re-rank model loaded successfully")
+        return self._model
+    
+    def rerank(self, query: str, candidates: List[Dict], top_k: int, budget_ms: float = None) -> List[Dict]:
+        """Top-k candidates by cross-encoder score, or by retrieval order if over budget
+        
+        Re-ranked results get 'score' replaced by the cross-encoder score and
+        keep the original one as 'retrieval_score'. Model loading does not
+        count against the budget.
+        """
+        if len(candidates) <= 1:
+            return candidates[:top_k]
+        
+        budget_ms = settings.RERANK_BUDGET_MS if budget_ms is None else budget_ms
+        model = self.model
+        deadline = time.perf_counter() + budget_ms / 1000
+        batch_size = settings.RERANK_BATCH_SIZE
+        
+        scores = []
+        for start in range(0, len(candidates), batch_size):
+            pairs = [(query, chunk['text']) for chunk in candidates[start:start + batch_size]]
+            scores.extend(float(score) for score in model.predict(pairs, batch_size=batch_size, show_progress_bar=False))
+            
+            # Checked after predict: a late final batch must not count as on time
+            if time.perf_counter() > deadline:
+                self.timeouts += 1
+                logger.warning(f"Re-rank budget of {budget_ms:.0f} ms exceeded, keeping retrieval order")
+                return candidates[:top_k]
+        
+        order = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:top_k]
+        return [
+            {**candidates[i], 'retrieval_score': candidates[i]['score'], 'score': scores[i]}
+            for i in order
+        ]
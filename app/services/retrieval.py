@@ -1,20 +1,44 @@
-from typing import List, Dict
-from app.services.embeddings import EmbeddingService
-from app.services.llm import LLMService
+from typing import List, Dict, Optional, Tuple, AsyncIterator
+from app.services.embeddings import get_embedding_service
+from app.services.llm import LLMService, GENERATION_ERROR, GENERATION_TIMEOUT
+from app.services.cache import AnswerCache
+from app.services.reranker import Reranker
+from app.services.context import ContextBuilder
+from app.services.executor import thread_pool
 from app.db.vector_store import VectorStore
+from app.utils.metrics import timed
+from app.config import settings
 from loguru import logger
+import asyncio
+import numpy as np
 import time
 
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], top_k: int, k: int = None) -> List[Dict]:
+    """Merge ranked result lists by summing 1 / (k + rank); 'score' becomes the fused score"""
+    k = settings.RRF_K if k is None else k
+    fused: Dict[int, Dict] = {}
+    
+    for results in result_lists:
+        for rank, result in enumerate(results, 1):
+            entry = fused.setdefault(result['vector_id'], {**result, 'score': 0.0})
+            entry['score'] += 1 / (k + rank)
+    
+    return sorted(fused.values(), key=lambda result: result['score'], reverse=True)[:top_k]
+
 class RetrievalPipeline:
     """End-to-end RAG pipeline (100% FREE)"""
     
     def __init__(self):
-        self.embedding_service = EmbeddingService()
+        self.embedding_service = get_embedding_service()
         self.llm_service = LLMService()
+        self.answer_cache = AnswerCache()
+        self.reranker = Reranker()
         
-        # Initialize vector store with correct dimension
-        dimension = self.embedding_service.embedding_dimension
-        self.vector_store = VectorStore(dimension=dimension)
+        # Dimension is taken from the stored index or the first upload,
+        # so the embedding model is not loaded here
+        self.vector_store = VectorStore()
+        self.context_builder = ContextBuilder(self.embedding_service, self.vector_store)
         
         # Try to load existing index
         try:
@@ -23,31 +47,285 @@ class RetrievalPipeline:
         except:
             logger.info("No existing vector store found")
     
-    def query(self, query_text: str, top_k: int = 5) -> Dict:
+    def retrieve(self, query_text: str, query_embedding: np.ndarray, top_k: int = 5,
+                 filters: Optional[Dict] = None, rerank_budget_ms: Optional[float] = None) -> List[Dict]:
+        """Dense search, fused with BM25 keyword search when HYBRID_SEARCH is on
+        
+        Filters are resolved to chunk IDs once and pushed into both searches.
+        With HIERARCHICAL_SEARCH on a large corpus, both only search the
+        chunks of the HIERARCHICAL_PAPERS papers closest to the query.
+        With RERANK_ENABLED, RERANK_CANDIDATES hits are re-scored by the
+        cross-encoder within rerank_budget_ms (0 skips re-ranking).
+        """
+        return self.retrieve_batch([query_text], query_embedding.reshape(1, -1), top_k, filters, rerank_budget_ms)[0]
+    
+    def retrieve_batch(self, query_texts: List[str], query_embeddings: np.ndarray, top_k: int = 5,
+                       filters: Optional[Dict] = None, rerank_budget_ms: Optional[float] = None) -> List[List[Dict]]:
+        """retrieve() for many queries, with one matrix search for the dense side"""
+        ids = self.vector_store.select(filters)
+        if ids is not None and len(ids) == 0:
+            return [[] for _ in query_texts]
+        
+        rerank = settings.RERANK_ENABLED and rerank_budget_ms != 0
+        num_candidates = max(top_k, settings.RERANK_CANDIDATES) if rerank else top_k
+        dense_k = max(num_candidates, settings.DENSE_CANDIDATES) if settings.HYBRID_SEARCH else num_candidates
+        
+        if self._hierarchical():
+            # Each query searches its own papers' chunks
+            selections = self.vector_store.paper_candidates(
+                query_embeddings, settings.HIERARCHICAL_PAPERS, ids, settings.HIERARCHICAL_MAX_CHUNKS
+            )
+            dense = self.vector_store.search_selections(query_embeddings, dense_k, selections)
+        else:
+            selections = [ids] * len(query_texts)
+            dense = self.vector_store.search_batch(query_embeddings, top_k=dense_k, ids=ids)
+        
+        if not settings.HYBRID_SEARCH:
+            results = dense
+        else:
+            results = [
+                reciprocal_rank_fusion([
+                    dense_results,
+                    self.vector_store.lexical_search(
+                        query_text, top_k=max(num_candidates, settings.LEXICAL_CANDIDATES), ids=selection
+                    )
+                ], num_candidates)
+                for query_text, dense_results, selection in zip(query_texts, dense, selections)
+            ]
+        
+        if rerank:
+            with timed("rerank"):
+                results = [
+                    self.reranker.rerank(query_text, candidates, top_k, rerank_budget_ms)
+                    for query_text, candidates in zip(query_texts, results)
+                ]
+        return results
+    
+    def _hierarchical(self) -> bool:
+        """Whether the corpus is large enough for coarse-to-fine search"""
+        return settings.HIERARCHICAL_SEARCH and len(self.vector_store.paper_centroids) >= settings.HIERARCHICAL_MIN_PAPERS
+    
+    def assemble_context(self, query_text: str, query_embedding: np.ndarray,
+                         retrieved_chunks: List[Dict]) -> Tuple[List[Dict], int]:
+        """Token-budgeted context chunks for the LLM, and the resulting prompt's token count"""
+        with timed("context"):
+            context_chunks, _ = self.context_builder.build(query_embedding, retrieved_chunks)
+            prompt = self.llm_service.build_prompt(query_text, context_chunks)
+            return context_chunks, self.context_builder.token_counter.count(prompt)
+    
+    def query(self, query_text: str, top_k: int = 5, filters: Optional[Dict] = None,
+              rerank_budget_ms: Optional[float] = None) -> Dict:
         """Execute RAG query (FREE - no API costs)"""
         start_time = time.time()
+        store_version = self.vector_store.version
         
         try:
+            cached = self.answer_cache.get_exact(query_text, top_k, store_version, filters)
+            if cached is not None:
+                return self._cached_result(cached, start_time)
+            
             # 1. Generate query embedding (runs locally)
             logger.info("Generating query embedding...")
             query_embedding = self.embedding_service.generate_single_embedding(query_text)
             
-            # 2. Search vector store
+            # 2. Search vector store (dense + keyword)
             logger.info("Searching vector database...")
-            retrieved_chunks = self.vector_store.search(query_embedding, top_k=top_k)
+            retrieved_chunks = self.retrieve(query_text, query_embedding, top_k, filters, rerank_budget_ms)
             
-            # 3. Generate answer (runs locally with Ollama)
+            cached = self.answer_cache.get_semantic(query_embedding, retrieved_chunks)
+            if cached is not None:
+                return self._cached_result(cached, start_time)
+            
+            # 3. Fit the chunks into the prompt token budget
+            context_chunks, prompt_tokens = self.assemble_context(query_text, query_embedding, retrieved_chunks)
+            
+            # 4. Generate answer (runs locally with Ollama)
             logger.info("Generating answer with local LLM...")
-            answer = self.llm_service.generate_answer(query_text, retrieved_chunks)
+            answer = self.llm_service.generate_answer(query_text, context_chunks)
+            self._cache_answer(query_text, top_k, query_embedding, retrieved_chunks, answer, store_version, filters)
             
             processing_time = time.time() - start_time
             
             return {
                 'answer': answer,
                 'sources': retrieved_chunks,
-                'processing_time': processing_time
+                'processing_time': processing_time,
+                'cached': False,
+                'prompt_tokens': prompt_tokens
             }
+        
+        except Exception as e:
+            logger.error(f"Error in retrieval pipeline: {e}")
+            raise
+    
+    async def query_async(self, query_text: str, top_k: int = 5, filters: Optional[Dict] = None,
+                          rerank_budget_ms: Optional[float] = None) -> Dict:
+        """Execute RAG query without blocking the event loop"""
+        start_time = time.time()
+        store_version = self.vector_store.version
+        
+        try:
+            cached = self.answer_cache.get_exact(query_text, top_k, store_version, filters)
+            if cached is not None:
+                return self._cached_result(cached, start_time)
+            
+            # 1. Generate query embedding (shared encode call with other queries)
+            logger.info("Generating query embedding...")
+            query_embedding = await self.embedding_service.generate_single_embedding_async(query_text)
+            
+            # 2. Search vector store in a worker thread
+            logger.info("Searching vector database...")
+            retrieved_chunks = await thread_pool.run(
+                self.retrieve, query_text, query_embedding, top_k, filters, rerank_budget_ms
+            )
+            
+            cached = self.answer_cache.get_semantic(query_embedding, retrieved_chunks)
+            if cached is not None:
+                return self._cached_result(cached, start_time)
             
+            # 3. Fit the chunks into the prompt token budget
+            context_chunks, prompt_tokens = await thread_pool.run(
+                self.assemble_context, query_text, query_embedding, retrieved_chunks
+            )
+            
+            # 4. Generate answer over the async HTTP client
+            logger.info("Generating answer with local LLM...")
+            answer = await self.llm_service.generate_answer_async(query_text, context_chunks)
+            self._cache_answer(query_text, top_k, query_embedding, retrieved_chunks, answer, store_version, filters)
+            
+            return {
+                'answer': answer,
+                'sources': retrieved_chunks,
+                'processing_time': time.time() - start_time,
+                'cached': False,
+                'prompt_tokens': prompt_tokens
+            }
+        
         except Exception as e:
             logger.error(f"Error in retrieval pipeline: {e}")
-            raise
\ No newline at end of file
+            raise
+    
+    async def query_batch(self, query_texts: List[str], top_k: int = 5, filters: Optional[Dict] = None,
+                          generate: bool = True, rerank_budget_ms: Optional[float] = None) -> List[Dict]:
+        """Answer many queries: one encode call, one matrix search, bounded concurrent generation
+        
+        With generate=False only sources are returned ('answer' is None) and
+        the LLM is not called.
+        """
+        store_version = self.vector_store.version
+        results: List[Optional[Dict]] = [None] * len(query_texts)
+        
+        # Exact cache hits skip everything
+        pending = []
+        for i, query_text in enumerate(query_texts):
+            cached = self.answer_cache.get_exact(query_text, top_k, store_version, filters) if generate else None
+            if cached is not None:
+                results[i] = {**cached, 'cached': True, 'prompt_tokens': None}
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+        
+        # 1. Embed all remaining queries in one call
+        texts = [query_texts[i] for i in pending]
+        logger.info(f"Batch query: embedding {len(texts)} queries...")
+        embeddings = await thread_pool.run(self.embedding_service.generate_embeddings, texts, False)
+        
+        # 2. One matrix search (plus per-query BM25) in a worker thread
+        logger.info("Batch query: searching vector database...")
+        retrieved = await thread_pool.run(self.retrieve_batch, texts, embeddings, top_k, filters, rerank_budget_ms)
+        
+        to_generate = []
+        for i, query_embedding, retrieved_chunks in zip(pending, embeddings, retrieved):
+            cached = self.answer_cache.get_semantic(query_embedding, retrieved_chunks) if generate else None
+            if cached is not None:
+                results[i] = {**cached, 'cached': True, 'prompt_tokens': None}
+            else:
+                results[i] = {'answer': None, 'sources': retrieved_chunks, 'cached': False, 'prompt_tokens': None}
+                to_generate.append((i, query_embedding))
+        if not generate:
+            return results
+        
+        # 3. Generate answers, at most BATCH_MAX_CONCURRENT_GENERATIONS at a time
+        logger.info(f"Batch query: generating {len(to_generate)} answers...")
+        semaphore = asyncio.Semaphore(settings.BATCH_MAX_CONCURRENT_GENERATIONS)
+        
+        async def generate_one(i: int, query_embedding: np.ndarray):
+            async with semaphore:
+                try:
+                    context_chunks, results[i]['prompt_tokens'] = await thread_pool.run(
+                        self.assemble_context, query_texts[i], query_embedding, results[i]['sources']
+                    )
+                    answer = await self.llm_service.generate_answer_async(query_texts[i], context_chunks)
+                except Exception as e:
+                    logger.error(f"Batch query {i} failed: {e}")
+                    answer = GENERATION_ERROR
+            results[i]['answer'] = answer
+            self._cache_answer(query_texts[i], top_k, query_embedding, results[i]['sources'], answer,
+                               store_version, filters)
+        
+        await asyncio.gather(*(generate_one(i, query_embedding) for i, query_embedding in to_generate))
+        return results
+    
+    async def stream_query(self, query_text: str, top_k: int = 5, filters: Optional[Dict] = None,
+                           rerank_budget_ms: Optional[float] = None) -> AsyncIterator[Dict]:
+        """Execute RAG query, yielding the sources first and then answer tokens as they arrive"""
+        start_time = time.time()
+        store_version = self.vector_store.version
+        
+        cached = self.answer_cache.get_exact(query_text, top_k, store_version, filters)
+        if cached is None:
+            query_embedding = await self.embedding_service.generate_single_embedding_async(query_text)
+            retrieved_chunks = await thread_pool.run(
+                self.retrieve, query_text, query_embedding, top_k, filters, rerank_budget_ms
+            )
+            cached = self.answer_cache.get_semantic(query_embedding, retrieved_chunks)
+        
+        if cached is not None:
+            # Replay the stored answer as a single token
+            logger.info("Answer served from cache")
+            elapsed = time.time() - start_time
+            yield {'event': 'sources', 'sources': cached['sources']}
+            yield {'event': 'token', 'token': cached['answer']}
+            yield {'event': 'done', 'processing_time': elapsed, 'time_to_first_token': elapsed, 'cached': True}
+            return
+        
+        yield {'event': 'sources', 'sources': retrieved_chunks}
+        
+        context_chunks, prompt_tokens = await thread_pool.run(
+            self.assemble_context, query_text, query_embedding, retrieved_chunks
+        )
+        
+        time_to_first_token = None
+        tokens = []
+        async for token in self.llm_service.stream_answer(query_text, context_chunks):
+            if time_to_first_token is None:
+                time_to_first_token = time.time() - start_time
+            tokens.append(token)
+            yield {'event': 'token', 'token': token}
+        
+        self._cache_answer(query_text, top_k, query_embedding, retrieved_chunks, ''.join(tokens), store_version, filters)
+        
+        yield {
+            'event': 'done',
+            'processing_time': time.time() - start_time,
+            'time_to_first_token': time_to_first_token,
+            'cached': False,
+            'prompt_tokens': prompt_tokens
+        }
+    
+    def _cache_answer(self, query_text: str, top_k: int, query_embedding, retrieved_chunks: List[Dict],
+                      answer: str, store_version: int, filters: Optional[Dict] = None):
+        """Store a generated answer unless generation failed"""
+        if answer and answer not in (GENERATION_ERROR, GENERATION_TIMEOUT):
+            self.answer_cache.put(query_text, top_k, query_embedding, retrieved_chunks, answer, store_version, filters)
+    
+    def _cached_result(self, cached: Dict, start_time: float) -> Dict:
+        logger.info("Answer served from cache")
+        return {
+            'answer': cached['answer'],
+            'sources': cached['sources'],
+            'processing_time': time.time() - start_time,
+            'cached': True,
+            'prompt_tokens': None
+        }
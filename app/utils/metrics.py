@@ -0,0 +1,256 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from app.config import settings
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+QUANTILES = (0.5, 0.95, 0.99)
+STAGE_METRIC = "rag_stage_seconds"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Stage seconds of the request being handled (see `collect_stages`)
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_stages", default=None)
+
+
+class Histogram:
+    """Cumulative latency buckets plus a window of recent samples for quantiles
+    
+    `observe` is a bisect and a few increments under a lock; quantiles are
+    only computed when metrics are scraped, over the last METRICS_WINDOW
+    samples.
+    """
+    
+    def __init__(self, bounds: Tuple[float, ...] = LATENCY_BUCKETS, window: int = None):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent: List[float] = []
+        self._window = window or settings.METRICS_WINDOW
+        self._next = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.bounds, value)] += 1
+            self.count += 1
+            self.sum += value
+            if len(self._recent) < self._window:
+                self._recent.append(value)
+            else:
+                self._recent[self._next] = value
+                self._next = (self._next + 1) % self._window
+    
+    def quantiles(self, qs: Tuple[float, ...] = QUANTILES) -> Dict[float, float]:
+        """Nearest-rank quantiles of the recent samples (empty before the first one)"""
+        with self._lock:
+            recent = sorted(self._recent)
+        if not recent:
+            return {}
+        return {q: recent[min(len(recent) - 1, int(q * len(recent)))] for q in qs}
+    
+    def buckets(self) -> List[Tuple[float, int]]:
+        """(upper bound, cumulative count) pairs, ending with +Inf"""
+        with self._lock:
+            counts = list(self.counts)
+        cumulative, total = [], 0
+        for bound, count in zip(self.bounds + (float('inf'),), counts):
+            total += count
+            cumulative.append((bound, total))
+        return cumulative
+
+
+class Counter:
+    """Monotonic count, incremented in place"""
+    
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text exposition format
+    
+    Histograms and counters are updated in place by the code they measure.
+    Values that already live elsewhere (cache hit counters, index size,
+    queue depth) are registered as callbacks and read at scrape time, so
+    they cost nothing on the hot path.
+    """
+    
+    def __init__(self):
+        self._families: Dict[str, Tuple[str, str]] = {}  # name -> (type, help)
+        self._histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self._counters: Dict[str, Dict[Labels, Counter]] = {}
+        self._callbacks: Dict[str, Dict[Labels, Callable[[], float]]] = {}
+        self._lock = threading.Lock()
+    
+    def _declare(self, name: str, kind: str, help: str):
+        declared = self._families.setdefault(name, (kind, help))
+        if declared[0] != kind:
+            raise ValueError(f"Metric {name} is already registered as a {declared[0]}")
+    
+    def histogram(self, name: str, help: str, **labels: str) -> Histogram:
+        """The histogram with these labels, created on first use"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._declare(name, "histogram", help)
+            children = self._histograms.setdefault(name, {})
+            if key not in children:
+                children[key] = Histogram()
+            return children[key]
+    
+    def counter(self, name: str, help: str, **labels: str) -> Counter:
+        """The counter with these labels, created on first use"""
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._declare(name, "counter", help)
+            children = self._counters.setdefault(name, {})
+            if key not in children:
+                children[key] = Counter()
+            return children[key]
+    
+    def register(self, name: str, kind: str, help: str, func: Callable[[], float], **labels: str):
+        """Report func() as a gauge or counter sample at scrape time"""
+        with self._lock:
+            self._declare(name, kind, help)
+            self._callbacks.setdefault(name, {})[tuple(sorted(labels.items()))] = func
+    
+    def render(self) -> str:
+        """All metrics in the Prometheus text format (version 0.0.4)"""
+        with self._lock:
+            families = dict(self._families)
+            histograms = {name: dict(children) for name, children in self._histograms.items()}
+            counters = {name: dict(children) for name, children in self._counters.items()}
+            callbacks = {name: dict(children) for name, children in self._callbacks.items()}
+        
+        lines = []
+        for name, (kind, help) in sorted(families.items()):
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, histogram in sorted(histograms.get(name, {}).items()):
+                for bound, count in histogram.buckets():
+                    lines.append(_sample(f"{name}_bucket", labels + (('le', _format(bound)),), count))
+                lines.append(_sample(f"{name}_sum", labels, histogram.sum))
+                lines.append(_sample(f"{name}_count", labels, histogram.count))
+            for labels, counter in sorted(counters.get(name, {}).items()):
+                lines.append(_sample(name, labels, counter.value))
+            for labels, func in sorted(callbacks.get(name, {}).items()):
+                try:
+                    value = func()
+                except Exception:
+                    continue  # A failing source must not break the whole scrape
+                if value is not None:
+                    lines.append(_sample(name, labels, value))
+        
+        # Recent-window quantiles, as a separate gauge family (histogram families cannot carry them)
+        quantile_name = "rag_stage_seconds_quantile"
+        lines.append(f"# HELP {quantile_name} Stage latency quantiles over the last {settings.METRICS_WINDOW} samples")
+        lines.append(f"# TYPE {quantile_name} gauge")
+        for labels, histogram in sorted(histograms.get(STAGE_METRIC, {}).items()):
+            for q, value in histogram.quantiles().items():
+                lines.append(_sample(quantile_name, labels + (('quantile', _format(q)),), value))
+        return "\n".join(lines) + "\n"
+    
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """Per-stage count, mean and p50/p95/p99 in seconds"""
+        with self._lock:
+            stages = dict(self._histograms.get(STAGE_METRIC, {}))
+        summary = {}
+        for labels, histogram in sorted(stages.items()):
+            quantiles = histogram.quantiles()
+            summary[dict(labels)['stage']] = {
+                'count': histogram.count,
+                'mean': histogram.sum / histogram.count if histogram.count else 0.0,
+                **{f"p{round(q * 100)}": value for q, value in quantiles.items()}
+            }
+        return summary
+
+
+def _format(value: float) -> str:
+    return "+Inf" if value == float('inf') else repr(float(value))
+
+
+def _sample(name: str, labels: Labels, value: float) -> str:
+    if labels:
+        rendered = ",".join(f'{key}="{_escape(str(val))}"' for key, val in labels)
+        return f"{name}{{{rendered}}} {value}"
+    return f"{name} {value}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+registry = MetricsRegistry()
+
+_stage_histograms: Dict[str, Histogram] = {}
+
+
+def record_stage(name: str, seconds: float, observe: bool = True):
+    """Add a stage duration to its histogram and to the current request's breakdown
+    
+    observe=False only updates the breakdown, for time already observed
+    elsewhere (e.g. a shared embedding batch encoded in another thread).
+    """
+    if not settings.METRICS_ENABLED:
+        return
+    if observe:
+        histogram = _stage_histograms.get(name)
+        if histogram is None:
+            histogram = _stage_histograms[name] = registry.histogram(
+                STAGE_METRIC, "Seconds spent per pipeline stage", stage=name
+            )
+        histogram.observe(seconds)
+    stages = _request_stages.get()
+    if stages is not None:
+        stages[name] = stages.get(name, 0.0) + seconds
+
+
+class timed:
+    """Time a block as a pipeline stage: `with timed("vector_search"): ...`"""
+    
+    __slots__ = ("name", "_start")
+    
+    def __init__(self, name: str):
+        self.name = name
+    
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc_info):
+        record_stage(self.name, time.perf_counter() - self._start)
+        return False
+
+
+@contextmanager
+def collect_stages() -> Iterator[Dict[str, float]]:
+    """Collect the stage seconds recorded inside the block (and in pool threads it awaits)"""
+    stages: Dict[str, float] = {}
+    token = _request_stages.set(stages)
+    try:
+        yield stages
+    finally:
+        _request_stages.reset(token)
+
+
+def request_stages() -> Optional[Dict[str, float]]:
+    """The breakdown being collected for the current request, if any"""
+    return _request_stages.get()
+
+
+def count(name: str, help: str, amount: float = 1, **labels: str):
+    """Increment a counter (a dict lookup and an add)"""
+    if settings.METRICS_ENABLED:
+        registry.counter(name, help, **labels).inc(amount)
@@ -1,17 +1,68 @@
-from typing import List, Dict
+import bisect
+import re
+from typing import List, Dict, Tuple
 from app.config import settings
+from app.utils.metrics import timed
+from app.utils.tokens import TokenCounter
+
+# A line holding only a (optionally numbered) section heading
+SECTION_RE = re.compile(
+    r"^[ \t]*(?:(?:\d+(?:\.\d+)*\.?|[IVX]+\.)[ \t]+)?"
+    r"(abstract|introduction|background|related work|methods?|methodology|materials and methods|data|"
+    r"observations|results|discussion|conclusions?|summary|acknowledge?ments?|references|bibliography|"
+    r"appendix(?:[ \t]+[A-Z])?)[ \t]*:?[ \t]*$",
+    re.IGNORECASE | re.MULTILINE
+)
+NUMBERED_HEADING_RE = re.compile(r"^[ \t]*\d+(?:\.\d+)*\.?[ \t]+[A-Z][^\n.]{2,80}$", re.MULTILINE)
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])[\"”’)\]]?\s+(?=[A-Z0-9(\[“\"])")
+ABBREVIATION_RE = re.compile(r"\b(?:e\.g|i\.e|et al|cf|vs|approx|Fig|Figs|Eq|Eqs|Ref|Refs|Sec|Tab|No|Vol|pp)\.$")
+REFERENCE_ENTRY_RE = re.compile(r"^[ \t]*(?:\[\d+\]|\d+\.[ \t])", re.MULTILINE)
+PROSE_RE = re.compile(r"[A-Za-z]{3,}")  # Characters of ordinary words; equations have few
+WHITESPACE_RE = re.compile(r"\s+")
+HYPHENATION_RE = re.compile(r"(\w)-\n(\w)")
+
 
 class TextChunker:
-    """Split text into chunks for embedding"""
+    """Split text into chunks for embedding
+    
+    Two modes (CHUNK_MODE):
+    - "words": fixed windows of CHUNK_SIZE words per page, CHUNK_OVERLAP apart
+    - "tokens": sentence-aligned chunks of at most CHUNK_MAX_TOKENS embedding
+      tokens that never straddle a section heading but may span pages.
+      Equations stay attached to the sentence before them, the reference
+      list is split per entry, and chunks carry a page span and section.
+      Chunks are character-offset slices of the document text.
+    """
     
-    def __init__(self, chunk_size: int = None, chunk_overlap: int = None):
+    def __init__(self, chunk_size: int = None, chunk_overlap: int = None, mode: str = None,
+                 token_counter: TokenCounter = None):
         self.chunk_size = chunk_size or settings.CHUNK_SIZE
         self.chunk_overlap = chunk_overlap or settings.CHUNK_OVERLAP
+        self.mode = mode or settings.CHUNK_MODE
+        if self.mode not in ("words", "tokens"):
+            raise ValueError(f"Unknown chunk mode: {self.mode}")
+        self.max_tokens = settings.CHUNK_MAX_TOKENS - 2  # [CLS] and [SEP]
+        self.overlap_tokens = settings.CHUNK_OVERLAP_TOKENS
+        self._token_counter = token_counter
+    
+    @property
+    def token_counter(self) -> TokenCounter:
+        """Counts tokens with the embedding model's tokenizer"""
+        if self._token_counter is None:
+            self._token_counter = TokenCounter(settings.EMBEDDING_MODEL)
+        return self._token_counter
     
     def chunk_text(self, pages_data: List[Dict]) -> List[Dict]:
         """
         Split text into overlapping chunks while preserving page info
         """
+        with timed("chunk"):
+            if self.mode == "tokens":
+                return self.chunk_by_tokens(pages_data)
+            return self.chunk_by_words(pages_data)
+    
+    def chunk_by_words(self, pages_data: List[Dict]) -> List[Dict]:
+        """Fixed windows of chunk_size words per page"""
         chunks = []
         
         for page_info in pages_data:
@@ -34,7 +85,128 @@ class TextChunker:
         
         return chunks
     
+    def chunk_by_tokens(self, pages_data: List[Dict]) -> List[Dict]:
+        """Sentence- and section-aware chunks sized for the embedding model"""
+        document = "\n".join(page['text'] for page in pages_data)
+        page_starts = []
+        offset = 0
+        for page in pages_data:
+            page_starts.append(offset)
+            offset += len(page['text']) + 1
+        page_numbers = [page['page'] for page in pages_data]
+        
+        chunks = []
+        for start, end, section in self._sections(document):
+            if section == "references" and settings.CHUNK_SKIP_REFERENCES:
+                continue
+            units = self._units(document, start, end, section)
+            if not units:
+                continue
+            counts = self.token_counter.count_batch([document[s:e] for s, e in units])
+            for chunk_start, chunk_end in self._pack(document, units, counts):
+                text = self.clean_text(HYPHENATION_RE.sub(r"\1\2", document[chunk_start:chunk_end]))
+                if len(text) > 50:  # Minimum chunk size
+                    chunks.append({
+                        'text': text,
+                        'page': page_numbers[bisect.bisect_right(page_starts, chunk_start) - 1],
+                        'page_end': page_numbers[bisect.bisect_right(page_starts, chunk_end - 1) - 1],
+                        'section': section,
+                        'chunk_id': len(chunks)
+                    })
+        
+        return chunks
+    
+    @staticmethod
+    def _sections(document: str) -> List[Tuple[int, int, str]]:
+        """(start, end, name) spans between heading lines"""
+        headings = {m.start(): "body" for m in NUMBERED_HEADING_RE.finditer(document)}
+        headings.update({m.start(): ' '.join(m.group(1).lower().split()) for m in SECTION_RE.finditer(document)})
+        names = {"bibliography": "references"}
+        
+        starts = sorted(headings)
+        if not starts or starts[0] > 0:
+            starts.insert(0, 0)
+        sections = []
+        for i, start in enumerate(starts):
+            end = starts[i + 1] if i + 1 < len(starts) else len(document)
+            name = headings.get(start, "body")
+            sections.append((start, end, names.get(name, name)))
+        
+        # Fold title lines and repeated running headings into the section after them
+        merged = []
+        for start, end, name in sections:
+            if merged and len(document[merged[-1][0]:merged[-1][1]].strip()) < 100:
+                start = merged.pop()[0]
+            merged.append((start, end, name))
+        return merged
+    
+    @staticmethod
+    def _units(document: str, start: int, end: int, section: str) -> List[Tuple[int, int]]:
+        """Sentence (or reference entry) spans; math-only spans join the sentence before"""
+        if section == "references":
+            cuts = [m.start() for m in REFERENCE_ENTRY_RE.finditer(document, start, end)]
+        else:
+            cuts = [
+                m.end() for m in SENTENCE_END_RE.finditer(document, start, end)
+                if not ABBREVIATION_RE.search(document, max(start, m.start() - 8), m.start())
+            ]
+        
+        units = []
+        previous = start
+        for cut in cuts + [end]:
+            if cut <= previous:
+                continue
+            span = document[previous:cut]
+            if not span.strip():
+                previous = cut
+                continue
+            prose = len(span) - len(PROSE_RE.sub('', span))
+            if units and section != "references" and prose < 0.4 * len(span.strip()):
+                units[-1] = (units[-1][0], cut)
+            else:
+                units.append((previous, cut))
+            previous = cut
+        return units
+    
+    def _pack(self, document: str, units: List[Tuple[int, int]], counts: List[int]) -> List[Tuple[int, int]]:
+        """Greedily group consecutive units into spans of at most max_tokens, with sentence overlap"""
+        pieces = []
+        for (start, end), count in zip(units, counts):
+            if count <= self.max_tokens:
+                pieces.append((start, end, count))
+                continue
+            
+            # Over-long unit: cut at whitespace into roughly max_tokens pieces
+            length = end - start
+            step = max(1, int(length * self.max_tokens / count * 0.95))
+            while start < end:
+                cut = min(end, start + step)
+                if cut < end:
+                    window = start + step // 2
+                    space = max(document.rfind(" ", window, cut), document.rfind("\n", window, cut))
+                    cut = space + 1 if space > 0 else cut
+                pieces.append((start, cut, max(1, count * (cut - start) // length)))
+                start = cut
+        
+        spans = []
+        first = 0
+        while first < len(pieces):
+            last, total = first, pieces[first][2]
+            while last + 1 < len(pieces) and total + pieces[last + 1][2] <= self.max_tokens:
+                last += 1
+                total += pieces[last][2]
+            spans.append((pieces[first][0], pieces[last][1]))
+            if last + 1 >= len(pieces):
+                break
+            
+            # Next chunk repeats the trailing sentences that fit in the overlap
+            next_first, overlap = last + 1, 0
+            while next_first - 1 > first and overlap + pieces[next_first - 1][2] <= self.overlap_tokens:
+                next_first -= 1
+                overlap += pieces[next_first][2]
+            first = next_first
+        return spans
+    
     def clean_text(self, text: str) -> str:
         """Basic text cleaning"""
-        text = ' '.join(text.split())
-        return text
\ No newline at end of file
+        return WHITESPACE_RE.sub(' ', text).strip()
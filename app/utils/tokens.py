@@ -0,0 +1,50 @@
+import threading
+from typing import List
+from app.config import settings
+from loguru import logger
+
+# Typical for English prose with subword tokenizers (Llama, Mistral, GPT-style BPE)
+CHARS_PER_TOKEN = 4.0
+
+
+class TokenCounter:
+    """Count tokens with a HuggingFace tokenizer, or estimate them from length
+    
+    The tokenizer is loaded on first use. Without one (tokenizer_name empty,
+    or `transformers` not installed), counts are estimated as
+    len(text) / CHARS_PER_TOKEN.
+    """
+    
+    def __init__(self, tokenizer_name: str = None):
+        self.tokenizer_name = settings.LLM_TOKENIZER if tokenizer_name is None else tokenizer_name
+        self._tokenizer = None
+        self._loaded = False
+        self._load_lock = threading.Lock()
+    
+    @property
+    def tokenizer(self):
+        """The HuggingFace tokenizer, or None when estimating"""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    if self.tokenizer_name:
+                        try:
+                            from transformers import AutoTokenizer
+                            
+                            self._tokenizer = AutoTokenizer.from_pretrained(self.tokenizer_name)
+                            logger.info(f"Loaded tokenizer: {self.tokenizer_name}")
+                        except Exception as e:
+                            logger.warning(f"Cannot load tokenizer {self.tokenizer_name} ({e}), estimating token counts")
+                    self._loaded = True
+        return self._tokenizer
+    
+    def count(self, text: str) -> int:
+        return self.count_batch([text])[0]
+    
+    def count_batch(self, texts: List[str]) -> List[int]:
+        if not texts:
+            return []
+        tokenizer = self.tokenizer
+        if tokenizer is None:
+            return [int(len(text) / CHARS_PER_TOKEN + 0.5) for text in texts]
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)['input_ids']]
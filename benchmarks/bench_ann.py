@@ -0,0 +1,91 @@
+"""ANN benchmark: recall@k and query latency of each index tier against exact flat search.
+
+Run with:  python -m benchmarks.bench_ann --vectors 200000
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from app.config import settings
+from app.db.vector_store import INDEX_TYPES, build_index, ivf_nlist
+
+
+def synthetic_embeddings(num_vectors: int, dimension: int, rng) -> np.ndarray:
+    """Clustered, L2-normalized vectors resembling sentence embeddings"""
+    centers = rng.standard_normal((max(1, num_vectors // 500), dimension)).astype(np.float32)
+    labels = rng.integers(0, len(centers), num_vectors)
+    vectors = centers[labels] + 0.6 * rng.standard_normal((num_vectors, dimension)).astype(np.float32)
+    faiss.normalize_L2(vectors)
+    return vectors
+
+
+def timed_search(index, queries: np.ndarray, top_k: int):
+    latencies = []
+    results = []
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query.reshape(1, -1), top_k)
+        latencies.append(time.perf_counter() - start)
+        results.append(ids[0])
+    return np.array(results), np.array(latencies) * 1000
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--tiers", nargs="+", default=list(INDEX_TYPES))
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[settings.IVF_NPROBE])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[settings.HNSW_EF_SEARCH])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic_embeddings(args.vectors, args.dimension, rng)
+    queries = synthetic_embeddings(args.queries, args.dimension, rng)
+    ids = np.arange(args.vectors, dtype=np.int64)
+
+    truth = None
+    print(f"vectors={args.vectors} dim={args.dimension} queries={args.queries} k={args.top_k}")
+    print(f"{'tier':<10}{'param':>12}{'build s':>10}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}")
+
+    for tier in ["flat"] + [t for t in args.tiers if t != "flat"]:
+        start = time.perf_counter()
+        index = build_index(tier, args.dimension, args.vectors)
+        if not index.is_trained:
+            sample_size = min(args.vectors, max(settings.ANN_TRAIN_SAMPLE, 50 * ivf_nlist(args.vectors)))
+            index.train(vectors[rng.choice(args.vectors, sample_size, replace=False)])
+        index.add_with_ids(vectors, ids)
+        build_time = time.perf_counter() - start
+
+        if tier.startswith("ivf"):
+            sweep = [("nprobe", value) for value in args.nprobe]
+        elif tier == "hnsw":
+            sweep = [("efSearch", value) for value in args.ef_search]
+        else:
+            sweep = [(None, None)]
+
+        for name, value in sweep:
+            if name is not None:
+                faiss.ParameterSpace().set_index_parameter(index, name, value)
+            found, latencies = timed_search(index, queries, args.top_k)
+            if truth is None:
+                truth = found
+            recall = recall_at_k(found, truth)
+            param = f"{name}={value}" if name else "-"
+            print(
+                f"{tier:<10}{param:>12}{build_time:>10.1f}{recall:>10.3f}"
+                f"{np.percentile(latencies, 50):>10.3f}{np.percentile(latencies, 99):>10.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
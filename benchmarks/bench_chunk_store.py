@@ -0,0 +1,90 @@
+"""Chunk metadata benchmark: startup time and RSS of pickled metadata vs the mmap'd ChunkStore.
+
+Each corpus size is written in both formats, then loaded in a fresh process
+that also fetches the text of 5 random chunks (one top-k result).
+
+Run with:  python -m benchmarks.bench_chunk_store --sizes 10000 100000 500000
+"""
+import argparse
+import json
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.db.chunk_store import ChunkStore
+
+TEXT = "The observed rotation curves of spiral galaxies remain flat at large radii. " * 13
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * 4096 / 2**20
+
+
+def child(kind: str, path: str):
+    """Load one format and fetch 5 chunks; prints a JSON result line"""
+    base_rss = rss_mb()
+    start = time.perf_counter()
+
+    if kind == "pickle":
+        with open(Path(path) / "metadata.pkl", 'rb') as f:
+            chunks = pickle.load(f)['chunks']
+        load_ms = (time.perf_counter() - start) * 1000
+        ids = np.random.default_rng(0).choice(len(chunks), 5, replace=False)
+        texts = [chunks[int(i)].copy()['text'] for i in ids]
+    else:
+        store = ChunkStore(Path(path) / "chunks")
+        load_ms = (time.perf_counter() - start) * 1000
+        ids = np.random.default_rng(0).choice(len(store), 5, replace=False)
+        texts = [store.get(int(i))['text'] for i in ids]
+
+    total_ms = (time.perf_counter() - start) * 1000
+    assert all(texts)
+    print(json.dumps({'load_ms': load_ms, 'total_ms': total_ms, 'rss_mb': rss_mb() - base_rss}))
+
+
+def measure(kind: str, path: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_chunk_store", "--child", kind, path],
+        check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run(sizes):
+    print(f"{'chunks':>9} {'format':>7} {'load ms':>9} {'load+top5 ms':>13} {'RSS MB':>8}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            metadata = [
+                {'text': f"{i} {TEXT}", 'page': i % 20, 'paper_id': f"paper{i // 40:06d}", 'filename': f"{i // 40}.pdf"}
+                for i in range(size)
+            ]
+            with open(Path(tmp) / "metadata.pkl", 'wb') as f:
+                pickle.dump({'chunks': dict(enumerate(metadata))}, f)
+            ChunkStore(Path(tmp) / "chunks").append(metadata)
+            del metadata
+
+            for kind in ("pickle", "mmap"):
+                result = measure(kind, tmp)
+                print(f"{size:>9} {kind:>7} {result['load_ms']:>9.1f} {result['total_ms']:>13.1f} {result['rss_mb']:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 500_000])
+    parser.add_argument("--child", nargs=2, metavar=("KIND", "PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(*args.child)
+    else:
+        run(args.sizes)
+
+
+if __name__ == "__main__":
+    main()
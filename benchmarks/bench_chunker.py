@@ -0,0 +1,65 @@
+"""Chunker benchmark: words vs tokens mode throughput and embedded-token coverage.
+
+Extracts the PDFs in a directory once (default: the sample papers in
+data/uploads), then times TextChunker on the extracted pages. Coverage is
+the share of each chunk's tokens inside the embedding model's
+CHUNK_MAX_TOKENS window; the rest is truncated by the encoder and never
+embedded. It needs the embedding model's tokenizer: without it (no
+`transformers`, or the model cannot be fetched) token counts are the same
+chars/4 estimate the chunker packs by, so coverage is not reported.
+
+Run with:  python -m benchmarks.bench_chunker --pdfs data/uploads --repeat 20
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+from app.services.pdf_processor import PDFProcessor
+from app.utils.text_processing import TextChunker
+from app.utils.tokens import TokenCounter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pdfs", type=Path, default=Path("data/uploads"))
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    processor = PDFProcessor()
+    documents = [processor.extract_text(path)['pages'] for path in sorted(args.pdfs.glob("*.pdf"))]
+    pages = sum(len(document) for document in documents)
+    megabytes = sum(len(page['text']) for document in documents for page in document) / 1e6
+    token_counter = TokenCounter(settings.EMBEDDING_MODEL)
+    window = settings.CHUNK_MAX_TOKENS - 2  # [CLS] and [SEP]
+    measured = token_counter.tokenizer is not None
+    print(f"papers={len(documents)} pages={pages} text={megabytes:.2f} MB repeat={args.repeat} "
+          f"window={window} tokens")
+    if not measured:
+        print(f"Tokenizer {settings.EMBEDDING_MODEL} unavailable: token counts are estimated, "
+              "embedded coverage is not measured")
+
+    print(f"{'mode':<8}{'pages/s':>10}{'MB/s':>8}{'chunks':>8}{'p50 tok':>9}{'max tok':>9}"
+          f"{'embedded':>10}{'multi-page':>12}")
+    for mode in ("words", "tokens"):
+        chunker = TextChunker(mode=mode, token_counter=token_counter)
+        chunks = [chunk for document in documents for chunk in chunker.chunk_text(document)]
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            for document in documents:
+                chunker.chunk_text(document)
+        elapsed = time.perf_counter() - start
+
+        counts = np.array(token_counter.count_batch([chunk['text'] for chunk in chunks]))
+        embedded = np.minimum(counts, window).sum() / counts.sum()
+        multi_page = np.mean([chunk.get('page_end', chunk['page']) != chunk['page'] for chunk in chunks])
+        print(f"{mode:<8}{pages * args.repeat / elapsed:>10.0f}{megabytes * args.repeat / elapsed:>8.2f}"
+              f"{len(chunks):>8}{np.percentile(counts, 50):>9.0f}{counts.max():>9}"
+              f"{f'{embedded:.1%}' if measured else 'n/a':>10}{multi_page:>12.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,371 @@
+"""End-to-end benchmark: throughput, p50/p99 latency and peak RSS of every pipeline stage.
+
+Stages: PDF extraction (PDFProcessor), chunking (TextChunker), embedding
+(EmbeddingService), vector store add/search/save/load, and the full
+RetrievalPipeline.query against a local fake Ollama with per-token latency.
+
+Runs offline on a CPU-only machine: the corpus is synthetic astrophysics-like
+papers (benchmarks/synthetic.py), rendered to PDFs for the extraction and
+chunking stages. `--embedder auto` uses the configured embedding model when
+it can be loaded and the hashing embedder otherwise; the choice is part of
+the recorded configuration.
+
+Every metric is the best of --rounds repeated runs. Results are written as
+JSON (--output) and compared with the entry for the same configuration in
+--baseline; the run exits with status 1 if any stage got slower or bigger
+than the tolerances allow. The CPU model and core count are part of the
+baseline key: on a machine without its own baseline the comparison is
+skipped with a warning (record one with --save-baseline), and re-record
+after an intended change.
+
+Run with:  python -m benchmarks.bench_e2e                        (1k chunks)
+           python -m benchmarks.bench_e2e --chunks 100000
+           python -m benchmarks.bench_e2e --chunks 1000000 --embedder hash
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from loguru import logger
+
+from app.config import settings
+from app.db.vector_store import VectorStore
+from app.services.embeddings import get_embedding_service
+from app.services.pdf_processor import PDFProcessor
+from app.utils.metrics import collect_stages
+from app.utils.text_processing import TextChunker
+from benchmarks.fake_ollama import start_fake_ollama
+from benchmarks.synthetic import HashingEmbedder, corpus_chunks, generate_paper, paper_pages, questions, write_pdf
+
+DEFAULT_BASELINE = Path(__file__).parent / "baseline.json"
+
+# Metrics compared against the baseline, and whether higher is better
+COMPARED = {'per_second': True, 'p50_ms': False, 'p99_ms': False, 'peak_rss_mb': False}
+
+
+def reset_peak_rss():
+    """Restart peak RSS tracking (Linux); elsewhere peaks are for the whole run"""
+    try:
+        Path("/proc/self/clear_refs").write_text("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb() -> float:
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(results: Dict, name: str, unit: str, func: Callable[[], Tuple[List[float], int]]):
+    """Run one stage: func returns per-operation latencies and the number of items processed"""
+    reset_peak_rss()
+    start = time.perf_counter()
+    latencies, items = func()
+    seconds = time.perf_counter() - start
+    ms = np.array(latencies) * 1000
+    results['stages'][name] = {
+        'unit': unit,
+        'items': items,
+        'seconds': round(seconds, 4),
+        'per_second': round(items / seconds, 2),
+        'p50_ms': round(float(np.percentile(ms, 50)), 3),
+        'p99_ms': round(float(np.percentile(ms, 99)), 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1)
+    }
+    stage = results['stages'][name]
+    print(f"{name:<14} {stage['per_second']:>12,.1f} {unit}/s   p50 {stage['p50_ms']:>9.2f} ms   "
+          f"p99 {stage['p99_ms']:>9.2f} ms   peak RSS {stage['peak_rss_mb']:>8.1f} MB")
+
+
+def timed_calls(func: Callable, items: List) -> Tuple[List[float], List]:
+    latencies, outputs = [], []
+    for item in items:
+        start = time.perf_counter()
+        outputs.append(func(item))
+        latencies.append(time.perf_counter() - start)
+    return latencies, outputs
+
+
+def select_embedder(choice: str) -> str:
+    """Put the chosen model in the shared embedding service; returns its label"""
+    service = get_embedding_service()
+    if choice in ("auto", "model"):
+        try:
+            service.model
+            return f"{service.model_name} ({service.backend_label})"
+        except Exception as e:
+            if choice == "model":
+                raise
+            print(f"Embedding model unavailable ({type(e).__name__}); using the hashing embedder")
+    service._model = HashingEmbedder()
+    return HashingEmbedder.name
+
+
+def cpu_model() -> str:
+    """CPU model name (/proc/cpuinfo on Linux), else what platform reports"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def run(args, tmp: Path) -> Dict:
+    rng = np.random.default_rng(args.seed)
+    embedder = select_embedder(args.embedder)
+    config = {
+        'chunks': args.chunks, 'pdfs': args.pdfs, 'queries': args.queries, 'embedder': embedder,
+        'index_type': settings.INDEX_TYPE, 'storage': settings.VECTOR_STORAGE, 'chunk_mode': settings.CHUNK_MODE,
+        'hybrid_search': settings.HYBRID_SEARCH, 'token_ms': args.token_ms, 'tokens': args.tokens
+    }
+    machine = {'cpu': cpu_model(), 'cores': os.cpu_count(), 'python': platform.python_version(),
+               'platform': platform.platform(), 'processor': platform.processor() or platform.machine()}
+    results = {
+        'key': " ".join(f"{key}={value}" for key, value in config.items()) + f" cpu={machine['cpu']} cores={machine['cores']}",
+        'config': config,
+        'machine': machine,
+        'created_at': time.strftime("%Y-%m-%dT%H:%M:%S"),
+        'stages': {}
+    }
+    print(f"Configuration: {results['key']}")
+
+    # PDF extraction and chunking over generated papers
+    pdf_dir = tmp / "pdfs"
+    pdf_dir.mkdir()
+    pdf_paths = []
+    for index in range(args.pdfs):
+        paper = generate_paper(rng, index)
+        pdf_paths.append(pdf_dir / paper['filename'])
+        write_pdf(pdf_paths[-1], paper_pages(paper))
+
+    processor = PDFProcessor()
+    documents = []
+
+    def extract():
+        latencies, outputs = timed_calls(processor.extract_text, pdf_paths)
+        documents.extend(outputs)
+        return latencies, sum(document['num_pages'] for document in outputs)
+
+    measure(results, "pdf_extract", "pages", extract)
+
+    chunker = TextChunker()
+    num_chunks = []
+
+    def chunk():
+        latencies, outputs = timed_calls(lambda document: chunker.chunk_text(document['pages']), documents)
+        num_chunks.extend(len(chunks) for chunks in outputs)
+        return latencies, sum(document['num_pages'] for document in documents)
+
+    measure(results, "chunk", "pages", chunk)
+    results['stages']['chunk']['chunks_per_paper'] = round(float(np.mean(num_chunks)), 1)
+
+    # Embedding, in upload-sized batches and as single queries
+    chunks = corpus_chunks(args.chunks, rng)
+    texts = [chunk['text'] for chunk in chunks]
+    query_texts = questions(args.queries, rng)
+    service = get_embedding_service()
+    batches = [texts[start:start + settings.INGEST_EMBED_BATCH]
+               for start in range(0, len(texts), settings.INGEST_EMBED_BATCH)]
+    embedded = []
+
+    def embed():
+        latencies, outputs = timed_calls(lambda batch: service.generate_embeddings(batch, show_progress_bar=False), batches)
+        embedded.extend(outputs)
+        return latencies, len(texts)
+
+    measure(results, "embed", "chunks", embed)
+    embeddings = np.vstack(embedded)
+    del embedded
+    query_embeddings = []
+
+    def embed_query():
+        latencies, outputs = timed_calls(service.generate_single_embedding, query_texts)
+        query_embeddings.extend(outputs)
+        return latencies, len(query_texts)
+
+    measure(results, "embed_query", "queries", embed_query)
+
+    # Vector store: build (including any ANN index), search, save, load
+    index_path = tmp / "index"
+    store = VectorStore(path=index_path)
+
+    def build():
+        latencies = []
+        for start in range(0, len(chunks), settings.INGEST_COMMIT_BATCH):
+            end = start + settings.INGEST_COMMIT_BATCH
+            begin = time.perf_counter()
+            store.add(embeddings[start:end], chunks[start:end])
+            latencies.append(time.perf_counter() - begin)
+        store.wait_for_ann()
+        return latencies, len(chunks)
+
+    measure(results, "index_build", "chunks", build)
+    results['stages']['index_build']['ann_type'] = store.ann_type
+    measure(results, "search", "queries",
+            lambda: (timed_calls(lambda embedding: store.search(embedding, top_k=5), query_embeddings)[0], len(query_texts)))
+
+    def save():
+        start = time.perf_counter()
+        store.save()
+        return [time.perf_counter() - start], len(chunks)
+
+    measure(results, "save", "chunks", save)
+    del store, embeddings
+
+    def load():
+        start = time.perf_counter()
+        loaded = VectorStore(path=index_path)
+        loaded.load()
+        loaded.wait_for_ann()
+        return [time.perf_counter() - start], len(chunks)
+
+    measure(results, "load", "chunks", load)
+
+    # Full query path against the fake Ollama
+    server, base_url = start_fake_ollama(prompt_ms=args.prompt_ms, token_ms=args.token_ms, num_tokens=args.tokens)
+    settings.OLLAMA_BASE_URL = base_url
+    settings.OLLAMA_BASE_URLS = []
+    settings.FAISS_INDEX_PATH = index_path
+    settings.ANSWER_CACHE_ENABLED = False
+    try:
+        from app.services.retrieval import RetrievalPipeline
+        pipeline = RetrievalPipeline()
+        pipeline.vector_store.wait_for_ann()
+        breakdowns = []
+
+        def query(text: str):
+            with collect_stages() as stages:
+                result = pipeline.query(text, top_k=5)
+            breakdowns.append(stages)
+            return result
+
+        measure(results, "query", "queries", lambda: (timed_calls(query, query_texts)[0], len(query_texts)))
+        results['stages']['query']['stage_mean_ms'] = {
+            name: round(float(np.mean([stages.get(name, 0.0) for stages in breakdowns])) * 1000, 3)
+            for name in sorted({name for stages in breakdowns for name in stages})
+        }
+    finally:
+        server.shutdown()
+
+    results['peak_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float, tail_tolerance: float, rss_tolerance: float,
+            min_ms: float) -> List[str]:
+    """Metrics worse than the baseline beyond tolerance, as readable lines"""
+    regressions = []
+    for name, stage in results['stages'].items():
+        base = baseline['stages'].get(name)
+        if base is None:
+            continue
+        for metric, higher_is_better in COMPARED.items():
+            old, new = base.get(metric), stage.get(metric)
+            if old is None or new is None:
+                continue
+            if higher_is_better:
+                worse = new < old * (1 - tolerance)
+            elif metric == 'peak_rss_mb':
+                worse = new > old * (1 + rss_tolerance)
+            else:
+                # Sub-millisecond differences are timer noise
+                allowed = tail_tolerance if metric == 'p99_ms' else tolerance
+                worse = new > old * (1 + allowed) and new - old > min_ms
+            if worse:
+                change = (new - old) / old * 100 if old else float('inf')
+                regressions.append(f"{name}.{metric}: {old:g} -> {new:g} ({change:+.0f}%)")
+    return regressions
+
+
+def best_of(rounds: List[Dict]) -> Dict:
+    """Per stage, the best value of each compared metric over repeated rounds (filters out machine noise)"""
+    results = rounds[0]
+    for name, stage in results['stages'].items():
+        for metric, higher_is_better in COMPARED.items():
+            values = [other['stages'][name][metric] for other in rounds]
+            stage[metric] = max(values) if higher_is_better else min(values)
+    results['rounds'] = len(rounds)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=1000, help="Chunks in the indexed corpus")
+    parser.add_argument("--pdfs", type=int, default=20, help="Generated PDFs for extraction and chunking")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--embedder", choices=["auto", "model", "hash"], default="auto")
+    parser.add_argument("--prompt-ms", type=float, default=20.0, help="Fake Ollama prompt evaluation time")
+    parser.add_argument("--token-ms", type=float, default=2.0, help="Fake Ollama time per generated token")
+    parser.add_argument("--tokens", type=int, default=20, help="Tokens per fake answer")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rounds", type=int, default=3, help="Repeat the run and keep each metric's best value")
+    parser.add_argument("--output", type=Path, help="Write the results JSON here")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="Allowed throughput/p50 regression")
+    parser.add_argument("--tail-tolerance", type=float, default=0.6, help="Allowed p99 regression")
+    parser.add_argument("--rss-tolerance", type=float, default=0.2, help="Allowed peak RSS growth")
+    parser.add_argument("--min-ms", type=float, default=1.0, help="Ignore latency increases smaller than this")
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    rounds = []
+    for number in range(1, args.rounds + 1):
+        print(f"Round {number}/{args.rounds}")
+        with tempfile.TemporaryDirectory() as tmp:
+            rounds.append(run(args, Path(tmp)))
+    results = best_of(rounds)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Results written to {args.output}")
+
+    baselines = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        baselines[results['key']] = results
+        args.baseline.write_text(json.dumps(baselines, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    baseline = baselines.get(results['key'])
+    if baseline is None:
+        # Timings from another machine would read as regressions (or hide them)
+        others = [other['machine'] for other in baselines.values() if other['config'] == results['config']]
+        where = f"this machine ({results['machine']['cpu']}, {results['machine']['cores']} cores)"
+        if others:
+            recorded = "; ".join(f"{other.get('cpu', other['processor'])}, {other.get('cores', '?')} cores" for other in others)
+            print(f"WARNING: the baselines for this configuration were recorded on other machines ({recorded}), "
+                  f"not {where}; skipping the comparison. Record one with --save-baseline")
+        else:
+            print(f"WARNING: no baseline for this configuration on {where} in {args.baseline}; "
+                  "record one with --save-baseline")
+        return
+    regressions = compare(results, baseline, args.tolerance, args.tail_tolerance, args.rss_tolerance, args.min_ms)
+    if regressions:
+        print(f"REGRESSION against the baseline of {baseline['created_at']}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"OK: no regression against the baseline of {baseline['created_at']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Embedding backends: throughput and agreement with full-precision PyTorch.
+
+Chunks the PDFs in a directory (default: the sample papers in data/uploads)
+and embeds the chunks with each backend. Reports sentences/sec and the
+cosine similarity of each vector to the torch fp32 reference, plus how
+often the top-10 neighbours of held-out chunks stay the same.
+
+Run with:  python -m benchmarks.bench_embedding_backends --pdfs data/uploads --threads 4
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+from app.services.embeddings import EmbeddingService
+from app.services.pdf_processor import PDFProcessor
+from app.utils.text_processing import TextChunker
+
+BACKENDS = [("torch", False), ("torch", True), ("onnx", False), ("onnx", True)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pdfs", type=Path, default=Path("data/uploads"))
+    parser.add_argument("--threads", type=int, default=settings.EMBEDDING_THREADS)
+    parser.add_argument("--batch-size", type=int, default=settings.EMBEDDING_BATCH_SIZE)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    settings.EMBEDDING_THREADS = args.threads
+    settings.EMBEDDING_BATCH_SIZE = args.batch_size
+
+    processor, chunker = PDFProcessor(), TextChunker()
+    texts = [
+        chunk['text'] for path in sorted(args.pdfs.glob("*.pdf"))
+        for chunk in chunker.chunk_text(processor.extract_text(path)['pages'])
+    ]
+    queries = np.random.default_rng(0).choice(len(texts), min(50, len(texts)), replace=False)
+    print(f"texts={len(texts)} threads={args.threads or 'default'} batch={args.batch_size}")
+
+    reference = None
+    print(f"{'backend':<12}{'load s':>8}{'texts/s':>10}{'cos mean':>10}{'cos min':>10}{'top10 overlap':>15}")
+    for backend, quantize in BACKENDS:
+        service = EmbeddingService(backend=backend, quantize=quantize)
+        start = time.perf_counter()
+        service.generate_embeddings(["warm up"], show_progress_bar=False)
+        load = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            embeddings = service.generate_embeddings(texts, show_progress_bar=False)
+        rate = len(texts) * args.repeat / (time.perf_counter() - start)
+
+        if reference is None:
+            reference = embeddings
+        cosines = (embeddings * reference).sum(axis=1)
+        overlaps = []
+        for i in queries:
+            expected = set(np.argsort(-(reference @ reference[i]))[1:11])
+            actual = set(np.argsort(-(embeddings @ embeddings[i]))[1:11])
+            overlaps.append(len(expected & actual) / 10)
+        print(f"{service.backend_label:<12}{load:>8.1f}{rate:>10.1f}{cosines.mean():>10.4f}"
+              f"{cosines.min():>10.4f}{np.mean(overlaps):>15.1%}")
+
+
+if __name__ == "__main__":
+    main()
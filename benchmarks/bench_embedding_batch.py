@@ -0,0 +1,63 @@
+"""Query-embedding throughput: one encode per query vs. the async micro-batcher.
+
+Run with:  python -m benchmarks.bench_embedding_batch --clients 32 --queries 512
+"""
+import argparse
+import asyncio
+import time
+
+from app.services.embeddings import EmbeddingBatcher, get_embedding_service
+
+QUESTIONS = [
+    "What is the redshift of the host galaxy?",
+    "How was the Hα luminosity function measured?",
+    "Which instrument observed NGC 1275?",
+    "What constraints are placed on the dark matter halo mass?",
+    "How does the physics-informed network enforce the boundary conditions?",
+]
+
+
+def make_queries(count: int):
+    return [f"{QUESTIONS[i % len(QUESTIONS)]} (variant {i})" for i in range(count)]
+
+
+def sequential(service, queries) -> float:
+    start = time.perf_counter()
+    for query in queries:
+        service.generate_single_embedding(query)
+    return len(queries) / (time.perf_counter() - start)
+
+
+async def batched(service, queries, clients: int, max_wait_ms: float) -> float:
+    batcher = EmbeddingBatcher(service, max_wait_ms=max_wait_ms)
+    work = iter(queries)
+
+    async def client():
+        for query in work:
+            await batcher.embed(query)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    return len(queries) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--queries", type=int, default=512)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    service = get_embedding_service()
+    queries = make_queries(args.queries)
+    service.generate_embeddings(queries[:8], show_progress_bar=False)  # Load model and warm up
+
+    one_at_a_time = sequential(service, queries)
+    merged = asyncio.run(batched(service, queries, args.clients, args.max_wait_ms))
+
+    print(f"sequential:    {one_at_a_time:8.1f} queries/s")
+    print(f"micro-batched: {merged:8.1f} queries/s ({args.clients} concurrent clients, x{merged / one_at_a_time:.1f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Filtered search benchmark: ID pushdown vs over-fetch + post-filter, by filter selectivity.
+
+The post-filter baseline searches the global top (k / selectivity) hits and
+keeps those in the selected papers, which is what a filter bolted onto a
+global top-k search costs (and it can still come back short).
+
+Run with:  python -m benchmarks.bench_filters --vectors 200000 --tier hnsw
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+from app.db.vector_store import VectorStore
+from benchmarks.bench_ann import synthetic_embeddings
+
+CHUNKS_PER_PAPER = 40
+
+
+def timed(fn, queries: np.ndarray):
+    latencies, counts = [], []
+    for query in queries:
+        start = time.perf_counter()
+        counts.append(len(fn(query)))
+        latencies.append(time.perf_counter() - start)
+    return np.percentile(latencies, 50) * 1000, np.percentile(latencies, 99) * 1000, np.mean(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--tier", default="flat", help="flat, or an ANN tier built before searching")
+    parser.add_argument("--fractions", type=float, nargs="+", default=[0.0002, 0.01, 0.1, 0.5])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic_embeddings(args.vectors, args.dimension, rng)
+    queries = synthetic_embeddings(args.queries, args.dimension, rng)
+    num_papers = args.vectors // CHUNKS_PER_PAPER
+    settings.ANN_MIN_VECTORS = args.vectors + 1  # Build the ANN tier explicitly below
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(args.dimension, Path(tmp))
+        metadata = [
+            {'text': f"chunk {i}", 'page': 1, 'paper_id': f"paper{i // CHUNKS_PER_PAPER}", 'filename': f"{i}.pdf"}
+            for i in range(num_papers * CHUNKS_PER_PAPER)
+        ]
+        store.add(vectors[:len(metadata)], metadata)
+        if args.tier != "flat":
+            store.build_ann(args.tier)
+
+        print(f"vectors={len(metadata)} papers={num_papers} tier={args.tier} k={args.top_k}")
+        print(f"{'selected':>9} {'method':>12} {'p50 ms':>8} {'p99 ms':>8} {'hits':>6}")
+        p50, p99, hits = timed(lambda q: store.search(q, args.top_k), queries)
+        print(f"{'all':>9} {'unfiltered':>12} {p50:>8.2f} {p99:>8.2f} {hits:>6.1f}")
+
+        for fraction in args.fractions:
+            papers = [f"paper{i}" for i in rng.choice(num_papers, max(1, int(fraction * num_papers)), replace=False)]
+            selected = set(papers)
+            filters = {'paper_ids': papers}
+
+            def pushdown(query):
+                return store.search(query, args.top_k, ids=store.select(filters))
+
+            def post_filter(query):
+                over_fetch = min(len(metadata), int(args.top_k / fraction))
+                hits = store.search(query, over_fetch)
+                return [hit for hit in hits if hit['paper_id'] in selected][:args.top_k]
+
+            for name, fn in (("pushdown", pushdown), ("post-filter", post_filter)):
+                p50, p99, hits = timed(fn, queries)
+                print(f"{len(papers) * CHUNKS_PER_PAPER:>9} {name:>12} {p50:>8.2f} {p99:>8.2f} {hits:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Hierarchical search benchmark: recall@k and latency of paper-centroid coarse-to-fine search against flat search.
+
+For each number of papers M, queries pick the M papers whose centroids
+match best (VectorStore.paper_candidates, within a chunk budget of
+--max-chunks) and score only their chunks (VectorStore.search_selections).
+Recall is measured against exact search over every chunk; "scored" is the
+number of chunks searched per query and "papers" the distinct papers among
+the top k. Raise --chunks-per-paper to see the budget at work.
+
+Run with:  python -m benchmarks.bench_hierarchical --chunks 200000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from loguru import logger
+
+from app.config import settings
+from app.db.vector_store import VectorStore
+from app.services.embeddings import get_embedding_service
+from benchmarks.bench_ann import recall_at_k
+from benchmarks.bench_e2e import select_embedder
+from benchmarks.synthetic import corpus_chunks, questions
+
+
+def report(name: str, found: list, truth: np.ndarray, latencies: list, scored: float, paper_of: np.ndarray):
+    latencies = np.array(latencies) * 1000
+    papers = np.mean([len(set(paper_of[ids].tolist())) for ids in found])
+    print(
+        f"{name:<16}{recall_at_k(found, truth):>10.3f}{np.percentile(latencies, 50):>10.3f}"
+        f"{np.percentile(latencies, 99):>10.3f}{scored:>12,.0f}{papers:>8.1f}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=200_000)
+    parser.add_argument("--chunks-per-paper", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--papers", type=int, nargs="+", default=[5, 10, 20, 50, 100, 200])
+    parser.add_argument("--max-chunks", type=int, default=settings.HIERARCHICAL_MAX_CHUNKS, help="Chunk budget per query")
+    parser.add_argument("--embedder", choices=["auto", "model", "hash"], default="hash")
+    args = parser.parse_args()
+
+    logger.remove()
+    rng = np.random.default_rng(0)
+    embedder = select_embedder(args.embedder)
+    service = get_embedding_service()
+    chunks = corpus_chunks(args.chunks, rng, args.chunks_per_paper)
+    embeddings = np.vstack([
+        service.generate_embeddings([chunk['text'] for chunk in chunks[start:start + 10_000]], show_progress_bar=False)
+        for start in range(0, len(chunks), 10_000)
+    ]).astype(np.float32)
+    queries = service.generate_embeddings(questions(args.queries, rng), show_progress_bar=False).astype(np.float32)
+    paper_of = np.array([int(chunk['paper_id'][len("synthetic"):]) for chunk in chunks])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(path=Path(tmp))
+        for start in range(0, len(chunks), settings.INGEST_COMMIT_BATCH):
+            store.add(embeddings[start:start + settings.INGEST_COMMIT_BATCH], chunks[start:start + settings.INGEST_COMMIT_BATCH])
+        store.wait_for_ann()
+
+        print(f"chunks={args.chunks} papers={len(store.paper_centroids)} queries={args.queries} "
+              f"k={args.top_k} embedder={embedder} index={store.ann_type or 'flat'}")
+        print(f"{'search':<16}{'recall@k':>10}{'p50 ms':>10}{'p99 ms':>10}{'scored':>12}{'papers':>8}")
+
+        # Chunk IDs equal positions: the store was filled in order
+        truth, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            scores = embeddings @ query
+            best = np.argpartition(-scores, args.top_k)[:args.top_k]
+            truth.append(best[np.argsort(-scores[best])])
+            latencies.append(time.perf_counter() - start)
+        truth = np.array(truth)
+        report("exact (numpy)", truth, truth, latencies, len(chunks), paper_of)
+
+        found, latencies = [], []
+        for query in queries:
+            start = time.perf_counter()
+            results = store.search(query, top_k=args.top_k)
+            latencies.append(time.perf_counter() - start)
+            found.append(np.array([result['vector_id'] for result in results]))
+        report("flat search", found, truth, latencies, len(chunks), paper_of)
+
+        for num_papers in args.papers:
+            found, latencies, scored = [], [], []
+            for query in queries:
+                start = time.perf_counter()
+                selection = store.paper_candidates(query, num_papers, max_chunks=args.max_chunks)[0]
+                results = store.search_selections(query.reshape(1, -1), args.top_k, [selection])[0]
+                latencies.append(time.perf_counter() - start)
+                found.append(np.array([result['vector_id'] for result in results]))
+                scored.append(len(selection))
+            report(f"top {num_papers} papers", found, truth, latencies, float(np.mean(scored)), paper_of)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Ingest benchmark: per-upload latency of VectorStore.add as the corpus grows.
+
+Run with:  python -m benchmarks.bench_ingest --papers 1000
+"""
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.db.vector_store import VectorStore
+
+
+def run(num_papers: int, chunks_per_paper: int, dimension: int, max_ratio: float) -> bool:
+    rng = np.random.default_rng(0)
+    latencies = []
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(dimension=dimension, path=Path(tmp))
+
+        for i in range(num_papers):
+            embeddings = rng.standard_normal((chunks_per_paper, dimension)).astype(np.float32)
+            metadata = [
+                {'text': f"paper {i} chunk {j}", 'page': j, 'paper_id': f"paper{i:06d}", 'filename': f"{i}.pdf"}
+                for j in range(chunks_per_paper)
+            ]
+
+            start = time.perf_counter()
+            store.add(embeddings, metadata)
+            latencies.append(time.perf_counter() - start)
+
+        window = max(1, num_papers // 10)
+        first = float(np.median(latencies[:window])) * 1000
+        last = float(np.median(latencies[-window:])) * 1000
+        ratio = last / first
+
+        print(f"papers={num_papers} chunks/paper={chunks_per_paper} total={store.index.ntotal}")
+        print(f"median upload latency: first {window} = {first:.2f} ms, last {window} = {last:.2f} ms (x{ratio:.2f})")
+
+        start = time.perf_counter()
+        reloaded = VectorStore(path=Path(tmp))
+        reloaded.load()
+        print(f"replay {num_papers} segments: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    flat = ratio <= max_ratio
+    print("PASS: per-upload latency is flat" if flat else f"FAIL: latency grew more than x{max_ratio}")
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--papers", type=int, default=1000)
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--max-ratio", type=float, default=2.0)
+    args = parser.parse_args()
+
+    ok = run(args.papers, args.chunks, args.dimension, args.max_ratio)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""BM25 lexical index benchmark: build, incremental add and query latency at scale.
+
+Chunks are synthetic Zipf-distributed text with rare catalog-style IDs mixed in.
+
+Run with:  python -m benchmarks.bench_lexical --chunks 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.db.lexical_index import LexicalIndex
+
+
+def make_texts(rng: np.random.Generator, start: int, count: int, vocab: np.ndarray, words: int):
+    ranks = np.minimum(rng.zipf(1.2, size=(count, words)), len(vocab)) - 1
+    texts = []
+    for i, row in enumerate(ranks):
+        text = " ".join(vocab[row])
+        texts.append(f"{text} NGC{(start + i) % 50_000} z≈{(start + i) % 97 / 10:.1f}")
+    return texts
+
+
+def run(num_chunks: int, words: int, batch: int, queries: int):
+    rng = np.random.default_rng(0)
+    vocab = np.array([f"w{i}" for i in range(200_000)])
+    index = LexicalIndex()
+
+    start = time.perf_counter()
+    for first in range(0, num_chunks, batch):
+        count = min(batch, num_chunks - first)
+        index.add(np.arange(first, first + count, dtype=np.int64), make_texts(rng, first, count, vocab, words))
+    build = time.perf_counter() - start
+    postings = sum(len(segment) for segment in index.segments)
+    print(f"chunks={num_chunks} words/chunk={words} postings={postings:,} segments={len(index.segments)}")
+    print(f"build: {build:.1f}s ({num_chunks / build:,.0f} chunks/s)")
+
+    # One paper's worth of chunks (includes any merge it triggers)
+    add_latencies = []
+    for i in range(20):
+        first = num_chunks + i * 40
+        texts = make_texts(rng, first, 40, vocab, words)
+        start = time.perf_counter()
+        index.add(np.arange(first, first + 40, dtype=np.int64), texts)
+        add_latencies.append(time.perf_counter() - start)
+    print(f"add 40 chunks: p50={np.percentile(add_latencies, 50) * 1000:.1f} ms "
+          f"max={max(add_latencies) * 1000:.1f} ms")
+
+    query_sets = {
+        "catalog id": [f"NGC{i} emission" for i in rng.integers(0, 50_000, queries)],
+        "rare words": [" ".join(vocab[rng.integers(1000, 200_000, 3)]) for _ in range(queries)],
+        "common words": [" ".join(vocab[rng.integers(0, 20, 3)]) for _ in range(queries)],
+    }
+    for name, texts in query_sets.items():
+        latencies = []
+        for text in texts:
+            start = time.perf_counter()
+            index.search(text, top_k=20)
+            latencies.append(time.perf_counter() - start)
+        print(f"query ({name}): p50={np.percentile(latencies, 50) * 1000:.2f} ms "
+              f"p99={np.percentile(latencies, 99) * 1000:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=1_000_000)
+    parser.add_argument("--words", type=int, default=60)
+    parser.add_argument("--batch", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+    run(args.chunks, args.words, args.batch, args.queries)
+
+
+if __name__ == "__main__":
+    main()
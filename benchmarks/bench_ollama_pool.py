@@ -0,0 +1,93 @@
+"""Ollama client benchmark against local stub servers.
+
+Compares a new connection per call (plain `requests.post`, the old
+behaviour) with the pooled keep-alive OllamaClient, then shows generation
+throughput scaling across backends and failover away from a dead server.
+
+Run with:  python -m benchmarks.bench_ollama_pool
+"""
+import argparse
+import asyncio
+import socket
+import time
+
+import requests
+
+from app.services.ollama_client import OllamaClient
+from benchmarks.fake_ollama import start_fake_ollama
+
+PAYLOAD = {"model": "fake", "prompt": "What is the redshift of NGC 1275?", "stream": False}
+
+
+def per_call_connections(url: str, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        requests.post(f"{url}/api/generate", json=PAYLOAD, timeout=30)
+    return calls / (time.perf_counter() - start)
+
+
+def pooled_sync(url: str, calls: int) -> float:
+    client = OllamaClient([url])
+    start = time.perf_counter()
+    for _ in range(calls):
+        client.post_sync("/api/generate", PAYLOAD)
+    rate = calls / (time.perf_counter() - start)
+    asyncio.run(client.aclose())
+    return rate
+
+
+async def pooled_async(urls, calls: int, concurrency: int, max_in_flight: int) -> float:
+    client = OllamaClient(urls, max_in_flight=max_in_flight)
+    work = iter(range(calls))
+
+    async def worker():
+        for _ in work:
+            response = await client.post("/api/generate", PAYLOAD)
+            response.raise_for_status()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    rate = calls / (time.perf_counter() - start)
+    await client.aclose()
+    return rate
+
+
+def unused_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=500)
+    parser.add_argument("--generate-ms", type=float, default=50.0, help="Simulated generation time per request")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-in-flight", type=int, default=2)
+    args = parser.parse_args()
+
+    # Connection overhead: near-instant responses
+    fast_server, fast_url = start_fake_ollama(prompt_ms=0, token_ms=0, num_tokens=1)
+    print(f"new connection per call:  {per_call_connections(fast_url, args.calls):8.1f} req/s")
+    print(f"pooled keep-alive (sync): {pooled_sync(fast_url, args.calls):8.1f} req/s")
+    fast_server.shutdown()
+
+    # Horizontal scaling: each backend serves at most max_in_flight generations
+    servers = [start_fake_ollama(prompt_ms=args.generate_ms, token_ms=0, num_tokens=1) for _ in range(3)]
+    urls = [url for _, url in servers]
+    calls = max(1, args.calls // 5)
+    for count in (1, 2, 3):
+        rate = asyncio.run(pooled_async(urls[:count], calls, args.concurrency, args.max_in_flight))
+        print(f"{count} backend(s), {args.max_in_flight} in flight each: {rate:8.1f} generations/s")
+
+    # Failover: one dead server in the pool
+    dead_url = f"http://127.0.0.1:{unused_port()}"
+    rate = asyncio.run(pooled_async([dead_url] + urls[:1], calls, args.concurrency, args.max_in_flight))
+    print(f"1 live + 1 dead backend:  {rate:8.1f} generations/s (connection errors retried on the live server)")
+
+    for server, _ in servers:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
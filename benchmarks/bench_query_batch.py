@@ -0,0 +1,58 @@
+"""Batch retrieval benchmark: one search per query vs one matrix search_batch.
+
+Covers the vector side of /api/query/batch; encode batching is measured by
+bench_embedding_batch.
+
+Run with:  python -m benchmarks.bench_query_batch --vectors 200000 --queries 2000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+from app.db.vector_store import VectorStore
+from benchmarks.bench_ann import synthetic_embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--tiers", nargs="+", default=["flat", "hnsw", "ivf_flat"])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic_embeddings(args.vectors, args.dimension, rng)
+    queries = synthetic_embeddings(args.queries, args.dimension, rng)
+    settings.ANN_MIN_VECTORS = args.vectors + 1  # Build the ANN tiers explicitly below
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(args.dimension, Path(tmp))
+        metadata = [{'text': f"chunk {i}", 'page': 1, 'paper_id': f"paper{i // 40}"} for i in range(args.vectors)]
+        store.add(vectors, metadata)
+
+        print(f"vectors={args.vectors} queries={args.queries} k={args.top_k}")
+        print(f"{'tier':<10}{'per-query s':>13}{'batch s':>10}{'speedup':>9}")
+        for tier in args.tiers:
+            if tier != "flat":
+                store.build_ann(tier)
+
+            start = time.perf_counter()
+            for query in queries:
+                store.search(query, args.top_k)
+            sequential = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store.search_batch(queries, args.top_k)
+            batched = time.perf_counter() - start
+
+            print(f"{tier:<10}{sequential:>13.2f}{batched:>10.2f}{sequential / batched:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
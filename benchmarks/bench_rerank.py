@@ -0,0 +1,103 @@
+"""Re-rank benchmark: retrieval quality vs added latency, without and with the cross-encoder.
+
+Indexes the PDFs in a directory (default: the sample papers in data/uploads)
+and turns random chunk sentences, with 40% of their words dropped, into
+queries whose answer is the chunk they came from. Reports hit@k and MRR@k
+of the context passed to the LLM, plus the latency re-ranking adds.
+
+Run with:  python -m benchmarks.bench_rerank --pdfs data/uploads --queries 200
+"""
+import argparse
+import re
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+from app.db.vector_store import VectorStore
+from app.services.embeddings import get_embedding_service
+from app.services.pdf_processor import PDFProcessor
+from app.services.reranker import Reranker
+from app.services.retrieval import reciprocal_rank_fusion
+from app.utils.text_processing import TextChunker
+
+
+def make_queries(chunks, count: int, rng):
+    """(query, text snippet) pairs; any chunk containing the snippet is a correct hit"""
+    queries = []
+    for chunk_index in rng.permutation(len(chunks)):
+        sentences = [s for s in re.split(r"(?<=[.?!])\s+", chunks[chunk_index]['text']) if len(s.split()) >= 10]
+        if not sentences:
+            continue
+        words = sentences[rng.integers(len(sentences))].split()
+        keep = np.sort(rng.choice(len(words), int(len(words) * 0.6), replace=False))
+        queries.append((" ".join(words[i] for i in keep), " ".join(words)))
+        if len(queries) == count:
+            break
+    return queries
+
+
+def quality(results, snippet: str, top_k: int):
+    for rank, result in enumerate(results[:top_k], 1):
+        if snippet in " ".join(result['text'].split()):
+            return 1.0, 1.0 / rank
+    return 0.0, 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pdfs", type=Path, default=Path("data/uploads"))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=settings.MAX_CONTEXT_CHUNKS)
+    parser.add_argument("--candidates", type=int, default=settings.RERANK_CANDIDATES)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    processor, chunker = PDFProcessor(), TextChunker()
+    embedding_service = get_embedding_service()
+
+    chunks = []
+    for pdf_path in sorted(args.pdfs.glob("*.pdf")):
+        for chunk in chunker.chunk_text(processor.extract_text(pdf_path)['pages']):
+            chunks.append({**chunk, 'paper_id': pdf_path.stem, 'filename': pdf_path.name})
+    queries = make_queries(chunks, args.queries, rng)
+    print(f"papers={len(list(args.pdfs.glob('*.pdf')))} chunks={len(chunks)} queries={len(queries)} "
+          f"k={args.top_k} candidates={args.candidates}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        store = VectorStore(path=Path(tmp))
+        store.add(embedding_service.generate_embeddings([c['text'] for c in chunks], show_progress_bar=False), chunks)
+        query_embeddings = embedding_service.generate_embeddings([q for q, _ in queries], show_progress_bar=False)
+
+        candidates = []
+        for (query, _), query_embedding in zip(queries, query_embeddings):
+            dense = store.search(query_embedding, args.candidates)
+            lexical = store.lexical_search(query, args.candidates)
+            candidates.append({'dense': dense, 'hybrid': reciprocal_rank_fusion([dense, lexical], args.candidates)})
+
+        print(f"{'method':<24}{'hit@k':>8}{'MRR@k':>8}{'+p50 ms':>10}{'+p95 ms':>10}")
+        for base in ("dense", "hybrid"):
+            scores = [quality(c[base], snippet, args.top_k) for c, (_, snippet) in zip(candidates, queries)]
+            hits, mrr = np.mean(scores, axis=0)
+            print(f"{base:<24}{hits:>8.3f}{mrr:>8.3f}{0:>10.1f}{0:>10.1f}")
+
+        for quantize in (False, True):
+            reranker = Reranker(quantize=quantize)
+            reranker.rerank("warm up", candidates[0]['hybrid'], args.top_k, budget_ms=float("inf"))
+            for base in ("dense", "hybrid"):
+                scores, latencies = [], []
+                for c, (query, snippet) in zip(candidates, queries):
+                    start = time.perf_counter()
+                    results = reranker.rerank(query, c[base], args.top_k, budget_ms=float("inf"))
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    scores.append(quality(results, snippet, args.top_k))
+                hits, mrr = np.mean(scores, axis=0)
+                name = f"{base} + rerank{' int8' if quantize else ''}"
+                print(f"{name:<24}{hits:>8.3f}{mrr:>8.3f}"
+                      f"{np.percentile(latencies, 50):>10.1f}{np.percentile(latencies, 95):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
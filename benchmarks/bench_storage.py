@@ -0,0 +1,88 @@
+"""Vector storage benchmark: memory, disk, load time and recall of each VECTOR_STORAGE mode.
+
+Builds a VectorStore per mode from the same synthetic embeddings and
+reports the size of the in-RAM index (index.faiss), the exact vectors kept
+on disk for re-scoring (vectors.bin), save/load time, and recall@k and
+latency of VectorStore.search against exact float32 scores.
+
+Run with:  python -m benchmarks.bench_storage --vectors 200000
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+from app.db.vector_store import VECTOR_STORAGES, VectorStore
+from benchmarks.bench_ann import recall_at_k, synthetic_embeddings
+
+
+def file_size(path: Path) -> float:
+    return path.stat().st_size / 1e6 if path.exists() else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--storages", nargs="+", default=list(VECTOR_STORAGES))
+    parser.add_argument("--rescore-factor", type=int, nargs="+", default=[settings.RESCORE_FACTOR])
+    parser.add_argument("--index-type", default="flat", help="flat, or an ANN tier to search instead")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    vectors = synthetic_embeddings(args.vectors, args.dimension, rng)
+    queries = synthetic_embeddings(args.queries, args.dimension, rng)
+    truth = np.argsort(-(queries @ vectors.T), axis=1)[:, :args.top_k]
+    metadata = [{'text': f"chunk {i}", 'page': 1, 'paper_id': f"paper{i // 100}"} for i in range(args.vectors)]
+    if args.index_type != "flat":
+        settings.INDEX_TYPE = args.index_type
+        settings.ANN_MIN_VECTORS = 0
+
+    print(f"vectors={args.vectors} dim={args.dimension} queries={args.queries} k={args.top_k} "
+          f"index={args.index_type}")
+    print(f"{'storage':<9}{'codes':>8}{'RAM MB':>9}{'disk MB':>9}{'build s':>9}{'save s':>8}{'load s':>8}"
+          f"{'rescore':>9}{'recall@k':>10}{'p50 ms':>8}{'p99 ms':>8}")
+    for storage in args.storages:
+        settings.VECTOR_STORAGE = storage
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp)
+            start = time.perf_counter()
+            store = VectorStore(path=path)
+            store.create_index(vectors, metadata)
+            store.wait_for_ann()
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store.save()
+            save_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            store = VectorStore(path=path)
+            store.load()
+            store.wait_for_ann()
+            load_time = time.perf_counter() - start
+
+            ram = file_size(path / "index.faiss") + file_size(path / "ann.faiss")
+            disk = file_size(path / "vectors" / "vectors.bin")
+            factors = args.rescore_factor if storage != "float32" else [1]
+            for factor in factors:
+                settings.RESCORE_FACTOR = factor
+                found, latencies = [], []
+                for query in queries:
+                    start = time.perf_counter()
+                    results = store.search(query, args.top_k)
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    found.append([result['vector_id'] for result in results])
+                print(f"{storage:<9}{store.codes:>8}{ram:>9.1f}{disk:>9.1f}{build_time:>9.1f}{save_time:>8.2f}"
+                      f"{load_time:>8.2f}{factor if storage != 'float32' else '-':>9}"
+                      f"{recall_at_k(found, truth):>10.3f}"
+                      f"{np.percentile(latencies, 50):>8.2f}{np.percentile(latencies, 99):>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
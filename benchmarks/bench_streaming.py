@@ -0,0 +1,58 @@
+"""Time-to-first-token: blocking generate_answer_async vs. streaming stream_answer.
+
+Runs against the fake Ollama server, so no model is needed:
+    python -m benchmarks.bench_streaming --token-ms 20 --tokens 200
+"""
+import argparse
+import asyncio
+import time
+
+import numpy as np
+
+from app.services.llm import LLMService
+from benchmarks.fake_ollama import start_fake_ollama
+
+CHUNKS = [{'text': "The Hα emission of NGC 1275 traces filaments in the Perseus cluster.", 'page': 1}]
+
+
+async def measure(llm: LLMService, runs: int):
+    blocking, first_token, streamed_total = [], [], []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        await llm.generate_answer_async("What traces the filaments?", CHUNKS)
+        blocking.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        first = None
+        async for _ in llm.stream_answer("What traces the filaments?", CHUNKS):
+            if first is None:
+                first = time.perf_counter() - start
+        first_token.append(first)
+        streamed_total.append(time.perf_counter() - start)
+
+    await llm.aclose()
+    return blocking, first_token, streamed_total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--prompt-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--tokens", type=int, default=200)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    server, url = start_fake_ollama(prompt_ms=args.prompt_ms, token_ms=args.token_ms, num_tokens=args.tokens)
+    llm = LLMService(base_urls=[url])
+
+    blocking, first_token, streamed_total = asyncio.run(measure(llm, args.runs))
+    server.shutdown()
+
+    print(f"blocking answer:         {np.median(blocking) * 1000:8.1f} ms until anything is shown")
+    print(f"streaming first token:   {np.median(first_token) * 1000:8.1f} ms")
+    print(f"streaming full answer:   {np.median(streamed_total) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Multi-worker benchmark: memory per worker, query throughput and snapshot propagation.
+
+Builds an index, then starts --workers processes that each load it the way
+an app worker does (VectorStore.load + start_watching) and run queries,
+while this process keeps adding papers. Reports per worker:
+- PSS of anonymous and file-backed memory (file pages of the mapped IVF
+  lists are shared, so their PSS is split between the workers)
+- queries per second
+- how long each new paper took to become searchable in that worker
+
+Run with:  python -m benchmarks.bench_workers --vectors 200000 --workers 4
+           python -m benchmarks.bench_workers --no-mmap   (private copies, for comparison)
+"""
+import argparse
+import multiprocessing
+import queue
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+from app.db.vector_store import VectorStore
+from benchmarks.bench_ann import synthetic_embeddings
+
+
+def configure(args):
+    settings.INDEX_TYPE = args.index_type
+    settings.ANN_MIN_VECTORS = 0
+    settings.INDEX_MMAP = not args.no_mmap
+    settings.VECTOR_STORAGE = args.storage
+    settings.SNAPSHOT_POLL_INTERVAL = args.poll
+
+
+def memory_mb() -> dict:
+    """Proportional set size of this process, split into anonymous and file-backed pages"""
+    values = {}
+    with open("/proc/self/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Pss_Anon:", "Pss_File:"):
+                values[parts[0][:-1]] = int(parts[1]) / 1024
+    return values
+
+
+def worker(args, path: Path, probes: multiprocessing.Queue, results: multiprocessing.Queue, ready):
+    configure(args)
+    store = VectorStore(path=path)
+    store.load()
+    store.start_watching()
+    rng = np.random.default_rng()
+    queries = synthetic_embeddings(256, args.dimension, rng)
+    ready.wait()
+
+    lags, waiting = [], []
+    count = 0
+    end = time.time() + args.seconds
+    while time.time() < end:
+        store.search_batch(queries[count % 256:count % 256 + 1], args.top_k)
+        count += 1
+        try:
+            while True:
+                waiting.append(probes.get_nowait())
+        except queue.Empty:
+            pass
+        for probe in list(waiting):
+            published, first_id, vector = probe
+            hits = store.search(vector, 1)
+            if hits and hits[0]['vector_id'] == first_id:
+                lags.append(time.time() - published)
+                waiting.remove(probe)
+
+    store.stop_watching()
+    results.put({'queries': count, 'qps': count / args.seconds, 'lags': lags, **memory_mb()})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--vectors", type=int, default=200_000)
+    parser.add_argument("--dimension", type=int, default=384)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--papers", type=int, default=10, help="Papers added while the workers query")
+    parser.add_argument("--chunks-per-paper", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--index-type", default="ivf_flat")
+    parser.add_argument("--storage", default="float32")
+    parser.add_argument("--poll", type=float, default=settings.SNAPSHOT_POLL_INTERVAL)
+    parser.add_argument("--no-mmap", action="store_true")
+    args = parser.parse_args()
+    configure(args)
+
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp)
+        start = time.perf_counter()
+        store = VectorStore(path=path)
+        vectors = synthetic_embeddings(args.vectors, args.dimension, rng)
+        metadata = [{'text': f"chunk {i}", 'page': 1, 'paper_id': f"paper{i // 100}"} for i in range(args.vectors)]
+        store.create_index(vectors, metadata)
+        store.wait_for_ann()
+        store.save()
+        del vectors, metadata
+        print(f"vectors={args.vectors} dim={args.dimension} index={args.index_type} storage={args.storage} "
+              f"mmap={not args.no_mmap} workers={args.workers} (built in {time.perf_counter() - start:.1f}s)")
+
+        context = multiprocessing.get_context("spawn")
+        probe_queues = [context.Queue() for _ in range(args.workers)]
+        results = context.Queue()
+        ready = context.Event()
+        processes = [
+            context.Process(target=worker, args=(args, path, probe_queues[i], results, ready))
+            for i in range(args.workers)
+        ]
+        for process in processes:
+            process.start()
+        time.sleep(min(60.0, 5.0 + args.vectors / 20_000))  # Let every worker finish loading
+        ready.set()
+
+        # Writer: one paper at a time, spread over the query window
+        interval = args.seconds * 0.7 / max(1, args.papers)
+        for paper in range(args.papers):
+            time.sleep(interval)
+            embeddings = synthetic_embeddings(args.chunks_per_paper, args.dimension, rng)
+            ids = store.add(embeddings, [
+                {'text': f"new chunk {i}", 'page': 1, 'paper_id': f"new{paper}"} for i in range(args.chunks_per_paper)
+            ])
+            for probe_queue in probe_queues:
+                probe_queue.put((time.time(), ids[0], embeddings[0]))
+
+        reports = [results.get() for _ in processes]
+        for process in processes:
+            process.join()
+
+    print(f"{'worker':<8}{'anon MB':>9}{'file MB':>9}{'qps':>8}{'seen':>6}{'lag p50 s':>11}{'lag max s':>11}")
+    for i, report in enumerate(reports):
+        lags = report['lags'] or [float('nan')]
+        print(f"{i:<8}{report['Pss_Anon']:>9.1f}{report['Pss_File']:>9.1f}{report['qps']:>8.0f}"
+              f"{len(report['lags']):>6}{np.percentile(lags, 50):>11.2f}{max(lags):>11.2f}")
+    print(f"total: {sum(r['Pss_Anon'] + r['Pss_File'] for r in reports):.1f} MB, "
+          f"{sum(r['qps'] for r in reports):.0f} qps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Minimal stand-in for the Ollama HTTP API, for offline tests and benchmarks.
+
+Serves /api/tags and /api/generate (both `stream: true` NDJSON and
+`stream: false` JSON) with configurable prompt-eval and per-token latency.
+
+Run standalone:  python -m benchmarks.fake_ollama --port 11434 --token-ms 20
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+
+class FakeOllamaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # Avoid delayed-ACK stalls on keep-alive connections
+
+    # Overridden per server via make_handler()
+    prompt_ms = 200.0
+    token_ms = 20.0
+    num_tokens = 50
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload: dict, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/api/tags":
+            self._send_json({"models": [{"name": "fake"}]})
+        else:
+            self._send_json({"error": "not found"}, status=404)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path != "/api/generate":
+            self._send_json({"error": "not found"}, status=404)
+            return
+
+        tokens = [f" token{i}" for i in range(self.num_tokens)]
+        prompt_tokens = len(request.get("prompt", "").split())
+        time.sleep(self.prompt_ms / 1000)
+
+        if not request.get("stream", True):
+            time.sleep(self.token_ms * self.num_tokens / 1000)
+            self._send_json({
+                "model": request.get("model"),
+                "response": "".join(tokens),
+                "done": True,
+                "prompt_eval_count": prompt_tokens,
+                "eval_count": self.num_tokens,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(payload: dict):
+            data = (json.dumps(payload) + "\n").encode()
+            self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+
+        for token in tokens:
+            time.sleep(self.token_ms / 1000)
+            write_chunk({"model": request.get("model"), "response": token, "done": False})
+        write_chunk({
+            "model": request.get("model"),
+            "response": "",
+            "done": True,
+            "prompt_eval_count": prompt_tokens,
+            "eval_count": self.num_tokens,
+        })
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def make_handler(prompt_ms: float, token_ms: float, num_tokens: int):
+    return type(
+        "ConfiguredFakeOllamaHandler",
+        (FakeOllamaHandler,),
+        {"prompt_ms": prompt_ms, "token_ms": token_ms, "num_tokens": num_tokens},
+    )
+
+
+def start_fake_ollama(
+    port: int = 0, prompt_ms: float = 200.0, token_ms: float = 20.0, num_tokens: int = 50
+) -> Tuple[ThreadingHTTPServer, str]:
+    """Start a fake Ollama server in a daemon thread; returns (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(prompt_ms, token_ms, num_tokens))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--prompt-ms", type=float, default=200.0)
+    parser.add_argument("--token-ms", type=float, default=20.0)
+    parser.add_argument("--tokens", type=int, default=50)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(args.prompt_ms, args.token_ms, args.tokens))
+    print(f"Fake Ollama listening on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
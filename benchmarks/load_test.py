@@ -0,0 +1,87 @@
+"""Load test: p50/p99 latency of /api/query and /api/health under N concurrent clients.
+
+Start the server first (python -m uvicorn app.main:app), then run:
+    python -m benchmarks.load_test --clients 16 --requests 200
+"""
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+import httpx
+import numpy as np
+
+QUESTIONS = [
+    "What is the main result of the paper?",
+    "Which boundary conditions does the model use?",
+    "How was the training loss defined?",
+    "What datasets were used for validation?",
+]
+
+
+async def run_clients(url: str, clients: int, total: int, timeout: float):
+    latencies = {"query": [], "health": []}
+    statuses = Counter()
+    remaining = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=url, timeout=timeout) as client:
+
+        async def query_client():
+            for i in remaining:
+                start = time.perf_counter()
+                response = await client.post(
+                    "/api/query", json={"query": QUESTIONS[i % len(QUESTIONS)], "top_k": 5}
+                )
+                latencies["query"].append(time.perf_counter() - start)
+                statuses[response.status_code] += 1
+
+        async def health_probe(done: asyncio.Event):
+            # The health check must stay fast while queries are in flight
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/api/health")
+                latencies["health"].append(time.perf_counter() - start)
+                await asyncio.sleep(0.1)
+
+        done = asyncio.Event()
+        probe = asyncio.create_task(health_probe(done))
+        start = time.perf_counter()
+        await asyncio.gather(*(query_client() for _ in range(clients)))
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe
+
+    return latencies, statuses, elapsed
+
+
+def report(name: str, values):
+    if not values:
+        print(f"{name:<8} no samples")
+        return
+    ms = np.array(values) * 1000
+    print(
+        f"{name:<8} n={len(ms):<6} p50={np.percentile(ms, 50):9.1f} ms"
+        f"  p99={np.percentile(ms, 99):9.1f} ms  max={ms.max():9.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    latencies, statuses, elapsed = asyncio.run(
+        run_clients(args.url, args.clients, args.requests, args.timeout)
+    )
+
+    print(f"{args.requests} queries from {args.clients} clients in {elapsed:.1f}s ({args.requests / elapsed:.1f} req/s)")
+    print(f"status codes: {dict(statuses)}")
+    report("query", latencies["query"])
+    report("health", latencies["health"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+"""Synthetic astrophysics-like papers, PDFs and queries for offline benchmarks.
+
+Papers are built from a fixed vocabulary of objects, quantities, methods
+and instruments; each paper favours one topic, so queries about a topic
+have a right answer. Also provides a hashing embedder that stands in for
+the embedding model when no model is available locally.
+
+Write a PDF corpus:  python -m benchmarks.synthetic --papers 100 --out /tmp/corpus
+"""
+import argparse
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+OBJECTS = [
+    "white dwarf", "neutron star", "black hole", "quasar", "galaxy cluster", "protoplanetary disk",
+    "exoplanet", "supernova remnant", "molecular cloud", "globular cluster", "Type Ia supernova",
+    "active galactic nucleus", "brown dwarf", "magnetar", "pulsar", "Cepheid variable", "hot Jupiter",
+    "dwarf galaxy", "dark matter halo", "gamma-ray burst"
+]
+QUANTITIES = [
+    ("redshift", ""), ("luminosity", "erg/s"), ("metallicity", "dex"), ("mass-loss rate", "Msun/yr"),
+    ("accretion rate", "Msun/yr"), ("velocity dispersion", "km/s"), ("star formation rate", "Msun/yr"),
+    ("spectral index", ""), ("optical depth", ""), ("Hubble constant", "km/s/Mpc"), ("orbital period", "days"),
+    ("effective temperature", "K"), ("surface gravity", "dex"), ("magnetic field strength", "G"),
+    ("stellar mass", "Msun"), ("X-ray flux", "erg/s/cm^2")
+]
+METHODS = [
+    "Markov chain Monte Carlo sampling", "N-body simulations", "radiative transfer modelling",
+    "spectral energy distribution fitting", "weak gravitational lensing", "photometric time-series analysis",
+    "hydrodynamical simulations", "hierarchical Bayesian inference", "physics-informed neural networks",
+    "asteroseismology", "Gaussian process regression", "integral field spectroscopy"
+]
+INSTRUMENTS = [
+    "JWST", "ALMA", "Gaia", "Chandra", "the Hubble Space Telescope", "the Very Large Telescope", "TESS",
+    "Kepler", "LIGO", "the Sloan Digital Sky Survey", "XMM-Newton", "the Square Kilometre Array pathfinders"
+]
+AUTHORS = ["Smith", "Garcia", "Chen", "Mueller", "Okafor", "Tanaka", "Rossi", "Novak", "Singh", "Larsen"]
+JOURNALS = ["ApJ", "MNRAS", "A&A", "AJ", "Nature Astronomy", "PASP"]
+
+SENTENCES = [
+    "We measure the {quantity} of {n} {object}s observed with {instrument}.",
+    "Using {method}, we find that the {quantity} scales with the {quantity2} as a power law of index {exp:.2f} (Fig. {fig}).",
+    "The derived {quantity} is {value:.2f} +/- {err:.2f} {unit}, consistent with earlier estimates from {instrument}.",
+    "These results suggest that {object}s with a high {quantity} form preferentially in dense environments.",
+    "Our {method} analysis constrains the {quantity} to within {pct}% at redshift z = {z:.2f}.",
+    "In contrast to earlier work ({author} et al. {year}), we detect no correlation between {quantity} and {quantity2}.",
+    "Systematic uncertainties in the {quantity} are dominated by the calibration of {instrument}.",
+    "The sample contains {n} {object}s selected by {quantity} above {value:.1f} {unit}.",
+    "Applying {method} to the {instrument} data recovers the injected {quantity} with a bias below {pct}%.",
+    "The {quantity} of the {object} population evolves only weakly between z = {z:.2f} and z = {z2:.2f}.",
+    "A two-component model reproduces the observed {quantity2} distribution with a reduced chi-squared of {chi:.2f}.",
+    "We therefore interpret the excess {quantity} as evidence for feedback from the central {object}.",
+]
+SECTIONS = [
+    ("Abstract", 1), ("1. Introduction", 3), ("2. Observations and Data", 2), ("3. Methods", 3),
+    ("4. Results", 4), ("5. Discussion", 3), ("6. Conclusions", 1)
+]
+QUESTIONS = [
+    "What is the {quantity} of {object}s measured with {instrument}?",
+    "How does {method} constrain the {quantity}?",
+    "Is there a correlation between {quantity} and {quantity2} in {object}s?",
+    "Which systematic uncertainties affect the {quantity} measured by {instrument}?",
+    "How does the {quantity} of {object}s evolve with redshift?",
+]
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class Topic:
+    """The object, quantities, method and instrument a paper (or query) is about"""
+
+    def __init__(self, rng: np.random.Generator):
+        self.object = OBJECTS[rng.integers(len(OBJECTS))]
+        first, second = rng.choice(len(QUANTITIES), 2, replace=False)
+        self.quantity, self.unit = QUANTITIES[first]
+        self.quantity2 = QUANTITIES[second][0]
+        self.method = METHODS[rng.integers(len(METHODS))]
+        self.instrument = INSTRUMENTS[rng.integers(len(INSTRUMENTS))]
+
+    def fields(self, rng: np.random.Generator, focus: float = 0.8) -> Dict:
+        """Template fields: mostly the topic's own terms, sometimes random ones"""
+        other = Topic(rng) if rng.random() > focus else self
+        return {
+            'object': other.object, 'quantity': other.quantity, 'unit': other.unit, 'quantity2': other.quantity2,
+            'method': other.method, 'instrument': other.instrument,
+            'n': int(rng.integers(12, 5000)), 'exp': rng.normal(1.5, 0.6), 'fig': int(rng.integers(1, 12)),
+            'value': rng.lognormal(1.0, 1.0), 'err': rng.lognormal(-1.0, 0.5), 'pct': int(rng.integers(2, 40)),
+            'z': rng.uniform(0.01, 3.0), 'z2': rng.uniform(3.0, 8.0), 'chi': rng.uniform(0.8, 1.6),
+            'author': AUTHORS[rng.integers(len(AUTHORS))], 'year': int(rng.integers(1995, 2025))
+        }
+
+
+def paragraph(topic: Topic, rng: np.random.Generator, sentences: int = None) -> str:
+    count = sentences or int(rng.integers(4, 9))
+    return " ".join(SENTENCES[rng.integers(len(SENTENCES))].format(**topic.fields(rng)) for _ in range(count))
+
+
+def generate_paper(rng: np.random.Generator, index: int) -> Dict:
+    """A paper: title, topic, and (heading, paragraphs) sections ending with references"""
+    topic = Topic(rng)
+    title = f"{topic.method.capitalize()} constraints on the {topic.quantity} of {topic.object}s with {topic.instrument}"
+    sections = [(heading, [paragraph(topic, rng) for _ in range(count)]) for heading, count in SECTIONS]
+    references = [
+        f"[{i}] {AUTHORS[rng.integers(len(AUTHORS))]}, A. et al. {rng.integers(1995, 2025)}, "
+        f"{JOURNALS[rng.integers(len(JOURNALS))]}, {rng.integers(100, 990)}, {rng.integers(1, 300)}"
+        for i in range(1, 13)
+    ]
+    sections.append(("References", references))
+    return {'paper_id': f"synthetic{index:07d}", 'filename': f"synthetic_{index:07d}.pdf", 'title': title,
+            'topic': topic, 'sections': sections}
+
+
+def paper_lines(paper: Dict, width: int = 95) -> List[str]:
+    """The paper as wrapped text lines, headings on lines of their own"""
+    lines = [paper['title'], ""]
+    for heading, paragraphs in paper['sections']:
+        lines += [heading, ""]
+        for text in paragraphs:
+            line = ""
+            for word in text.split():
+                if line and len(line) + 1 + len(word) > width:
+                    lines.append(line)
+                    line = word
+                else:
+                    line = f"{line} {word}" if line else word
+            lines += [line, ""]
+    return lines
+
+
+def paper_pages(paper: Dict, lines_per_page: int = 60) -> List[Dict]:
+    """Page texts in the form PDFProcessor.extract_text returns"""
+    lines = paper_lines(paper)
+    return [
+        {'page': number, 'text': "\n".join(lines[start:start + lines_per_page])}
+        for number, start in enumerate(range(0, len(lines), lines_per_page), 1)
+    ]
+
+
+def write_pdf(path: Path, pages: List[Dict]):
+    """Minimal PDF (Helvetica text, one content stream per page) that PyPDF2 can extract"""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica "
+               b"/Encoding /WinAnsiEncoding >>"]
+    page_ids = []
+    for page in pages:
+        escaped = [line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") for line in page['text'].split("\n")]
+        content = "BT /F1 9 Tf 11 TL 40 800 Td " + " ".join(f"({line}) Tj T*" for line in escaped) + " ET"
+        stream = content.encode("latin-1", errors="replace")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 3 0 R >> >> "
+            b"/Contents %d 0 R >>" % len(objects)
+        )
+        page_ids.append(len(objects))
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+        b" ".join(b"%d 0 R" % i for i in page_ids), len(page_ids)
+    )
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(output)
+    output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    output += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    Path(path).write_bytes(bytes(output))
+
+
+def corpus_chunks(num_chunks: int, rng: np.random.Generator, chunks_per_paper: int = 40) -> List[Dict]:
+    """Chunk metadata (text of about 120-200 words) for a corpus of num_chunks, without PDFs or chunking"""
+    chunks = []
+    for index in range((num_chunks + chunks_per_paper - 1) // chunks_per_paper):
+        topic = Topic(rng)
+        for i in range(min(chunks_per_paper, num_chunks - len(chunks))):
+            chunks.append({
+                'text': paragraph(topic, rng, sentences=int(rng.integers(7, 12))),
+                'page': i // 4 + 1,
+                'paper_id': f"synthetic{index:07d}",
+                'filename': f"synthetic_{index:07d}.pdf"
+            })
+    return chunks
+
+
+def questions(num_questions: int, rng: np.random.Generator) -> List[str]:
+    return [QUESTIONS[rng.integers(len(QUESTIONS))].format(**Topic(rng).fields(rng, focus=1.0)) for _ in range(num_questions)]
+
+
+class HashingEmbedder:
+    """Offline stand-in for the embedding model: signed feature hashing of words
+
+    Same interface as the embedding backends (encode, dimension), so it can
+    be placed in EmbeddingService. Shared vocabulary gives related texts
+    similar vectors, which keeps retrieval meaningful; the cost per text is
+    far below a transformer's, so timings cover the pipeline around it.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+        self._buckets: Dict[str, int] = {}
+
+    def _bucket(self, word: str) -> int:
+        bucket = self._buckets.get(word)
+        if bucket is None:
+            bucket = self._buckets[word] = zlib.crc32(word.encode())
+        return bucket
+
+    def encode(self, texts: List[str], show_progress_bar: bool = False) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            hashes = np.fromiter((self._bucket(word) for word in TOKEN_RE.findall(text.lower())), dtype=np.int64)
+            if len(hashes):
+                signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+                embeddings[row] = np.bincount(hashes % self.dimension, weights=signs, minlength=self.dimension)
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings / np.maximum(norms, 1e-12)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--papers", type=int, default=100)
+    parser.add_argument("--out", type=Path, required=True)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    args.out.mkdir(parents=True, exist_ok=True)
+    for index in range(args.papers):
+        paper = generate_paper(rng, index)
+        write_pdf(args.out / paper['filename'], paper_pages(paper))
+    print(f"Wrote {args.papers} PDFs to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
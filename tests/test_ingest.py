@@ -0,0 +1,53 @@
+from pathlib import Path
+
+import numpy as np
+
+from app.db.content_cache import ContentCache
+from app.db.vector_store import VectorStore
+from app.services.embeddings import EmbeddingService
+from app.services.ingest import BulkIngestor
+from benchmarks.synthetic import HashingEmbedder, generate_paper, paper_pages, write_pdf
+
+
+def stores(tmp_path: Path):
+    embedding_service = EmbeddingService()
+    embedding_service._model = HashingEmbedder()
+    return VectorStore(path=tmp_path / "index"), ContentCache(tmp_path / "cache.sqlite3"), embedding_service
+
+
+def write_papers(tmp_path: Path, rng: np.random.Generator):
+    for folder in ("a", "b"):
+        (tmp_path / "papers" / folder).mkdir(parents=True, exist_ok=True)
+        write_pdf(tmp_path / "papers" / folder / "paper.pdf", paper_pages(generate_paper(rng, 0)))
+
+
+def test_same_filename_in_sibling_directories(tmp_path: Path):
+    write_papers(tmp_path, np.random.default_rng(0))
+    vector_store, content_cache, embedding_service = stores(tmp_path)
+
+    report = BulkIngestor(vector_store, content_cache, embedding_service, workers=1, root=tmp_path).run(tmp_path / "papers")
+    assert report['files_indexed'] == 2
+    assert vector_store.num_papers == 2
+    assert vector_store.index.ntotal == report['chunks']
+
+    # Both files are recorded, so a second run re-imports neither
+    report = BulkIngestor(vector_store, content_cache, embedding_service, workers=1, root=tmp_path).run(tmp_path / "papers")
+    assert report['files_skipped'] == 2
+    assert vector_store.num_papers == 2
+
+
+def test_paper_ids_do_not_depend_on_the_imported_folder(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    write_papers(tmp_path, rng)
+    vector_store, content_cache, embedding_service = stores(tmp_path)
+    BulkIngestor(vector_store, content_cache, embedding_service, workers=1, root=tmp_path).run(tmp_path / "papers")
+    paper_ids = sorted(paper['paper_id'] for paper in vector_store.chunk_store.live_papers())
+
+    # A revised file imported through its own folder replaces its paper
+    write_pdf(tmp_path / "papers" / "a" / "paper.pdf", paper_pages(generate_paper(rng, 1)))
+    report = BulkIngestor(vector_store, content_cache, embedding_service, workers=1, root=tmp_path).run(
+        tmp_path / "papers" / "a"
+    )
+    assert report['files_indexed'] == 1
+    assert sorted(paper['paper_id'] for paper in vector_store.chunk_store.live_papers()) == paper_ids
+    assert vector_store.num_papers == 2
@@ -0,0 +1,35 @@
+import time
+
+from app.services.reranker import Reranker
+
+
+class SlowCrossEncoder:
+    """Scores by text length, taking `seconds` per batch"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def predict(self, pairs, batch_size=None, show_progress_bar=None):
+        time.sleep(self.seconds)
+        return [len(text) for _, text in pairs]
+
+
+CANDIDATES = [{'text': "x" * length, 'score': 1.0 / (i + 1)} for i, length in enumerate([1, 3, 2])]
+
+
+def test_rerank_within_budget():
+    reranker = Reranker()
+    reranker._model = SlowCrossEncoder(0)
+    results = reranker.rerank("query", CANDIDATES, top_k=2, budget_ms=1000)
+    assert [result['text'] for result in results] == ["xxx", "xx"]
+    assert results[0]['retrieval_score'] == 0.5
+    assert reranker.timeouts == 0
+
+
+def test_rerank_over_budget_in_last_batch():
+    # A single batch that finishes after the deadline falls back to retrieval order
+    reranker = Reranker()
+    reranker._model = SlowCrossEncoder(0.05)
+    results = reranker.rerank("query", CANDIDATES, top_k=2, budget_ms=10)
+    assert results == CANDIDATES[:2]
+    assert reranker.timeouts == 1
@@ -0,0 +1,92 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.db.vector_store import VectorStore
+
+
+def chunks(paper_id: str, count: int, rng: np.random.Generator):
+    embeddings = rng.standard_normal((count, 8)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    metadata = [{'text': f"{paper_id} chunk {i}", 'page': 1, 'paper_id': paper_id, 'filename': f"{paper_id}.pdf"}
+                for i in range(count)]
+    return embeddings, metadata
+
+
+def test_replace_paper(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    store = VectorStore(path=tmp_path)
+    store.add(*chunks("a", 5, rng))
+    store.add(*chunks("b", 3, rng))
+
+    new_ids = store.replace_paper("a", *chunks("a", 4, rng))
+    assert store.paper_chunk_ids("a") == new_ids
+    assert store.index.ntotal == 7
+    assert {paper['paper_id']: sum(n for _, n in paper['ranges']) for paper in store.chunk_store.live_papers()} == {"a": 4, "b": 3}
+
+    reloaded = VectorStore(path=tmp_path)
+    reloaded.load()
+    assert reloaded.paper_chunk_ids("a") == new_ids
+    assert reloaded.index.ntotal == 7
+
+    # No chunks left: the paper goes away
+    store.replace_paper("b", np.zeros((0, 8), dtype=np.float32), [])
+    assert store.paper_chunk_ids("b") == []
+    assert store.num_papers == 1
+
+
+@pytest.mark.parametrize("failing_op", ["add", "remove"])
+def test_failed_replace_keeps_previous_copy(tmp_path: Path, monkeypatch, failing_op: str):
+    rng = np.random.default_rng(0)
+    store = VectorStore(path=tmp_path)
+    old_ids = store.add(*chunks("a", 5, rng))
+    append_segment = store._append_segment
+
+    def fail(record):
+        if record['op'] == failing_op:
+            raise OSError("disk full")
+        append_segment(record)
+    monkeypatch.setattr(store, "_append_segment", fail)
+    with pytest.raises(OSError):
+        store.replace_paper("a", *chunks("a", 4, rng))
+
+    assert store.paper_chunk_ids("a") == old_ids
+    assert store.index.ntotal == 5
+    assert store.chunk_store.num_live == 5
+    assert [result['vector_id'] for result in store.search(store.get_vectors(old_ids[:1])[0], top_k=1)] == old_ids[:1]
+
+    reloaded = VectorStore(path=tmp_path)
+    reloaded.load()
+    assert reloaded.paper_chunk_ids("a") == old_ids
+    assert reloaded.index.ntotal == 5
+    assert reloaded.chunk_store.num_live == 5
+
+
+def test_search_selections_scores_only_each_querys_chunks(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    store = VectorStore(path=tmp_path)
+    for paper in range(6):
+        store.add(*chunks(f"p{paper}", 10, rng))
+    vectors = store.get_vectors(list(range(60)))
+    queries = vectors[[3, 42]] + 0.1 * rng.standard_normal((2, 8)).astype(np.float32)
+    selections = [np.arange(0, 20), np.arange(35, 38)]
+
+    results = store.search_selections(queries, 5, selections)
+    for query, selection, found in zip(queries, selections, results):
+        expected = selection[np.argsort(-(vectors[selection] @ query), kind='stable')][:5]
+        assert [result['vector_id'] for result in found] == expected.tolist()
+
+
+def test_paper_candidates_chunk_budget(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    store = VectorStore(path=tmp_path)
+    for paper in range(6):
+        store.add(*chunks(f"p{paper}", 10, rng))
+    query = store.get_vectors([0])
+
+    assert len(store.paper_candidates(query, 4)[0]) == 40
+    assert len(store.paper_candidates(query, 4, max_chunks=25)[0]) == 20
+    # The best paper is kept even when it alone exceeds the budget
+    selection = store.paper_candidates(query, 4, max_chunks=5)[0]
+    assert len(selection) == 10 and 0 in selection